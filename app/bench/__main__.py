@@ -0,0 +1,144 @@
+# app/bench/__main__.py
+"""
+Offline end-to-end benchmark.
+
+Starts the fake API backend, generates a synthetic corpus and runs the ingest,
+retrieval and full-turn scenarios. Results are written as JSON so runs can be
+compared:
+
+    cd app
+    python -m bench --out results/base.json
+    python -m bench --out results/new.json --compare results/base.json
+"""
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import subprocess
+import contextlib
+
+from .fake_backend import FakeBackend, parse_latency
+from .corpus import generate_corpus, generate_queries
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _flatten(data, prefix=""):
+    """{"a": {"b": 1}} -> {"a.b": 1} (numbers only)."""
+    out = {}
+    for key, value in data.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            out.update(_flatten(value, name + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            out[name] = value
+    return out
+
+
+def compare(current: dict, baseline: dict) -> None:
+    """Prints every metric present in both runs with its relative change."""
+    new, old = _flatten(current["scenarios"]), _flatten(baseline["scenarios"])
+    print(f"\n{'metric':<40} {'baseline':>12} {'current':>12} {'change':>9}")
+    for name in sorted(new.keys() & old.keys()):
+        delta = f"{(new[name] - old[name]) / old[name] * 100:+.1f}%" if old[name] else "n/a"
+        print(f"{name:<40} {old[name]:>12} {new[name]:>12} {delta:>9}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Offline benchmark for the Betopia RAG bot.")
+    parser.add_argument("--out", default=None, help="Write results JSON here.")
+    parser.add_argument("--compare", default=None, help="Baseline results JSON to diff against.")
+    parser.add_argument("--pdfs", type=int, default=20)
+    parser.add_argument("--images", type=int, default=6)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--turns", type=int, default=20, help="Knowledge questions in the turn scenario.")
+    parser.add_argument("--users", type=int, default=8, help="Concurrent users in the concurrency scenario.")
+    parser.add_argument("--latency", default="", help='Injected ms per endpoint, e.g. "chat=400,embeddings=20".')
+    parser.add_argument("--compression", default=None, help='Index compression spec, e.g. "int8".')
+    parser.add_argument("--embedding", default=None,
+                        help='Embedding backend, e.g. "hash" or "onnx:models/minilm" (default: fake API).')
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="Also record peak Python/NumPy allocations (slows the run down).")
+    parser.add_argument("--verbose", action="store_true", help="Show pipeline output.")
+    args = parser.parse_args(argv)
+
+    # 1. Fake backend; every OpenAI client in the process must point at it
+    backend = FakeBackend(parse_latency(args.latency)).start()
+    os.environ["OPENAI_BASE_URL"] = backend.url
+    os.environ["OPENAI_API_KEY"] = "bench"
+    if args.embedding:
+        os.environ["RAG_EMBEDDING_BACKEND"] = args.embedding
+    from . import scenarios  # Imported late: pulls in the rag package
+
+    quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+    results = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "args": vars(args),
+        },
+        "scenarios": {},
+    }
+
+    with tempfile.TemporaryDirectory(prefix="rag-bench-") as work:
+        # Meetings booked by the turn scenario must not land in the real data/ stores
+        os.environ["RAG_DATA_DIR"] = os.path.join(work, "data")
+
+        # 2. Synthetic corpus
+        corpus = generate_corpus(os.path.join(work, "corpus"), n_pdfs=args.pdfs,
+                                 n_images=args.images, seed=args.seed)
+        results["meta"]["corpus"] = {k: v for k, v in corpus.items() if not k.endswith("_dir")}
+        snapshot_root = os.path.join(work, "index")
+
+        # 3. Scenarios
+        with quiet:
+            results["scenarios"]["ingest"] = scenarios.measure(
+                lambda: scenarios.ingest(corpus, snapshot_root, compression=args.compression),
+                trace_memory=args.trace_memory)
+            results["scenarios"]["ingest"]["api_calls"] = backend.reset_calls()
+
+            bundle = scenarios.load_snapshot(snapshot_root, scenarios.current_version(snapshot_root))
+            queries = generate_queries(args.queries, seed=args.seed + 1)
+            results["scenarios"]["retrieval"] = scenarios.measure(
+                lambda: scenarios.retrieval(bundle, queries), trace_memory=args.trace_memory)
+            results["scenarios"]["retrieval"]["api_calls"] = backend.reset_calls()
+
+            results["scenarios"]["concurrent"] = scenarios.measure(
+                lambda: scenarios.concurrent_retrieval(bundle, queries, users=args.users),
+                trace_memory=args.trace_memory)
+            results["scenarios"]["concurrent"]["api_calls"] = backend.reset_calls()
+
+            results["scenarios"]["turn"] = scenarios.measure(
+                lambda: scenarios.turns(bundle, queries[:args.turns]), trace_memory=args.trace_memory)
+            results["scenarios"]["turn"]["api_calls"] = backend.reset_calls()
+
+    backend.stop()
+
+    # 4. Report
+    text = json.dumps(results, indent=2)
+    print(text)
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare(results, json.load(f))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
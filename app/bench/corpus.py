@@ -0,0 +1,159 @@
+# app/bench/corpus.py
+"""
+Synthetic corpus generator: text PDFs and PNG images of various sizes.
+
+Everything is written with the standard library and NumPy (no PDF or image
+library needed) and is fully determined by the seed.
+"""
+import os
+import zlib
+import struct
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+TOPICS = {
+    "services": "software development mobile apps web platforms cloud migration support outsourcing",
+    "company": "betopia bdcalling founded headquarters dhaka employees offices history leadership",
+    "pricing": "pricing packages hourly rates fixed price contracts invoices discounts budget",
+    "ai": "artificial intelligence chatbots machine learning automation retrieval models data",
+    "projects": "projects clients case studies delivery milestones portfolio results launch",
+    "careers": "careers hiring interns training culture benefits teams recruitment growth",
+}
+_COMMON = "the our we with for and to of in a is are provides delivers across every new".split()
+
+# (width, height) of generated images: slide thumbnail, HD slide, 4K photo
+IMAGE_SIZES = ((640, 480), (1920, 1080), (3840, 2160))
+
+
+def _sentence(rng: np.random.Generator, topic: str, n_words: int) -> str:
+    topic_words = TOPICS[topic].split()
+    words = [
+        topic_words[rng.integers(len(topic_words))] if rng.random() < 0.6 else _COMMON[rng.integers(len(_COMMON))]
+        for _ in range(n_words)
+    ]
+    return " ".join(words).capitalize() + "."
+
+
+def make_text(rng: np.random.Generator, topic: str, n_sentences: int) -> str:
+    return " ".join(_sentence(rng, topic, int(rng.integers(8, 20))) for _ in range(n_sentences))
+
+
+def _pdf_escape(line: str) -> str:
+    return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_pdf(path: str, pages: Sequence[str], line_chars: int = 90) -> None:
+    """
+    Writes a minimal valid PDF with one Helvetica text block per page.
+    """
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None,
+               b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_ids = []
+    for text in pages:
+        lines, current = [], ""
+        for word in text.split():
+            if len(current) + len(word) + 1 > line_chars:
+                lines.append(current)
+                current = word
+            else:
+                current = f"{current} {word}".strip()
+        lines.append(current)
+        ops = ["BT", "/F1 10 Tf", "12 TL", "50 780 Td"]
+        ops += [f"({_pdf_escape(l)}) '" for l in lines[:60]]
+        ops.append("ET")
+        stream = "\n".join(ops).encode("latin-1", "replace")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        content_id = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id
+        )
+        page_ids.append(len(objects))
+    kids = b" ".join(b"%d 0 R" % i for i in page_ids)
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_ids))
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, obj in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % i + obj + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % off for off in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+def write_png(path: str, width: int, height: int, rng: np.random.Generator, block: int = 4) -> None:
+    """
+    Writes an RGB PNG: blocky noise over a gradient, which compresses roughly
+    like a photo or a busy slide (a few MB at 4K).
+    """
+    small = rng.integers(0, 256, size=(height // block + 1, width // block + 1, 3), dtype=np.uint8)
+    pixels = np.repeat(np.repeat(small, block, axis=0), block, axis=1)[:height, :width]
+    gradient = np.linspace(0, 64, width, dtype=np.float32)[None, :, None]
+    pixels = np.clip(pixels.astype(np.float32) * 0.75 + gradient, 0, 255).astype(np.uint8)
+    raw = np.concatenate([np.zeros((height, 1), dtype=np.uint8), pixels.reshape(height, -1)], axis=1)
+
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF)
+
+    png = b"\x89PNG\r\n\x1a\n"
+    png += chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+    png += chunk(b"IDAT", zlib.compress(raw.tobytes(), 6))
+    png += chunk(b"IEND", b"")
+    with open(path, "wb") as f:
+        f.write(png)
+
+
+def generate_corpus(out_dir: str, n_pdfs: int = 20, n_images: int = 6, pages_per_pdf: Tuple[int, int] = (1, 6),
+                    image_sizes: Sequence[Tuple[int, int]] = IMAGE_SIZES, seed: int = 0) -> Dict[str, object]:
+    """
+    Writes <out_dir>/pdf/*.pdf and <out_dir>/images/*.png.
+
+    Returns:
+        dict: {"pdf_dir", "img_dir", "pdf_bytes", "image_bytes", "pages"}
+    """
+    rng = np.random.default_rng(seed)
+    pdf_dir = os.path.join(out_dir, "pdf")
+    img_dir = os.path.join(out_dir, "images")
+    os.makedirs(pdf_dir, exist_ok=True)
+    os.makedirs(img_dir, exist_ok=True)
+    topics = list(TOPICS)
+
+    pages_total = 0
+    for i in range(n_pdfs):
+        topic = topics[i % len(topics)]
+        n_pages = int(rng.integers(pages_per_pdf[0], pages_per_pdf[1] + 1))
+        pages = [make_text(rng, topic, int(rng.integers(15, 35))) for _ in range(n_pages)]
+        write_pdf(os.path.join(pdf_dir, f"{topic}_{i:03d}.pdf"), pages)
+        pages_total += n_pages
+
+    for i in range(n_images):
+        w, h = image_sizes[i % len(image_sizes)]
+        write_png(os.path.join(img_dir, f"slide_{i:03d}_{w}x{h}.png"), w, h, rng)
+
+    def dir_bytes(d):
+        return sum(os.path.getsize(os.path.join(d, f)) for f in os.listdir(d))
+
+    return {
+        "pdf_dir": pdf_dir,
+        "img_dir": img_dir,
+        "pdf_bytes": dir_bytes(pdf_dir),
+        "image_bytes": dir_bytes(img_dir),
+        "pages": pages_total,
+    }
+
+
+def generate_queries(n: int, seed: int = 1) -> List[str]:
+    """Knowledge-style questions about the synthetic topics."""
+    rng = np.random.default_rng(seed)
+    topics = list(TOPICS)
+    queries = []
+    for _ in range(n):
+        words = TOPICS[topics[rng.integers(len(topics))]].split()
+        picked = [words[j] for j in rng.choice(len(words), size=3, replace=False)]
+        queries.append(f"What can you tell me about {' '.join(picked)}?")
+    return queries
@@ -0,0 +1,286 @@
+# app/bench/fake_backend.py
+"""
+Local stand-in for the OpenAI endpoints the bot uses.
+
+Serves /v1/embeddings, /v1/chat/completions (text and vision),
+/v1/audio/transcriptions and /v1/audio/speech over plain HTTP with
+deterministic outputs and configurable injected latency, so the whole
+pipeline can be exercised offline through OPENAI_BASE_URL.
+
+Embeddings are hashed bag-of-words vectors: texts that share words get
+similar vectors, so retrieval behaves sensibly on synthetic data.
+
+Chat requests that offer tools get a schedule_meeting tool call when the
+user's turn shows booking intent or contains contact details, so the tool
+loop is exercised too.
+
+Run it on its own for manual testing:
+    python -m bench.fake_backend --port 8080 --latency chat=400,embeddings=20
+    OPENAI_BASE_URL=http://127.0.0.1:8080/v1 python main.py
+"""
+import re
+import json
+import base64
+import time
+import socket
+import hashlib
+import argparse
+import threading
+from collections import Counter
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+import numpy as np
+
+DEFAULT_DIM = 1536
+# Injected latency per endpoint (milliseconds); "embeddings" is per request
+DEFAULT_LATENCY_MS = {"embeddings": 0, "chat": 0, "vision": 0, "stt": 0, "tts": 0}
+
+_WORD = re.compile(r"[a-z0-9]+")
+_BOOKING = re.compile(r"\b(book|schedule|meeting|appointment)\b", re.IGNORECASE)
+_EMAIL = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+_PHONE = re.compile(r"\+?\d[\d\s-]{6,}\d")
+_NAME = re.compile(r"\bmy name is ([A-Za-z]+(?: [A-Za-z]+)?)", re.IGNORECASE)
+# build_prompt() wraps the user's turn in instructions, history and context
+_CURRENT_INPUT = re.compile(r"### CURRENT INPUT\s*User: (.*?)\s*Assistant:\s*$", re.DOTALL)
+_FILLER = (
+    "betopia bdcalling team delivers software design support services projects clients "
+    "growth data cloud mobile web platform solutions quality delivery strategy market"
+).split()
+
+
+def _seed(data: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "little")
+
+
+@lru_cache(maxsize=65536)
+def _token_vector(token: str, dim: int) -> np.ndarray:
+    return np.random.default_rng(_seed(token.encode("utf-8"))).standard_normal(dim).astype("float32")
+
+
+def fake_embedding(text: str, dim: int = DEFAULT_DIM) -> np.ndarray:
+    """Deterministic unit vector: the normalized sum of per-word random vectors."""
+    counts = Counter(_WORD.findall(text.lower()))
+    vec = np.zeros(dim, dtype="float32")
+    for token, n in counts.items():
+        vec += n * _token_vector(token, dim)
+    if not counts:
+        vec = _token_vector("<empty>", dim).copy()
+    return vec / (np.linalg.norm(vec) + 1e-12)
+
+
+def fake_text(key: bytes, n_words: int, vocabulary=_FILLER) -> str:
+    """Deterministic pseudo-text: same key, same words."""
+    rng = np.random.default_rng(_seed(key))
+    words = [vocabulary[i] for i in rng.integers(0, len(vocabulary), n_words)]
+    return " ".join(words).capitalize() + "."
+
+
+def user_turn(content) -> str:
+    """The user's own words from a chat message (the CURRENT INPUT of a built prompt)."""
+    if not isinstance(content, str):
+        return ""
+    match = _CURRENT_INPUT.search(content)
+    return match.group(1) if match else content
+
+
+def fake_tool_call(text: str) -> Optional[dict]:
+    """
+    A deterministic schedule_meeting call for a turn that asks to book a meeting
+    or gives contact details; None otherwise. Missing fields get fixed placeholders.
+    """
+    email, phone, name = _EMAIL.search(text), _PHONE.search(text), _NAME.search(text)
+    if not (_BOOKING.search(text) or email or phone):
+        return None
+    args = {
+        "name": name.group(1) if name else "Bench User",
+        "email": email.group(0) if email else "bench.user@example.com",
+        "phone": re.sub(r"[\s-]", "", phone.group(0)) if phone else "+10000000000",
+    }
+    return {
+        "id": "call_" + hashlib.blake2b(text.encode("utf-8"), digest_size=8).hexdigest(),
+        "type": "function",
+        "function": {"name": "schedule_meeting", "arguments": json.dumps(args)},
+    }
+
+
+def parse_latency(spec: Optional[str]) -> Dict[str, float]:
+    """Parses "chat=400,embeddings=20" into a latency dict (ms)."""
+    latency = dict(DEFAULT_LATENCY_MS)
+    for part in filter(None, (spec or "").split(",")):
+        name, _, value = part.partition("=")
+        if name.strip() not in latency:
+            raise ValueError(f"Unknown endpoint in latency spec: {name}")
+        latency[name.strip()] = float(value)
+    return latency
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # Keep-alive, like the real API
+
+    def setup(self):
+        super().setup()
+        # Headers and body go out in separate writes; without this, Nagle plus
+        # delayed ACKs add ~40 ms to every keep-alive request
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, fmt, *args):  # Silence per-request logging
+        pass
+
+    def _reply(self, status: int, body: bytes, content_type: str = "application/json"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _json(self, payload: dict):
+        self._reply(200, json.dumps(payload).encode("utf-8"))
+
+    def do_POST(self):
+        backend = self.server.backend
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        path = self.path.split("?")[0].rstrip("/")
+
+        if path.endswith("/embeddings"):
+            self._embeddings(backend, json.loads(body))
+        elif path.endswith("/chat/completions"):
+            self._chat(backend, json.loads(body))
+        elif path.endswith("/audio/transcriptions"):
+            backend.wait("stt")
+            self._json({"text": fake_text(body, backend.answer_words // 4)})
+        elif path.endswith("/audio/speech"):
+            request = json.loads(body)
+            backend.wait("tts")
+            # Roughly 1 KB of "audio" per word
+            audio = b"ID3" + bytes(1024 * max(1, len(request.get("input", "").split())))
+            self._reply(200, audio, content_type="audio/mpeg")
+        else:
+            self._reply(404, b'{"error": {"message": "not found"}}')
+
+    def _embeddings(self, backend, request):
+        backend.wait("embeddings")
+        inputs = request["input"]
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        dim = request.get("dimensions") or backend.dim
+        # The SDK asks for base64 by default (as the real API returns it); float lists
+        # would make the client spend far more time parsing than the real thing does
+        if request.get("encoding_format") == "base64":
+            encode = lambda v: base64.b64encode(v.astype("<f4").tobytes()).decode("ascii")
+        else:
+            encode = lambda v: v.tolist()
+        data = [
+            {"object": "embedding", "index": i, "embedding": encode(fake_embedding(t, dim))}
+            for i, t in enumerate(inputs)
+        ]
+        tokens = sum(len(t.split()) for t in inputs)
+        self._json({
+            "object": "list", "data": data, "model": request.get("model", "fake"),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        })
+
+    def _chat(self, backend, request):
+        messages = request.get("messages", [])
+        content = messages[-1].get("content", "") if messages else ""
+        is_vision = isinstance(content, list) and any(p.get("type") == "image_url" for p in content)
+        backend.wait("vision" if is_vision else "chat")
+
+        key = json.dumps(content, sort_keys=True).encode("utf-8")
+        prompt_tokens = len(key) // 4
+        # Only a user turn can trigger a tool; a follow-up after tool results never does
+        tool_call = None
+        if request.get("tools") and messages and messages[-1].get("role") == "user":
+            tool_call = fake_tool_call(user_turn(content))
+
+        if tool_call:
+            backend.count("tool_calls")
+            message = {"role": "assistant", "content": None, "tool_calls": [tool_call]}
+            finish_reason, completion_tokens = "tool_calls", len(tool_call["function"]["arguments"]) // 4
+        else:
+            text = fake_text(key, backend.answer_words * (2 if is_vision else 1))
+            message = {"role": "assistant", "content": text}
+            finish_reason, completion_tokens = "stop", len(text.split())
+        self._json({
+            "id": "chatcmpl-fake",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "fake"),
+            "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        })
+
+
+class FakeBackend:
+    """
+    Threaded fake API server.
+
+    Args:
+        latency_ms (dict): Injected latency per endpoint ("embeddings", "chat",
+            "vision", "stt", "tts").
+        dim (int): Default embedding size.
+        answer_words (int): Length of generated chat answers.
+    """
+
+    def __init__(self, latency_ms: Optional[Dict[str, float]] = None, dim: int = DEFAULT_DIM,
+                 answer_words: int = 60, host: str = "127.0.0.1", port: int = 0):
+        self.latency_ms = {**DEFAULT_LATENCY_MS, **(latency_ms or {})}
+        self.dim = dim
+        self.answer_words = answer_words
+        self.calls = Counter()
+        self._calls_lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._server.backend = self
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-backend", daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def count(self, name: str) -> None:
+        with self._calls_lock:
+            self.calls[name] += 1
+
+    def wait(self, endpoint: str) -> None:
+        self.count(endpoint)
+        delay = self.latency_ms.get(endpoint, 0)
+        if delay:
+            time.sleep(delay / 1000.0)
+
+    def reset_calls(self) -> Dict[str, int]:
+        """Returns the call counts since the last reset and starts over."""
+        with self._calls_lock:
+            calls, self.calls = dict(self.calls), Counter()
+        return calls
+
+    def start(self) -> "FakeBackend":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Deterministic local stand-in for the OpenAI API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", default="", help='Per-endpoint ms, e.g. "chat=400,embeddings=20".')
+    parser.add_argument("--dim", type=int, default=DEFAULT_DIM)
+    args = parser.parse_args()
+
+    server = FakeBackend(parse_latency(args.latency), dim=args.dim, host=args.host, port=args.port).start()
+    print(f"Fake OpenAI backend on {server.url} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
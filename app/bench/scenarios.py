@@ -0,0 +1,205 @@
+# app/bench/scenarios.py
+"""
+Benchmark scenarios. Each returns a plain dict of metrics (JSON-friendly).
+
+They call the real pipeline code (rag.*) against whatever OPENAI_BASE_URL
+points at, normally the FakeBackend started by 'python -m bench'.
+"""
+import os
+import time
+import resource
+import threading
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+
+from rag.sync import sync_and_rebuild
+from rag.snapshots import current_version, load_snapshot
+from rag.embeddings import embed_texts, embed_query
+from rag.retriever import retrieve_chunks
+from rag.context import assemble_context
+from rag.prompt import build_prompt
+from rag.intent import classify_intent
+from rag.tools import TOOLS, run_tool_loop
+from rag.openai_client import get_client
+from rag.batching import set_batching
+from rag.resilience import Deadline, chat_completion
+
+
+def percentiles(samples_ms: List[float]) -> Dict[str, float]:
+    """p50/p95/p99/mean/max of a list of latencies in milliseconds."""
+    if not samples_ms:
+        return {}
+    arr = np.asarray(samples_ms, dtype=np.float64)
+    return {
+        "count": int(arr.size),
+        "p50_ms": round(float(np.percentile(arr, 50)), 3),
+        "p95_ms": round(float(np.percentile(arr, 95)), 3),
+        "p99_ms": round(float(np.percentile(arr, 99)), 3),
+        "mean_ms": round(float(arr.mean()), 3),
+        "max_ms": round(float(arr.max()), 3),
+    }
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far (ru_maxrss is KB on Linux, bytes on macOS)."""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if os.uname().sysname == "Darwin" else 1024), 1)
+
+
+def measure(fn: Callable[[], Dict[str, Any]], trace_memory: bool = False) -> Dict[str, Any]:
+    """
+    Runs a scenario and adds wall time and peak RSS to its metrics.
+
+    With trace_memory, tracemalloc also reports the peak of Python + NumPy
+    allocations. It slows Python code down several times, so latency numbers
+    from such a run should not be compared with normal runs.
+    """
+    rss_before = peak_rss_mb()
+    if trace_memory:
+        tracemalloc.start()
+    t0 = time.perf_counter()
+    try:
+        result = fn()
+    finally:
+        elapsed = time.perf_counter() - t0
+        if trace_memory:
+            result_peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+    result["wall_s"] = round(elapsed, 3)
+    result["peak_rss_mb"] = peak_rss_mb()
+    result["peak_rss_growth_mb"] = round(result["peak_rss_mb"] - rss_before, 1)
+    if trace_memory:
+        result["peak_traced_mb"] = round(result_peak / (1024 * 1024), 1)
+    return result
+
+
+def ingest(corpus: Dict[str, Any], snapshot_root: str, compression=None) -> Dict[str, Any]:
+    """
+    Full rebuild of the corpus into a fresh snapshot, then a no-op re-sync.
+    """
+    # 1. Cold build (extraction, captioning, chunking, dedup, embedding, publish)
+    t0 = time.perf_counter()
+    sync_and_rebuild(corpus["pdf_dir"], corpus["img_dir"], get_client("vision"),
+                     snapshot_root=snapshot_root, compression=compression, force=True)
+    build_s = time.perf_counter() - t0
+
+    # 2. Warm re-sync: nothing changed, should only stat files
+    t0 = time.perf_counter()
+    sync_and_rebuild(corpus["pdf_dir"], corpus["img_dir"], get_client("vision"),
+                     snapshot_root=snapshot_root, compression=compression)
+    resync_s = time.perf_counter() - t0
+
+    bundle = load_snapshot(snapshot_root, current_version(snapshot_root))
+    chunks = bundle["faiss"].ntotal
+    n_files = len(os.listdir(corpus["pdf_dir"])) + len(os.listdir(corpus["img_dir"]))
+    mb = (corpus["pdf_bytes"] + corpus["image_bytes"]) / (1024 * 1024)
+    return {
+        "files": n_files,
+        "chunks": int(chunks),
+        "input_mb": round(mb, 2),
+        "build_s": round(build_s, 3),
+        "files_per_s": round(n_files / build_s, 2),
+        "chunks_per_s": round(chunks / build_s, 2),
+        "mb_per_s": round(mb / build_s, 2),
+        "resync_s": round(resync_s, 4),
+    }
+
+
+def retrieval(bundle: Dict[str, Any], queries: List[str], top_k: int = 5) -> Dict[str, Any]:
+    """
+    retrieve_chunks latency with pre-computed query vectors (search cost only),
+    plain and with MMR, plus the end-to-end variant that embeds each query.
+    """
+    q_vecs = embed_texts(queries)
+    result = {"index_size": int(bundle["faiss"].ntotal)}
+    for label, mmr in (("flat", False), ("mmr", True)):
+        samples = []
+        for q, vec in zip(queries, q_vecs):
+            t0 = time.perf_counter()
+            retrieve_chunks(q, bundle, lambda _: [vec], top_k=top_k, mmr=mmr)
+            samples.append((time.perf_counter() - t0) * 1000)
+        result[label] = percentiles(samples)
+
+    samples = []
+    for q in queries:
+        t0 = time.perf_counter()
+        retrieve_chunks(q, bundle, lambda x: embed_texts([x]), top_k=top_k, mmr=True)
+        samples.append((time.perf_counter() - t0) * 1000)
+    result["with_embedding"] = percentiles(samples)
+    return result
+
+
+def concurrent_retrieval(bundle: Dict[str, Any], queries: List[str], users: int = 8,
+                         top_k: int = 5) -> Dict[str, Any]:
+    """
+    'users' threads each embed and retrieve their share of the queries at the
+    same time, with request coalescing off and then on.
+    """
+    result = {"users": users}
+    for label, batching in (("unbatched", False), ("batched", True)):
+        set_batching(batching)
+        samples, lock = [], threading.Lock()
+
+        def user(my_queries):
+            for q in my_queries:
+                t0 = time.perf_counter()
+                q_vec = [embed_query(q)]
+                retrieve_chunks(q, bundle, lambda _: q_vec, top_k=top_k, mmr=True)
+                with lock:
+                    samples.append((time.perf_counter() - t0) * 1000)
+
+        threads = [threading.Thread(target=user, args=(queries[i::users],)) for i in range(users)]
+        t0 = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - t0
+        result[label] = {"queries_per_s": round(len(samples) / elapsed, 1), **percentiles(samples)}
+    set_batching(True)
+    return result
+
+
+def run_turn(user_input: str, bundle: Dict[str, Any], history: List[Dict[str, str]]) -> str:
+    """
+    One chat turn, mirroring the main.py loop: route, retrieve if needed,
+    build the prompt, call the model (and tools).
+    """
+    client = get_client("chat")
+    deadline = Deadline()
+    last_assistant = history[-1]["assistant"] if history else None
+    route = classify_intent(user_input, last_assistant)
+    context = ""
+    if route.needs_retrieval:
+        q_vec = [embed_query(user_input, deadline)]
+        context = assemble_context(retrieve_chunks(user_input, bundle, lambda _: q_vec, top_k=5, mmr=True))
+    history_pairs = [(h["user"], h["assistant"]) for h in history]
+    messages = [{"role": "user", "content": build_prompt(context, user_input, history_pairs)}]
+    resp_msg = chat_completion(
+        client, deadline, model="gpt-4o-mini", messages=messages, tools=TOOLS, tool_choice="auto"
+    ).choices[0].message
+    if resp_msg.tool_calls:
+        return run_tool_loop(client, messages, resp_msg, deadline=deadline)
+    return resp_msg.content
+
+
+def turns(bundle: Dict[str, Any], queries: List[str], max_history: int = 10) -> Dict[str, Any]:
+    """
+    Full-turn latency over a conversation that mixes knowledge questions with
+    scheduling replies ("yes", contact details), as a real session does.
+    """
+    script = []
+    for i, q in enumerate(queries):
+        script.append(q)
+        if i % 4 == 3:
+            script += ["yes", "my email is jane.doe@example.com"]
+
+    history, samples = [], []
+    for user_input in script:
+        t0 = time.perf_counter()
+        answer = run_turn(user_input, bundle, history)
+        samples.append((time.perf_counter() - t0) * 1000)
+        history = (history + [{"user": user_input, "assistant": answer}])[-max_history:]
+    return {"turns": len(script), **percentiles(samples)}
@@ -1,11 +1,9 @@
 import os
 import time
-import json
 import shlex
 import logging
 from pathlib import Path
 from dotenv import load_dotenv
-from openai import OpenAI
 
 # 1. SILENCE LOGGING: Keeps the terminal clean
 logging.getLogger("httpx").setLevel(logging.WARNING)
@@ -14,87 +12,128 @@ logging.getLogger("openai").setLevel(logging.WARNING)
 # Custom RAG & Voice Imports
 from rag.pdf_loader import load_all_pdfs_text
 from rag.image_reader import load_all_images_text
-from rag.chunker import chunk_text
-from rag.embeddings import embed_texts
-from rag.vector_store import create_faiss_index
+from rag.chunker import chunk_text_with_offsets
+from rag.embeddings import embed_chunks, embed_query, embedding_info, embedding_matches
+from rag.dedup import dedupe_chunks
+from rag.snapshots import current_version, load_snapshot, SnapshotWatcher
+from rag.sync import sync_and_rebuild
+from rag.sharding import build_shards, ShardedIndex
 from rag.retriever import retrieve_chunks
 from rag.prompt import build_prompt
-from rag.upload_manager import save_uploaded_files, build_temp_index, clear_tmp_dir
-from rag.actions import schedule_meeting 
+from rag.context import assemble_context
+from rag.intent import classify_intent, is_meeting_followup, CONFIRMATION
+from rag.upload_jobs import UploadJobManager
+from rag.session_store import get_session_store
+from rag.tools import TOOLS, run_tool_loop
+from rag.openai_client import get_client, close_client
+from rag.resilience import Deadline, chat_completion, fallback_answer
+from rag import metrics
 from voice.stt import record_audio, cleanup_audio
 from voice.stt_openai import speech_to_text
 from voice.tts import speak_text
 
 # CONFIGURATION
 load_dotenv()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
-# Define the Tool Schema
-TOOLS = [{
-    "type": "function",
-    "function": {
-        "name": "schedule_meeting",
-        "description": "ONLY call this if the user EXPLICITLY asks to book a meeting.",
-        "parameters": {
-            "type": "object",
-            "properties": {
-                "name": {"type": "string", "description": "User's full name"},
-                "email": {"type": "string", "description": "User's email"},
-                "phone": {"type": "string", "description": "User's phone number"}
-            },
-            "required": ["name", "email", "phone"]
-        }
-    }
-}]
+# One pooled connection set for every API call (see rag/openai_client.py)
+client = get_client("chat")
 
 # PATHS & SESSION STATE
 BASE_DIR = Path(__file__).resolve().parent.parent
 DATA_DIR = BASE_DIR / "data"
 TMP_UPLOAD_DIR = DATA_DIR / "tmp"
+SNAPSHOT_ROOT = DATA_DIR / "index"
 MAX_MEMORY_TURNS = 10
+# Optional sharded mode: RAG_SHARDS=4 spreads the knowledge base over 4 worker processes
+NUM_SHARDS = int(os.getenv("RAG_SHARDS", "1"))
+# Optional compact vectors, e.g. RAG_COMPRESSION=int8 or dim512+int8 (see rag/compression.py)
+COMPRESSION = os.getenv("RAG_COMPRESSION") or None
 
-conversation_history = []
-temp_index = None
-meeting_scheduled_in_session = False
-voice_output_enabled = False 
+# Session state (history, flags, temp index) lives in the session store, so it
+# survives restarts and stays bounded in memory
+SESSION_ID = os.getenv("RAG_SESSION_ID", "cli")
+sessions = get_session_store()
+session = sessions.get(SESSION_ID)
+upload_jobs = None
 
 # HELPER FUNCTIONS
 
 def show_history():
-    """Displays the in-memory session history."""
-    if not conversation_history:
+    """Displays the session history."""
+    if not session.history:
         print("\n History is empty for this session.")
         return
     print("\n" + "="*70)
     print(f"{'INDEX':<5} | {'SENDER':<8} | {'MESSAGE'}")
     print("-" * 70)
-    for i, turn in enumerate(conversation_history):
+    for i, turn in enumerate(session.history):
         print(f"{i:<5} | {'User':<8} | {turn['user']}")
         bot_short = (turn['assistant'][:60] + '...') if len(turn['assistant']) > 60 else turn['assistant']
         print(f"{' ': <5} | {'Bot':<8} | {bot_short}")
     print("="*70 + "\n")
 
+def on_tool_result(name, result):
+    """Tracks tool side effects that affect the session state."""
+    if name == "schedule_meeting" and result.startswith("SUCCESS"):
+        session.meeting_scheduled = True
+
 # STARTUP LOGIC
 print("\n Loading Knowledge Base Documents...")
-pdf_docs = load_all_pdfs_text(str(DATA_DIR / "pdf"))
-image_docs = load_all_images_text(str(DATA_DIR / "images"), client)
-
-documents = []
-ts = int(time.time())
-
-for doc in pdf_docs + image_docs:
-    documents.append({"text": doc["text"], "metadata": {"source": doc["source"], "updated_at": ts}})
-
-if documents:
-    chunks, metadatas = [], []
-    for doc in documents:
-        doc_chunks = chunk_text(doc["text"])
-        chunks.extend(doc_chunks)
-        metadatas.extend([doc["metadata"]] * len(doc_chunks))
-    index = create_faiss_index(embed_texts(chunks), chunks, metadatas)
-    print(f" Loaded {len(pdf_docs)} PDFs and {len(image_docs)} images.")
-else:
+snapshot_watcher = None
+
+if NUM_SHARDS > 1:
+    # Sharded mode ingests in-process and hands each shard to its own worker
+    pdf_docs = load_all_pdfs_text(str(DATA_DIR / "pdf"))
+    image_docs = load_all_images_text(str(DATA_DIR / "images"), get_client("vision"))
+
+    documents = []
+    ts = int(time.time())
+
+    for doc in pdf_docs + image_docs:
+        documents.append({"text": doc["text"], "metadata": {"source": doc["source"], "updated_at": ts}})
+
     index = None
+    if documents:
+        chunks, metadatas = [], []
+        for doc in documents:
+            for start, chunk in chunk_text_with_offsets(doc["text"]):
+                chunks.append(chunk)
+                metadatas.append({**doc["metadata"], "start": start})
+        # Repeated slides/brochures are embedded once, with every source kept in metadata
+        chunks, metadatas = dedupe_chunks(chunks, metadatas)
+        vectors, chunks, metadatas = embed_chunks(chunks, metadatas)
+        shard_dirs = build_shards(vectors, chunks, metadatas, NUM_SHARDS, str(DATA_DIR / "shards"),
+                                  compression=COMPRESSION, embedding=embedding_info())
+        index = {"shards": ShardedIndex.spawn_local(shard_dirs)}
+        print(f" Loaded {len(pdf_docs)} PDFs and {len(image_docs)} images.")
+else:
+    # Default: serve the latest snapshot built by 'python -m app.rag.sync'.
+    # Only the very first start builds one in-process.
+    if current_version(str(SNAPSHOT_ROOT)) is None:
+        sync_and_rebuild(str(DATA_DIR / "pdf"), str(DATA_DIR / "images"), get_client("vision"),
+                         snapshot_root=str(SNAPSHOT_ROOT), compression=COMPRESSION)
+    version = current_version(str(SNAPSHOT_ROOT))
+    index = load_snapshot(str(SNAPSHOT_ROOT), version) if version else None
+    if index and not embedding_matches(index):
+        # Built with another embedding backend/model: queries would search the wrong space
+        print(f" Snapshot {version} was built with different embeddings; rebuilding...")
+        sync_and_rebuild(str(DATA_DIR / "pdf"), str(DATA_DIR / "images"), get_client("vision"),
+                         snapshot_root=str(SNAPSHOT_ROOT), compression=COMPRESSION, force=True)
+        version = current_version(str(SNAPSHOT_ROOT))
+        index = load_snapshot(str(SNAPSHOT_ROOT), version) if version else None
+    if index:
+        print(f" Loaded index snapshot {version} ({index['faiss'].ntotal} chunks).")
+    # New snapshots are loaded in the background and swapped in between turns
+    snapshot_watcher = SnapshotWatcher(str(SNAPSHOT_ROOT), version).start()
+
+# Background ingestion for /upload (owns the session's temporary index)
+upload_jobs = UploadJobManager(str(TMP_UPLOAD_DIR), get_client("vision"))
+if session.temp_index is not None and not embedding_matches(session.temp_index):
+    # Uploads indexed with another embedding backend can't be searched; ask for a re-upload
+    print(" Your uploaded files were indexed with different embeddings; please /upload them again.")
+    session.temp_index = None
+upload_jobs.index = session.temp_index
+if session.history:
+    print(f" Resumed session '{SESSION_ID}' ({len(session.history)} turns, /reset to start over).")
 
 # MAIN INTERACTION LOOP
 print("\n" + "="*50)
@@ -106,21 +145,44 @@ print("• [Empty Enter]      : Voice Input Mode")
 print("• /voice             : Toggle Text-to-Voice (On/Off)")
 print("• /history           : View session logs")
 print("• /upload <path>     : Add temp files")
+print("• /jobs              : Show upload progress")
+print("• /cancel <job id>   : Cancel a running upload")
+print("• /remove <file>     : Remove one temp upload")
 print("• /clear             : Delete temp uploads")
+print("• /stats [prom]      : Latency, API usage & cache stats")
+print("• /reset             : Forget this session")
 print("• exit               : Close Assistant")
 print("-" * 50)
 
 try:
     while True:
         raw_input = input("\nYou: ").strip()
+        for job in upload_jobs.pop_finished():
+            print(f"✨ Upload job finished: {job.summary()}")
+        with upload_jobs.lock:
+            session.temp_index = upload_jobs.index
+        # Between turns: atomically switch to a freshly built snapshot if one is ready
+        new_index = snapshot_watcher.swap_if_ready() if snapshot_watcher else None
+        if new_index is not None:
+            index = new_index
+            print(f"🔄 Knowledge base updated (snapshot {snapshot_watcher.version}).")
         is_voice_mode = False
         user_input = raw_input
+        # Per-turn trace (discarded if this input turns out to be a command)
+        metrics.start_turn()
+        # Latency budget for everything this turn sends to the API
+        deadline = Deadline()
 
         # 1. INPUT PROCESSING
         if raw_input == "":
             is_voice_mode = True
             audio_path = record_audio()
-            user_input = speech_to_text(client, audio_path)
+            try:
+                with metrics.span("stt"):
+                    user_input = speech_to_text(get_client("stt"), audio_path)
+            except Exception as e:
+                print(f" Could not transcribe audio: {e}")
+                user_input = ""
             cleanup_audio(audio_path) 
             if not user_input or len(user_input.strip()) < 2: continue
             print(f"🗣️  You said: {user_input}")
@@ -131,68 +193,146 @@ try:
 
         # 2. COMMAND HANDLING
         if user_input.lower() == "/voice":
-            voice_output_enabled = not voice_output_enabled
-            print(f"🔊 Text-to-Voice: {'ENABLED' if voice_output_enabled else 'DISABLED'}")
+            session.voice_output = not session.voice_output
+            sessions.save(session)
+            print(f"🔊 Text-to-Voice: {'ENABLED' if session.voice_output else 'DISABLED'}")
+            continue
+
+        if user_input.lower() == "/reset":
+            upload_jobs.clear()
+            sessions.delete(SESSION_ID)
+            session = sessions.get(SESSION_ID)
+            print("🧹 Session history, flags and temp uploads cleared.")
             continue
 
         if user_input.lower() == "/history":
             show_history()
             continue
 
+        if user_input.lower().startswith("/stats"):
+            if user_input.lower().split()[1:] == ["prom"]:
+                print(metrics.prometheus_text())
+            else:
+                print(metrics.stats_table())
+            continue
+
         if user_input.lower() == "/clear":
-            clear_tmp_dir(str(TMP_UPLOAD_DIR))
-            temp_index = None
+            upload_jobs.clear()
             print("🧹 Temporary files cleared.")
             continue
 
+        if user_input.lower() == "/jobs":
+            if not upload_jobs.jobs:
+                print("No upload jobs in this session.")
+            for job in upload_jobs.jobs.values():
+                print(f"📦 {job.summary()}")
+            continue
+
+        if user_input.startswith("/cancel"):
+            for job_id in shlex.split(user_input)[1:]:
+                ok = job_id.isdigit() and upload_jobs.cancel(int(job_id))
+                print(f"🛑 Cancel requested for job #{job_id}." if ok else f" No running job #{job_id}.")
+            continue
+
+        if user_input.startswith("/remove"):
+            for name in shlex.split(user_input)[1:]:
+                upload_jobs.remove_file(name)
+            print("🗑️  Temp index updated.")
+            continue
+
         if user_input.startswith("/upload"):
             try:
                 paths = shlex.split(user_input)[1:]
-                save_uploaded_files(str(TMP_UPLOAD_DIR), paths)
-                temp_index = build_temp_index(str(TMP_UPLOAD_DIR), client)
-                print("✨ Temp index updated.")
+                job = upload_jobs.submit(paths)
+                print(f"📦 Upload job #{job.id} started in the background (/jobs to check progress).")
             except Exception as e:
                 print(f" Error: {e}")
             continue
 
         # 3. AI AGENT LOGIC (RAG + Tools)
-        retrieved = []
-        if index:
-            retrieved.extend(retrieve_chunks(user_input, index, lambda x: embed_texts([x]), top_k=5))
-        if temp_index:
-            retrieved.extend(retrieve_chunks(user_input, temp_index, lambda x: embed_texts([x]), top_k=3))
-        
-        context = "\n\n".join(r["text"] for r in retrieved)
-        history_pairs = [(h["user"], h["assistant"]) for h in conversation_history]
-        prompt = build_prompt(context, user_input, history_pairs, meeting_status=meeting_scheduled_in_session)
+        # Only knowledge questions need retrieval; "yes", contact details and small talk skip it
+        last_assistant = session.history[-1]["assistant"] if session.history else None
+        with metrics.span("intent"):
+            route = classify_intent(user_input, last_assistant)
+        metrics.count(f"intent.{route.intent}")
+        metrics.annotate(intent=route.intent, voice=is_voice_mode)
+        logging.getLogger(__name__).debug(f"Intent: {route}")
+
+        if route.needs_retrieval:
+            retrieved = []
+            try:
+                # Embed the query once and share it between both indexes
+                with metrics.span("embed"):
+                    q_vec = [embed_query(user_input, deadline)]
+                with metrics.span("retrieve"):
+                    if index:
+                        retrieved.extend(retrieve_chunks(user_input, index, lambda x: q_vec, top_k=5, mmr=True))
+                    with upload_jobs.lock:
+                        if upload_jobs.index:
+                            retrieved.extend(retrieve_chunks(user_input, upload_jobs.index, lambda x: q_vec, top_k=3, mmr=True))
+            except Exception as e:
+                # Answer without (or with partial) context rather than failing the turn
+                logging.getLogger(__name__).warning(f"Retrieval failed: {e}")
+                metrics.count("turn.retrieval_failed")
+
+            # Neighbouring chunks from the same source are merged so overlaps aren't sent twice
+            with metrics.span("context"):
+                context = assemble_context(retrieved)
+            session.last_context = context
+        elif route.intent == CONFIRMATION and not is_meeting_followup(last_assistant):
+            # "Yes" to "want to know more?" continues the previous topic
+            context = session.last_context
+        else:
+            context = ""
+        history_pairs = [(h["user"], h["assistant"]) for h in session.history]
+        with metrics.span("prompt"):
+            prompt = build_prompt(context, user_input, history_pairs, meeting_status=session.meeting_scheduled)
         
         messages = [{"role": "user", "content": prompt}]
-        response = client.chat.completions.create(model="gpt-4o-mini", messages=messages, tools=TOOLS, tool_choice="auto")
-        resp_msg = response.choices[0].message
-        
-        if resp_msg.tool_calls:
-            messages.append(resp_msg)
-            for tool_call in resp_msg.tool_calls:
-                args = json.loads(tool_call.function.arguments)
-                action_result = schedule_meeting(**args)
-                if "SUCCESS" in action_result: meeting_scheduled_in_session = True
-                messages.append({"tool_call_id": tool_call.id, "role": "tool", "name": "schedule_meeting", "content": action_result})
-            final_resp = client.chat.completions.create(model="gpt-4o-mini", messages=messages)
-            answer = final_resp.choices[0].message.content
-        else:
-            answer = resp_msg.content
+        metrics.annotate(prompt_chars=len(prompt), context_chars=len(context))
+        try:
+            # Hedged and retried within the turn's budget (see rag/resilience.py)
+            with metrics.span("llm"):
+                response = chat_completion(client, deadline, model="gpt-4o-mini", messages=messages,
+                                           tools=TOOLS, tool_choice="auto")
+            resp_msg = response.choices[0].message
+
+            if resp_msg.tool_calls:
+                with metrics.span("tools"):
+                    answer = run_tool_loop(client, messages, resp_msg, on_result=on_tool_result, deadline=deadline)
+            else:
+                answer = resp_msg.content
+        except Exception as e:
+            # Model unreachable or too slow: answer from the retrieved context alone
+            logging.getLogger(__name__).warning(f"Chat completion failed: {e}")
+            metrics.count("turn.fallback")
+            answer = fallback_answer(context)
 
         # 4. OUTPUT
         print(f"\n🤖 Bot: {answer}")
-        if is_voice_mode or voice_output_enabled: 
-            speak_text(client, answer)
+        if is_voice_mode or session.voice_output: 
+            try:
+                with metrics.span("tts"):
+                    speak_text(get_client("tts"), answer)
+            except Exception as e:
+                print(f" Could not play the voice reply: {e}")
+        metrics.end_turn()
         
         print("-" * 60)
-        conversation_history.append({"user": user_input, "assistant": answer})
-        if len(conversation_history) > MAX_MEMORY_TURNS:
-            conversation_history.pop(0)
+        session.add_turn(user_input, answer, max_turns=MAX_MEMORY_TURNS)
+        sessions.save(session)
 
 except KeyboardInterrupt:
     print("\n👋Session ended. Goodbye!")
+finally:
+    upload_jobs.shutdown()
+    with upload_jobs.lock:
+        session.temp_index = upload_jobs.index
+    sessions.flush()
+    if snapshot_watcher:
+        snapshot_watcher.stop()
+    if index and "shards" in index:
+        index["shards"].close()
+    close_client()
 # finally:
 #     clear_tmp_dir(str(TMP_UPLOAD_DIR))
\ No newline at end of file
@@ -0,0 +1,124 @@
+# app/rag/batching.py
+"""
+Request coalescing for concurrent sessions.
+
+A MicroBatcher owns one worker thread. Callers hand it a single item and
+block; the worker takes everything that is queued (up to max_batch), runs the
+batch function once and hands each caller its own result.
+
+Waiting for more requests only happens under load: if the previous batch had
+a single item, the next one is dispatched immediately, so a lone user never
+pays for batching. Otherwise the worker waits up to max_wait_ms for
+companions, which is the cap on the latency batching can add.
+
+Environment:
+    RAG_BATCHING          "0" to call the batch functions inline (no coalescing)
+    RAG_BATCH_WAIT_MS     Max wait for companions under load (default 2)
+    RAG_BATCH_MAX         Max items per batch (default 32)
+"""
+import os
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, List, Optional
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.getenv("RAG_BATCHING", "1") != "0"
+MAX_WAIT_MS = float(os.getenv("RAG_BATCH_WAIT_MS", "2"))
+MAX_BATCH = int(os.getenv("RAG_BATCH_MAX", "32"))
+
+_batchers: List["MicroBatcher"] = []
+
+
+class MicroBatcher:
+    """
+    Coalesces single-item calls into batched calls of 'fn'.
+
+    Args:
+        fn (function): list of items -> list of results (same length and order).
+            An Exception instance in place of a result is raised to that
+            item's caller only; if fn itself raises, every caller gets the error.
+        name (str): Used for the worker thread and the metrics counters.
+        max_batch (int): Upper bound on items per call.
+        max_wait_ms (float): How long a loaded worker waits to fill a batch.
+        enabled (bool): False runs fn([item]) inline on the caller's thread.
+    """
+
+    def __init__(self, fn: Callable[[List[Any]], List[Any]], name: str, max_batch: int = MAX_BATCH,
+                 max_wait_ms: float = MAX_WAIT_MS, enabled: bool = ENABLED):
+        self.fn = fn
+        self.name = name
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.enabled = enabled
+        self._queue: "queue.Queue" = queue.Queue()
+        self._busy = False          # Last batch had company: worth waiting a little
+        self._thread = None
+        self._start_lock = threading.Lock()
+        _batchers.append(self)
+
+    def __call__(self, item: Any, timeout: Optional[float] = None) -> Any:
+        """
+        Submits one item and blocks until its result is ready (TimeoutError
+        after 'timeout' seconds; the batch itself still completes).
+        """
+        if not self.enabled:
+            result = self.fn([item])[0]
+            if isinstance(result, Exception):
+                raise result
+            return result
+        return self.submit(item).result(timeout=timeout)
+
+    def submit(self, item: Any) -> Future:
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name=f"batch-{self.name}", daemon=True)
+                    self._thread.start()
+        future: Future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def _collect(self) -> List[Any]:
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + (self.max_wait if self._busy else 0.0)
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                # Always drain what is already queued; only block while under load
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        self._busy = len(batch) > 1
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect()
+            metrics.count(f"batch.{self.name}.calls")
+            metrics.count(f"batch.{self.name}.items", len(batch))
+            try:
+                results = self.fn([item for item, _ in batch])
+                if len(results) != len(batch):
+                    raise RuntimeError(f"{self.name}: got {len(results)} results for {len(batch)} items")
+            except Exception as e:
+                logger.error(f"Batched {self.name} call failed: {e}")
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), result in zip(batch, results):
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+
+def set_batching(enabled: bool) -> None:
+    """Turns coalescing on or off for every batcher (e.g. for A/B benchmarks)."""
+    for batcher in _batchers:
+        batcher.enabled = enabled
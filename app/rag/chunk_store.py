@@ -0,0 +1,271 @@
+# app/rag/chunk_store.py
+import os
+import json
+from typing import List, Dict, Any, Optional, Iterable
+
+import numpy as np
+
+# Metadata keys that live in typed columns ('text_preview' is not stored: it is
+# just the first 100 characters of the chunk). Anything else goes to a sparse 'extras' map.
+_COLUMN_KEYS = {"source", "sources", "type", "start", "page", "updated_at", "duplicates", "text_preview"}
+
+_ARRAYS = ("offsets", "source_id", "type_id", "start", "page", "updated_at",
+           "duplicates", "src_offsets", "src_ids")
+
+
+def _int_or_missing(value) -> int:
+    """Integer columns use -1 for 'not set'."""
+    return -1 if value is None else int(value)
+
+
+class ChunkStore:
+    """
+    Columnar storage for chunk text and metadata, addressed by FAISS id.
+
+    - Text: one UTF-8 blob plus an int64 'offsets' array (chunk i is blob[offsets[i]:offsets[i+1]]).
+    - Metadata: typed NumPy columns (source id, type id, start offset, page, timestamp,
+      duplicate count) plus a CSR list of every source a deduplicated chunk came from.
+    - Repeated strings (source names, types) are stored once in small lookup tables.
+
+    Saved stores are opened with np.load(mmap_mode="r"), so nothing is read into
+    Python objects until a specific id is looked up.
+    """
+
+    def __init__(self):
+        self.blob = np.zeros(0, dtype=np.uint8)
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.source_id = np.zeros(0, dtype=np.int32)
+        self.type_id = np.zeros(0, dtype=np.int16)
+        self.start = np.zeros(0, dtype=np.int64)
+        self.page = np.zeros(0, dtype=np.int32)
+        self.updated_at = np.zeros(0, dtype=np.int64)
+        self.duplicates = np.zeros(0, dtype=np.int32)
+        self.src_offsets = np.zeros(1, dtype=np.int64)
+        self.src_ids = np.zeros(0, dtype=np.int32)
+        self.source_names: List[str] = []
+        self.type_names: List[str] = []
+        self.extras: Dict[int, Dict[str, Any]] = {}
+        self._source_lookup: Dict[str, int] = {}
+        self._type_lookup: Dict[str, int] = {}
+        # Views that behave like the old 'texts' / 'metadatas' lists
+        self.texts = _TextView(self)
+        self.metadatas = _MetadataView(self)
+
+    @classmethod
+    def from_lists(cls, texts: List[str], metadatas: List[Dict[str, Any]]) -> "ChunkStore":
+        store = cls()
+        store.extend(texts, metadatas)
+        return store
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    # --- String tables -----------------------------------------------------
+
+    def _intern_source(self, name) -> int:
+        if name is None:
+            return -1
+        name = str(name)
+        sid = self._source_lookup.get(name)
+        if sid is None:
+            sid = len(self.source_names)
+            self.source_names.append(name)
+            self._source_lookup[name] = sid
+        return sid
+
+    def _intern_type(self, name) -> int:
+        if name is None:
+            return -1
+        tid = self._type_lookup.get(name)
+        if tid is None:
+            tid = len(self.type_names)
+            self.type_names.append(name)
+            self._type_lookup[name] = tid
+        return tid
+
+    # --- Writes ------------------------------------------------------------
+
+    def extend(self, texts: List[str], metadatas: List[Dict[str, Any]]) -> None:
+        """Appends chunks; ids continue from the current length (same as FAISS add)."""
+        if len(texts) != len(metadatas):
+            raise ValueError("texts and metadatas must have the same length.")
+        if not texts:
+            return
+
+        base = len(self)
+        encoded = [t.encode("utf-8") for t in texts]
+        lengths = np.fromiter((len(b) for b in encoded), dtype=np.int64, count=len(encoded))
+        new_offsets = self.offsets[-1] + np.cumsum(lengths)
+
+        n = len(texts)
+        source_id = np.empty(n, dtype=np.int32)
+        type_id = np.empty(n, dtype=np.int16)
+        start = np.empty(n, dtype=np.int64)
+        page = np.empty(n, dtype=np.int32)
+        updated_at = np.empty(n, dtype=np.int64)
+        duplicates = np.empty(n, dtype=np.int32)
+        src_counts = np.empty(n, dtype=np.int64)
+        src_ids: List[int] = []
+
+        for i, meta in enumerate(metadatas):
+            source_id[i] = self._intern_source(meta.get("source"))
+            type_id[i] = self._intern_type(meta.get("type"))
+            start[i] = _int_or_missing(meta.get("start"))
+            page[i] = _int_or_missing(meta.get("page"))
+            updated_at[i] = _int_or_missing(meta.get("updated_at"))
+            duplicates[i] = meta.get("duplicates") or 0
+            sources = meta.get("sources") or []
+            src_counts[i] = len(sources)
+            src_ids.extend(self._intern_source(s) for s in sources)
+            extra = {k: v for k, v in meta.items() if k not in _COLUMN_KEYS}
+            if extra:
+                self.extras[base + i] = extra
+
+        self.blob = np.concatenate([np.asarray(self.blob), np.frombuffer(b"".join(encoded), dtype=np.uint8)])
+        self.offsets = np.concatenate([np.asarray(self.offsets), new_offsets])
+        self.source_id = np.concatenate([np.asarray(self.source_id), source_id])
+        self.type_id = np.concatenate([np.asarray(self.type_id), type_id])
+        self.start = np.concatenate([np.asarray(self.start), start])
+        self.page = np.concatenate([np.asarray(self.page), page])
+        self.updated_at = np.concatenate([np.asarray(self.updated_at), updated_at])
+        self.duplicates = np.concatenate([np.asarray(self.duplicates), duplicates])
+        self.src_offsets = np.concatenate([np.asarray(self.src_offsets), self.src_offsets[-1] + np.cumsum(src_counts)])
+        self.src_ids = np.concatenate([np.asarray(self.src_ids), np.asarray(src_ids, dtype=np.int32)])
+
+    def delete(self, positions: Iterable[int]) -> None:
+        """
+        Removes chunks and compacts the remaining ids, keeping their order
+        (mirrors IndexFlat.remove_ids).
+        """
+        drop = np.zeros(len(self), dtype=bool)
+        drop[np.fromiter((int(p) for p in positions), dtype=np.int64)] = True
+        if not drop.any():
+            return
+        keep = ~drop
+
+        # Rebuild the blob from the kept byte ranges
+        lengths = np.diff(self.offsets)
+        byte_keep = np.repeat(keep, lengths)
+        self.blob = np.asarray(self.blob)[byte_keep]
+        self.offsets = np.concatenate([[0], np.cumsum(lengths[keep])]).astype(np.int64)
+
+        src_counts = np.diff(self.src_offsets)
+        self.src_ids = np.asarray(self.src_ids)[np.repeat(keep, src_counts)]
+        self.src_offsets = np.concatenate([[0], np.cumsum(src_counts[keep])]).astype(np.int64)
+
+        for name in ("source_id", "type_id", "start", "page", "updated_at", "duplicates"):
+            setattr(self, name, np.asarray(getattr(self, name))[keep])
+
+        # Re-key extras to the new positions
+        new_ids = np.cumsum(keep) - 1
+        self.extras = {int(new_ids[i]): v for i, v in self.extras.items() if keep[i]}
+
+    # --- Reads -------------------------------------------------------------
+
+    def text(self, i: int) -> str:
+        i = int(i)
+        return bytes(self.blob[self.offsets[i]:self.offsets[i + 1]]).decode("utf-8")
+
+    def metadata(self, i: int) -> Dict[str, Any]:
+        """Builds the metadata dict for one chunk (only called for retrieved ids)."""
+        i = int(i)
+        meta: Dict[str, Any] = {}
+        if self.source_id[i] >= 0:
+            meta["source"] = self.source_names[self.source_id[i]]
+        if self.type_id[i] >= 0:
+            meta["type"] = self.type_names[self.type_id[i]]
+        if self.start[i] >= 0:
+            meta["start"] = int(self.start[i])
+        if self.page[i] >= 0:
+            meta["page"] = int(self.page[i])
+        if self.updated_at[i] >= 0:
+            meta["updated_at"] = int(self.updated_at[i])
+        lo, hi = self.src_offsets[i], self.src_offsets[i + 1]
+        if hi > lo:
+            meta["sources"] = [self.source_names[s] for s in self.src_ids[lo:hi]]
+            meta["duplicates"] = int(self.duplicates[i])
+        meta.update(self.extras.get(i, {}))
+        return meta
+
+    def positions_for_source(self, source: str) -> List[int]:
+        """All chunk ids whose primary source is 'source' (vectorized column scan)."""
+        sid = self._source_lookup.get(str(source))
+        if sid is None:
+            return []
+        return np.nonzero(np.asarray(self.source_id) == sid)[0].tolist()
+
+    def nbytes(self) -> int:
+        return int(sum(np.asarray(getattr(self, name)).nbytes for name in ("blob",) + _ARRAYS))
+
+    # --- Persistence -------------------------------------------------------
+
+    def save(self, directory: str) -> None:
+        """Writes the store as flat files that 'load' can memory-map."""
+        os.makedirs(directory, exist_ok=True)
+        np.asarray(self.blob).tofile(os.path.join(directory, "texts.bin"))
+        for name in _ARRAYS:
+            np.save(os.path.join(directory, f"{name}.npy"), np.asarray(getattr(self, name)))
+        with open(os.path.join(directory, "tables.json"), "w", encoding="utf-8") as f:
+            json.dump({
+                "source_names": self.source_names,
+                "type_names": self.type_names,
+                "extras": {str(k): v for k, v in self.extras.items()},
+            }, f)
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> "ChunkStore":
+        """
+        Opens a saved store. With mmap=True the arrays stay on disk and pages are
+        read by the OS only when touched; call 'extend'/'delete' to get in-memory copies.
+        """
+        store = cls()
+        mode: Optional[str] = "r" if mmap else None
+        blob_path = os.path.join(directory, "texts.bin")
+        if os.path.getsize(blob_path) == 0:
+            store.blob = np.zeros(0, dtype=np.uint8)
+        elif mmap:
+            store.blob = np.memmap(blob_path, dtype=np.uint8, mode="r")
+        else:
+            store.blob = np.fromfile(blob_path, dtype=np.uint8)
+        for name in _ARRAYS:
+            setattr(store, name, np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mode))
+        with open(os.path.join(directory, "tables.json"), "r", encoding="utf-8") as f:
+            tables = json.load(f)
+        store.source_names = tables["source_names"]
+        store.type_names = tables["type_names"]
+        store.extras = {int(k): v for k, v in tables.get("extras", {}).items()}
+        store._source_lookup = {n: i for i, n in enumerate(store.source_names)}
+        store._type_lookup = {n: i for i, n in enumerate(store.type_names)}
+        return store
+
+
+class _TextView:
+    """Read-only list-like access: store.texts[i] -> str."""
+
+    def __init__(self, store: ChunkStore):
+        self._store = store
+
+    def __len__(self) -> int:
+        return len(self._store)
+
+    def __getitem__(self, i):
+        return self._store.text(i)
+
+    def __iter__(self):
+        return (self._store.text(i) for i in range(len(self._store)))
+
+
+class _MetadataView:
+    """Read-only list-like access: store.metadatas[i] -> dict (built on demand)."""
+
+    def __init__(self, store: ChunkStore):
+        self._store = store
+
+    def __len__(self) -> int:
+        return len(self._store)
+
+    def __getitem__(self, i):
+        return self._store.metadata(i)
+
+    def __iter__(self):
+        return (self._store.metadata(i) for i in range(len(self._store)))
@@ -39,3 +39,14 @@ def chunk_text(text, chunk_size=500, chunk_overlap=100):
         
     # Return the completed list of segments to be converted into embeddings.
     return chunks
+
+def chunk_text_with_offsets(text, chunk_size=500, chunk_overlap=100):
+    """
+    Same splitting as chunk_text, but also reports where each chunk starts.
+    The offsets let the context assembler stitch neighbouring chunks back together.
+
+    Returns:
+        list[tuple[int, str]]: (start offset in 'text', chunk) pairs.
+    """
+    step = chunk_size - chunk_overlap
+    return [(start, text[start:start + chunk_size]) for start in range(0, len(text), step)]
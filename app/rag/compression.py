@@ -0,0 +1,227 @@
+# app/rag/compression.py
+"""
+Compact vector representations with two-stage search.
+
+A compression spec such as "int8", "fp16", "pq", "pq48", "dim512" or
+"dim256+int8" selects the first-pass index:
+- "dimN": Matryoshka truncation to the first N dimensions (re-normalized).
+- "fp16" / "int8": FAISS scalar quantization (2x / 4x smaller than float32).
+- "pq" / "pqM": product quantization with M one-byte codes per vector.
+
+The first pass returns extra candidates, which are then rescored exactly against
+the full-precision float32 vectors kept on disk (memory-mapped .npy).
+
+Evaluate recall@k and bytes per vector on a saved matrix with:
+    python -m rag.compression vectors.npy [k] [spec ...]
+"""
+import os
+import sys
+import time
+from typing import Dict, Any, Optional, List
+
+import faiss
+import numpy as np
+
+RESCORE_FACTOR = 4   # First-pass candidates per requested result
+
+
+def parse_compression(spec: Optional[str]) -> Dict[str, Any]:
+    """
+    Turns a spec string into {"dim": int|None, "quant": "none"|"fp16"|"int8"|"pq", "pq_m": int|None}.
+    """
+    config = {"dim": None, "quant": "none", "pq_m": None}
+    if not spec or spec == "none":
+        return config
+    for part in spec.lower().split("+"):
+        if part.startswith("dim"):
+            config["dim"] = int(part[3:])
+        elif part in ("fp16", "int8"):
+            config["quant"] = part
+        elif part.startswith("pq"):
+            config["quant"] = "pq"
+            config["pq_m"] = int(part[2:]) if part[2:] else None
+        else:
+            raise ValueError(f"Unknown compression option: {part}")
+    return config
+
+
+def truncate_vectors(mat: np.ndarray, dim: Optional[int]) -> np.ndarray:
+    """
+    Matryoshka truncation: keep the first 'dim' values and re-normalize.
+    text-embedding-3 models are trained so these prefixes stay meaningful.
+    """
+    mat = np.ascontiguousarray(mat, dtype="float32")
+    if not dim or dim >= mat.shape[1]:
+        return mat
+    # Always a copy: a one-row slice is already contiguous, and normalizing a
+    # view in place would overwrite the caller's query vector
+    out = np.array(mat[:, :dim], dtype="float32", order="C", copy=True)
+    out /= np.linalg.norm(out, axis=1, keepdims=True) + 1e-12
+    return out
+
+
+def _pq_params(n: int, d: int, m: Optional[int]):
+    """Picks a PQ layout that divides 'd' and can be trained on 'n' vectors."""
+    m = m or max(1, d // 8)
+    while d % m:
+        m -= 1
+    # k-means needs at least 2^nbits training points per sub-quantizer
+    nbits = int(max(1, min(8, np.floor(np.log2(max(n, 2))))))
+    return m, nbits
+
+
+def build_first_pass(mat: np.ndarray, config: Dict[str, Any]):
+    """Builds (and trains, if needed) the compact first-pass FAISS index."""
+    d = mat.shape[1]
+    quant = config["quant"]
+    if quant == "none":
+        index = faiss.IndexFlatL2(d)
+    elif quant == "fp16":
+        index = faiss.IndexScalarQuantizer(d, faiss.ScalarQuantizer.QT_fp16)
+    elif quant == "int8":
+        index = faiss.IndexScalarQuantizer(d, faiss.ScalarQuantizer.QT_8bit)
+    elif quant == "pq":
+        m, nbits = _pq_params(len(mat), d, config.get("pq_m"))
+        index = faiss.IndexPQ(d, m, nbits)
+        # Small corpora are fine to train on; skip FAISS's "too few points" warning
+        index.pq.cp.min_points_per_centroid = 1
+    else:
+        raise ValueError(f"Unknown quantizer: {quant}")
+    if not index.is_trained:
+        index.train(mat)
+    index.add(mat)
+    return index
+
+
+class Rescorer:
+    """
+    Holds the full-precision vectors for a compressed index and reorders
+    first-pass candidates by exact L2 distance.
+    """
+
+    def __init__(self, full: np.ndarray, config: Dict[str, Any]):
+        self.full = full          # float32 (n, dim); usually a read-only memmap
+        self.config = config
+
+    def transform(self, q_mat: np.ndarray) -> np.ndarray:
+        """Maps queries into the first-pass space (truncation, if any)."""
+        return truncate_vectors(q_mat, self.config.get("dim"))
+
+    def vectors(self, ids) -> np.ndarray:
+        ids = np.asarray(ids, dtype=np.int64)
+        # Sorted reads are friendlier to the page cache for memmapped files
+        order = np.argsort(ids)
+        out = np.empty((len(ids), self.full.shape[1]), dtype="float32")
+        out[order] = self.full[ids[order]]
+        return out
+
+    def rescore(self, q_vec: np.ndarray, ids: np.ndarray, k: int):
+        """
+        Returns:
+            tuple: (ids, exact squared-L2 distances), nearest first, at most k.
+        """
+        if not len(ids):
+            return ids, np.zeros(0, dtype="float32")
+        cand = self.vectors(ids)
+        dists = ((cand - q_vec) ** 2).sum(axis=1)
+        order = np.argsort(dists)[:k]
+        return ids[order], dists[order]
+
+    def append(self, mat: np.ndarray) -> None:
+        self.full = np.concatenate([np.asarray(self.full), np.asarray(mat, dtype="float32")])
+
+    def delete(self, positions) -> None:
+        self.full = np.delete(np.asarray(self.full), np.asarray(list(positions), dtype=np.int64), axis=0)
+
+    def nbytes_per_vector(self, first_pass) -> float:
+        """Resident bytes per vector for the first-pass index (full vectors stay on disk)."""
+        return faiss.serialize_index(first_pass).nbytes / max(first_pass.ntotal, 1)
+
+
+def write_full_vectors(mat: np.ndarray, path: str) -> np.ndarray:
+    """Saves the float32 vectors and re-opens them memory-mapped."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    np.save(path, np.ascontiguousarray(mat, dtype="float32"))
+    return np.load(path, mmap_mode="r")
+
+
+def two_stage_search_many(first_pass, rescorer: Rescorer, q_mat: np.ndarray, k: int,
+                          factor: int = RESCORE_FACTOR):
+    """
+    two_stage_search for several queries: one multi-row first pass over the
+    compact index, then exact rescoring of each row's candidates.
+
+    Returns:
+        list[tuple]: One (ids, distances) pair per query row, nearest first.
+    """
+    q_mat = np.ascontiguousarray(q_mat, dtype="float32").reshape(len(q_mat), -1)
+    fetch = min(k * factor, first_pass.ntotal)
+    if fetch <= 0 or not len(q_mat):
+        return [(np.zeros(0, dtype=np.int64), np.zeros(0, dtype="float32")) for _ in q_mat]
+    _, I = first_pass.search(rescorer.transform(q_mat), fetch)
+    return [rescorer.rescore(q_mat[i], I[i][I[i] >= 0], k) for i in range(len(q_mat))]
+
+
+def two_stage_search(first_pass, rescorer: Rescorer, q_vec: np.ndarray, k: int,
+                     factor: int = RESCORE_FACTOR):
+    """
+    Compact first pass for k * factor candidates, then exact rescoring.
+
+    Returns:
+        tuple: (ids, distances) as 1-D arrays, nearest first.
+    """
+    q_vec = np.asarray(q_vec, dtype="float32").reshape(1, -1)
+    return two_stage_search_many(first_pass, rescorer, q_vec, k, factor)[0]
+
+
+def evaluate_recall(vectors: np.ndarray, queries: np.ndarray, specs: List[str], k: int = 10) -> List[Dict[str, Any]]:
+    """
+    Measures recall@k of each compression spec (with rescoring) against exact search.
+
+    Returns:
+        list[dict]: One row per spec with recall, bytes/vector, compression ratio and latency.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    queries = np.ascontiguousarray(queries, dtype="float32")
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(vectors)
+    _, truth = exact.search(queries, k)
+    full_bytes = vectors.shape[1] * 4
+
+    rows = []
+    for spec in specs:
+        config = parse_compression(spec)
+        first = build_first_pass(truncate_vectors(vectors, config["dim"]), config)
+        rescorer = Rescorer(vectors, config)
+        hits = 0
+        t0 = time.perf_counter()
+        for qi, q in enumerate(queries):
+            ids, _ = two_stage_search(first, rescorer, q, k)
+            hits += len(set(ids.tolist()) & set(truth[qi].tolist()))
+        elapsed = time.perf_counter() - t0
+        per_vec = rescorer.nbytes_per_vector(first)
+        rows.append({
+            "spec": spec,
+            "recall_at_k": hits / (k * len(queries)),
+            "bytes_per_vector": round(per_vec, 1),
+            "compression": round(full_bytes / per_vec, 1),
+            "ms_per_query": round(1000 * elapsed / max(len(queries), 1), 3),
+        })
+    return rows
+
+
+if __name__ == "__main__":
+    # Usage: python -m rag.compression vectors.npy [k] [spec ...]
+    if len(sys.argv) < 2:
+        sys.exit("usage: python -m rag.compression vectors.npy [k] [spec ...]")
+    data = np.load(sys.argv[1]).astype("float32")
+    top_k = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    specs = sys.argv[3:] or ["none", "fp16", "int8", "pq", "dim512", "dim256+int8"]
+    # Hold out up to 200 vectors (slightly perturbed) as queries
+    rng = np.random.default_rng(0)
+    q_idx = rng.choice(len(data), size=min(200, len(data)), replace=False)
+    queries = data[q_idx] + rng.normal(scale=0.01, size=(len(q_idx), data.shape[1])).astype("float32")
+    print(f"{'spec':<14} {'recall@' + str(top_k):>10} {'bytes/vec':>10} {'x smaller':>10} {'ms/query':>10}")
+    for row in evaluate_recall(data, queries, specs, top_k):
+        print(f"{row['spec']:<14} {row['recall_at_k']:>10.3f} {row['bytes_per_vector']:>10} "
+              f"{row['compression']:>10} {row['ms_per_query']:>10}")
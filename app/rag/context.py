@@ -0,0 +1,60 @@
+# app/rag/context.py
+from typing import List, Dict, Any
+
+def _source_label(metadata: Dict[str, Any]) -> str:
+    sources = metadata.get("sources") or [metadata.get("source", "unknown")]
+    return ", ".join(str(s) for s in sources)
+
+def merge_spans(hits: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Groups retrieved chunks by source and merges overlapping or adjacent ones
+    into contiguous spans, so the 100-character chunk overlap is sent only once.
+
+    Chunks without a 'start' offset in their metadata are kept as they are.
+
+    Returns:
+        list[dict]: Spans as {"label", "text", "start", "end"}, ordered by the
+        rank of their best-scoring chunk.
+    """
+    groups = {}
+    for rank, hit in enumerate(hits):
+        meta = hit.get("metadata") or {}
+        start = meta.get("start")
+        if start is None:
+            key = ("__unplaced__", rank)
+        else:
+            key = (meta.get("type"), meta.get("source"))
+        groups.setdefault(key, []).append((rank, hit))
+
+    spans = []
+    for items in groups.values():
+        # Sort each source's hits by position in the original document
+        items.sort(key=lambda it: (it[1]["metadata"].get("start") or 0))
+        current = None
+        for rank, hit in items:
+            meta = hit["metadata"]
+            start = meta.get("start") or 0
+            text = hit["text"]
+            end = start + len(text)
+            if current is not None and start <= current["end"]:
+                # Overlapping or touching: append only the part we haven't seen yet
+                if end > current["end"]:
+                    current["text"] += text[current["end"] - start:]
+                    current["end"] = end
+                current["rank"] = min(current["rank"], rank)
+                continue
+            current = {"label": _source_label(meta), "text": text,
+                       "start": start, "end": end, "rank": rank}
+            spans.append(current)
+
+    spans.sort(key=lambda s: s["rank"])
+    for span in spans:
+        del span["rank"]
+    return spans
+
+def assemble_context(hits: List[Dict[str, Any]]) -> str:
+    """
+    Builds the [KNOWLEDGE BASE] text for the prompt from retrieved chunks,
+    one merged span per block, each tagged with its source.
+    """
+    return "\n\n".join(f"[Source: {s['label']}]\n{s['text']}" for s in merge_spans(hits))
@@ -0,0 +1,140 @@
+# app/rag/dedup.py
+import re
+import hashlib
+import logging
+from typing import List, Tuple, Dict, Any
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# MinHash / LSH settings.
+# 128 permutations split into 32 bands of 4 rows: pairs with Jaccard ~0.6+ almost
+# always share a band, and every candidate is then checked against 'threshold'.
+NUM_PERM = 128
+NUM_BANDS = 32
+SHINGLE_SIZE = 5
+NEAR_DUP_THRESHOLD = 0.85
+
+# Multiply-shift hash family: h(x) = ((a * x + b) mod 2^64) >> 32, with odd 'a'.
+# uint64 arithmetic wraps, so no explicit modulo is needed.
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_rng = np.random.RandomState(1)
+_PERM_A = _rng.randint(0, np.iinfo(np.uint64).max, size=NUM_PERM, dtype=np.uint64) | np.uint64(1)
+_PERM_B = _rng.randint(0, np.iinfo(np.uint64).max, size=NUM_PERM, dtype=np.uint64)
+
+_WS = re.compile(r"\s+")
+
+
+def normalize(text: str) -> str:
+    """Lowercases and collapses whitespace so trivial formatting differences don't matter."""
+    return _WS.sub(" ", text).strip().lower()
+
+
+def content_hash(text: str) -> str:
+    """Exact-duplicate key for a chunk (after normalization)."""
+    return _digest(normalize(text).encode("utf-8"))
+
+
+def minhash_signature(text: str) -> np.ndarray:
+    """
+    Builds a MinHash signature from character shingles.
+
+    Returns:
+        np.ndarray: NUM_PERM uint64 values; matching positions estimate Jaccard similarity.
+    """
+    return _signature(normalize(text).encode("utf-8"))
+
+
+def _digest(norm_bytes: bytes) -> str:
+    return hashlib.blake2b(norm_bytes, digest_size=16).hexdigest()
+
+
+def _signature(norm_bytes: bytes) -> np.ndarray:
+    data = np.frombuffer(norm_bytes, dtype=np.uint8).astype(np.uint64)
+    if len(data) < SHINGLE_SIZE:
+        data = np.pad(data, (0, SHINGLE_SIZE - len(data)))
+
+    # Polynomial hash of every SHINGLE_SIZE-byte window, computed in one vectorized pass
+    n = len(data) - SHINGLE_SIZE + 1
+    hv = np.zeros(n, dtype=np.uint64)
+    for k in range(SHINGLE_SIZE):
+        hv = hv * np.uint64(257) + data[k:k + n]
+    hv = np.unique(hv)
+
+    # NUM_PERM hash permutations at once
+    with np.errstate(over="ignore"):
+        phv = (hv[:, None] * _PERM_A + _PERM_B) >> np.uint64(32)
+    return phv.min(axis=0)
+
+
+def dedupe_chunks(chunks: List[str], metadatas: List[Dict[str, Any]],
+                  threshold: float = NEAR_DUP_THRESHOLD) -> Tuple[List[str], List[Dict[str, Any]]]:
+    """
+    Removes exact and near-duplicate chunks before embedding.
+
+    The first occurrence is kept. Its metadata gets a 'sources' list naming every
+    source the text appeared in, and 'duplicates' counting the copies dropped.
+
+    Args:
+        chunks (list[str]): Chunk texts, in ingestion order.
+        metadatas (list[dict]): One metadata dict per chunk (copied, never mutated).
+        threshold (float): Minimum estimated Jaccard similarity to count as a near-duplicate.
+
+    Returns:
+        tuple: (unique_chunks, unique_metadatas)
+    """
+    kept_chunks: List[str] = []
+    kept_metas: List[Dict[str, Any]] = []
+    kept_sigs: List[np.ndarray] = []
+    by_hash: Dict[str, int] = {}
+    buckets: Dict[Tuple[int, bytes], List[int]] = {}
+    rows = NUM_PERM // NUM_BANDS
+
+    def merge_into(keep: int, meta: Dict[str, Any]) -> None:
+        target = kept_metas[keep]
+        source = meta.get("source")
+        if source is not None and source not in target["sources"]:
+            target["sources"].append(source)
+        target["duplicates"] += 1
+
+    for text, meta in zip(chunks, metadatas):
+        # 1. Exact duplicates: O(1) hash lookup
+        norm = normalize(text).encode("utf-8")
+        key = _digest(norm)
+        if key in by_hash:
+            merge_into(by_hash[key], meta)
+            continue
+
+        # 2. Near duplicates: only compare against chunks sharing an LSH band
+        sig = _signature(norm)
+        band_keys = [(b, sig[b * rows:(b + 1) * rows].tobytes()) for b in range(NUM_BANDS)]
+        candidates = {i for bk in band_keys for i in buckets.get(bk, ())}
+        match = None
+        if candidates:
+            cand = np.fromiter(sorted(candidates), dtype=np.int64, count=len(candidates))
+            similarity = (np.stack([kept_sigs[i] for i in cand]) == sig).mean(axis=1)
+            hits = np.nonzero(similarity >= threshold)[0]
+            if len(hits):
+                match = int(cand[hits[0]])
+        if match is not None:
+            by_hash[key] = match
+            merge_into(match, meta)
+            continue
+
+        # 3. New unique chunk
+        idx = len(kept_chunks)
+        new_meta = dict(meta)
+        new_meta["sources"] = [meta["source"]] if meta.get("source") is not None else []
+        new_meta["duplicates"] = 0
+        kept_chunks.append(text)
+        kept_metas.append(new_meta)
+        kept_sigs.append(sig)
+        by_hash[key] = idx
+        for bk in band_keys:
+            buckets.setdefault(bk, []).append(idx)
+
+    dropped = len(chunks) - len(kept_chunks)
+    if dropped:
+        logger.info(f"Deduplication removed {dropped} of {len(chunks)} chunks before embedding.")
+    return kept_chunks, kept_metas
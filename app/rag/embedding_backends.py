@@ -0,0 +1,264 @@
+# app/rag/embedding_backends.py
+"""
+Embedding backends.
+
+Pick one with RAG_EMBEDDING_BACKEND:
+- "openai" (default): text-embedding-3-small over the API.
+- "onnx:<model_dir>": a local sentence-embedding model on CPU. <model_dir> holds
+  model.onnx (or model_quantized.onnx) and tokenizer.json, e.g. an export of
+  all-MiniLM-L6-v2 or bge-small-en. Needs the optional 'onnxruntime' and
+  'tokenizers' packages. RAG_EMBEDDING_THREADS caps the CPU threads.
+- "hash": dependency-free feature hashing of words and word pairs. Lexical only,
+  but deterministic and instant, for offline tests and benchmarks.
+
+Every backend returns a float32 matrix of L2-normalized rows (OpenAI vectors
+already are) and describes itself with info(), which is stored next to each
+index so vectors from different backends are never mixed.
+"""
+import os
+import re
+import hashlib
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from . import metrics
+from .resilience import hedged_call
+
+OPENAI_MODEL = "text-embedding-3-small"
+OPENAI_MODEL_DIMS = {"text-embedding-3-small": 1536, "text-embedding-3-large": 3072,
+                     "text-embedding-ada-002": 1536}
+OPENAI_BATCH_SIZE = 256   # Inputs per embeddings request (the API accepts up to 2048)
+BATCH_SIZE = 32
+MAX_TOKENS = 256          # Local models: truncate longer chunks
+HASH_DIM = 384
+
+
+class EmbeddingError(RuntimeError):
+    """
+    Some texts failed to embed. 'failed' lists their positions; 'vectors' is
+    aligned with the input texts and holds None at those positions.
+    """
+
+    def __init__(self, message: str, failed: List[int], vectors: List[Optional[np.ndarray]]):
+        super().__init__(message)
+        self.failed = failed
+        self.vectors = vectors
+
+
+def _normalize_rows(mat: np.ndarray) -> np.ndarray:
+    mat = np.ascontiguousarray(mat, dtype="float32")
+    mat /= np.linalg.norm(mat, axis=1, keepdims=True) + 1e-12
+    return mat
+
+
+class EmbeddingBackend(ABC):
+    """
+    Interface: embed(texts) -> (n, dim) float32 matrix. Output size is fixed
+    when the backend is built; 'hedge' marks latency-sensitive calls (only
+    backends with a network round trip act on it).
+    """
+
+    name = "base"
+    model = ""
+    dim = 0
+
+    @abstractmethod
+    def embed(self, texts: List[str], hedge: bool = False) -> np.ndarray:
+        """Embeds 'texts' as L2-normalized float32 rows, in input order."""
+
+    def info(self) -> Dict[str, Any]:
+        """{"backend", "model", "dim"}: recorded with every index built from this backend."""
+        return {"backend": self.name, "model": self.model, "dim": self.dim}
+
+
+class OpenAIBackend(EmbeddingBackend):
+    name = "openai"
+
+    def __init__(self, model: str = OPENAI_MODEL, dimensions: Optional[int] = None):
+        self.model = model
+        self.dimensions = dimensions
+        self.dim = dimensions or OPENAI_MODEL_DIMS.get(model, 1536)
+
+    def embed(self, texts: List[str], hedge: bool = False) -> np.ndarray:
+        """
+        Args:
+            hedge (bool): Race a duplicate request when one is slower than usual
+                (for latency-sensitive queries, not bulk ingestion).
+
+        Raises:
+            EmbeddingError: Some texts still failed after retries (the error
+                carries the vectors that did succeed, aligned with 'texts').
+        """
+        # Imported here so local backends never need an API key
+        from .openai_client import get_client
+
+        # Shared pooled client: every request reuses a warm keep-alive connection.
+        # SDK retries are off: hedged_call below decides when to try again.
+        client = get_client("embeddings").with_options(max_retries=0)
+        extra = {"dimensions": self.dimensions} if self.dimensions else {}
+        vectors: List[Optional[np.ndarray]] = [None] * len(texts)
+
+        def request(inputs):
+            resp = client.embeddings.create(model=self.model, input=inputs, **extra)
+            metrics.record_usage("embeddings", resp.usage)
+            # float32 straight away: that's what FAISS stores (float64 would double memory).
+            return [np.array(d.embedding, dtype="float32") for d in sorted(resp.data, key=lambda d: d.index)]
+
+        for start in range(0, len(texts), OPENAI_BATCH_SIZE):
+            batch = texts[start:start + OPENAI_BATCH_SIZE]
+            try:
+                # One request per batch (bounded retries; hedged for latency-sensitive queries)
+                vectors[start:start + len(batch)] = hedged_call(lambda b=batch: request(b), "embeddings",
+                                                                hedging=hedge)
+                continue
+            except Exception as e:
+                if len(batch) == 1:
+                    print(f"Error embedding text: {batch[0][:50]}... | {e}")
+                    continue
+            # A failed batch is retried text by text so one bad input doesn't sink the rest
+            for i, t in enumerate(batch):
+                try:
+                    vectors[start + i] = hedged_call(lambda t=t: request(t)[0], "embeddings",
+                                                     max_attempts=2, hedging=False)
+                except Exception as e:
+                    # If the internet fails or the API crashes, we print a snippet of the
+                    # text that failed so you can troubleshoot without crashing the whole bot.
+                    print(f"Error embedding text: {t[:50]}... | {e}")
+
+        failed = [i for i, v in enumerate(vectors) if v is None]
+        if failed:
+            raise EmbeddingError(f"{len(failed)} of {len(texts)} texts could not be embedded", failed, vectors)
+        if not vectors:
+            return np.zeros((0, self.dim), dtype="float32")
+        return np.vstack(vectors)
+
+
+class OnnxBackend(EmbeddingBackend):
+    """
+    Local transformer encoder via ONNX Runtime: batched, mean-pooled, normalized.
+    """
+
+    name = "onnx"
+
+    def __init__(self, model_dir: str, threads: Optional[int] = None, batch_size: int = BATCH_SIZE,
+                 max_tokens: int = MAX_TOKENS):
+        try:
+            import onnxruntime as ort
+            from tokenizers import Tokenizer
+        except ImportError as e:
+            raise ImportError("The onnx embedding backend needs 'pip install onnxruntime tokenizers'.") from e
+
+        model_path = next(
+            (os.path.join(model_dir, f) for f in ("model_quantized.onnx", "model.onnx")
+             if os.path.exists(os.path.join(model_dir, f))),
+            None,
+        )
+        if model_path is None:
+            raise FileNotFoundError(f"No model.onnx or model_quantized.onnx in {model_dir}")
+
+        self.model = os.path.basename(os.path.normpath(model_dir)) + "/" + os.path.basename(model_path)
+        self.batch_size = batch_size
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=max_tokens)
+        self.tokenizer.enable_padding()
+
+        opts = ort.SessionOptions()
+        opts.intra_op_num_threads = threads or int(os.getenv("RAG_EMBEDDING_THREADS", "0")) or min(4, os.cpu_count() or 1)
+        opts.inter_op_num_threads = 1
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(model_path, opts, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        # ONNX Runtime sessions are thread-safe, but one run at a time keeps
+        # the thread pool from oversubscribing the CPU
+        self._lock = threading.Lock()
+        self.dim = int(self.embed(["dimension probe"]).shape[1])
+
+    def _run(self, batch: List[str]) -> np.ndarray:
+        encoded = self.tokenizer.encode_batch(batch)
+        ids = np.array([e.ids for e in encoded], dtype=np.int64)
+        mask = np.array([e.attention_mask for e in encoded], dtype=np.int64)
+        feeds = {"input_ids": ids, "attention_mask": mask}
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.zeros_like(ids)
+        with self._lock:
+            out = self.session.run(None, feeds)[0]
+        if out.ndim == 3:
+            # Mean pooling over real (non-padding) tokens
+            weights = mask[:, :, None].astype("float32")
+            out = (out * weights).sum(axis=1) / np.maximum(weights.sum(axis=1), 1e-9)
+        return _normalize_rows(out)
+
+    def embed(self, texts: List[str], hedge: bool = False) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, self.dim), dtype="float32")
+        # Sorting by length keeps padding (wasted compute) low inside each batch
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        out = None
+        for start in range(0, len(order), self.batch_size):
+            idx = order[start:start + self.batch_size]
+            vecs = self._run([texts[i] for i in idx])
+            if out is None:
+                out = np.empty((len(texts), vecs.shape[1]), dtype="float32")
+            out[idx] = vecs
+        return out
+
+
+class HashingBackend(EmbeddingBackend):
+    """Signed feature hashing of unigrams and bigrams (no model, no network)."""
+
+    name = "hash"
+    model = "words+bigrams"
+    _WORD = re.compile(r"[a-z0-9]+")
+
+    def __init__(self, dim: int = HASH_DIM):
+        self.dim = dim
+
+    def _features(self, text: str) -> List[str]:
+        words = self._WORD.findall(text.lower())
+        return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+    def embed(self, texts: List[str], hedge: bool = False) -> np.ndarray:
+        out = np.zeros((len(texts), self.dim), dtype="float32")
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                h = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+                out[row, h % self.dim] += 1.0 if (h >> 63) else -1.0
+        empty = ~out.any(axis=1)
+        out[empty, 0] = 1.0
+        return _normalize_rows(out)
+
+
+def create_backend(spec: Optional[str] = None, dimensions: Optional[int] = None) -> EmbeddingBackend:
+    """
+    Builds a backend from a spec string ("openai", "onnx:<dir>", "hash", "hash:<dim>").
+    """
+    spec = spec or "openai"
+    kind, _, arg = spec.partition(":")
+    if kind == "openai":
+        return OpenAIBackend(arg or OPENAI_MODEL, dimensions=dimensions)
+    if kind == "onnx":
+        return OnnxBackend(arg or os.getenv("RAG_EMBEDDING_MODEL_DIR", ""))
+    if kind == "hash":
+        return HashingBackend(int(arg) if arg else HASH_DIM)
+    raise ValueError(f"Unknown embedding backend: {spec}")
+
+
+_backend: Optional[EmbeddingBackend] = None
+_backend_lock = threading.Lock()
+
+
+def get_backend() -> EmbeddingBackend:
+    """Returns the process-wide backend selected by RAG_EMBEDDING_BACKEND."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                # Optional reduced output size (text-embedding-3 models support a
+                # 'dimensions' parameter). Leave unset for the model's full size.
+                dimensions = int(os.getenv("EMBEDDING_DIMENSIONS", "0")) or None
+                _backend = create_backend(os.getenv("RAG_EMBEDDING_BACKEND"), dimensions=dimensions)
+    return _backend
@@ -1,58 +1,106 @@
 # app/rag/embeddings.py
-import numpy as np
-from openai import OpenAI
-from dotenv import load_dotenv
-import os
+import logging
 
-# 1. Configuration & Setup
-# load_dotenv() searches for a .env file to load your secret API keys into the system environment.
-load_dotenv()
+from .embedding_backends import get_backend, EmbeddingError
+from .batching import MicroBatcher
 
-# We fetch the API key from the environment. This keeps your key safe and out of the source code.
-api_key = os.getenv("OPENAI_API_KEY")
+logger = logging.getLogger(__name__)
 
-# Safety Check: If the key is missing, the program stops immediately with a clear error message.
-if not api_key:
-    raise ValueError("OPENAI_API_KEY not found in environment. Please set it in .env file.")
-
-# 2. Client Initialization
-# Create an instance of the OpenAI class. This object handles the connection to OpenAI's servers.
-client = OpenAI(api_key=api_key)
-
-def embed_texts(texts):
+def embed_texts(texts, hedge=False):
     """
     Converts a list of text chunks into numerical vectors (embeddings).
 
+    The vectors come from the backend chosen with RAG_EMBEDDING_BACKEND: the
+    OpenAI API by default, or a local CPU model (see embedding_backends.py).
+
     Args:
         texts (list[str]): The text pieces created by your chunking function.
+            The vector size is the backend's (EMBEDDING_DIMENSIONS shortens
+            OpenAI vectors; local backends always return their native size).
+        hedge (bool): Race a duplicate API request when one is slower than usual
+            (for latency-sensitive queries, not bulk ingestion).
+
+    Returns:
+        list[np.ndarray]: One vector per text, in the same order.
+
+    Raises:
+        EmbeddingError: Some texts failed even after retries. Vectors are never
+            silently dropped, so callers can't end up with misaligned chunks.
+    """
+    backend = get_backend()
+
+    # 1. One call per batch; the backend decides how to split it
+    matrix = backend.embed(list(texts), hedge=hedge)
+
+    # 2. Return the list of numerical vectors to be stored in the FAISS index.
+    return list(matrix)
+
+def embed_chunks(chunks, metadatas):
+    """
+    Embeds chunks for ingestion. Chunks that still fail after retries are
+    dropped together with their metadata, so all three lists stay aligned.
 
     Returns:
-        list[np.ndarray]: A list of vectors representing the meaning of the text.
-    """
-    
-    # Initialize an empty list to store the numerical vectors.
-    embeddings = []
-
-    # 3. Processing the Chunks
-    # We loop through every single text chunk in the list.
-    for t in texts:
-        try:
-            # Request a 'vector' from the OpenAI API.
-            # We use "text-embedding-3-small", which is fast and cost-effective.
-            resp = client.embeddings.create(
-                model="text-embedding-3-small",
-                input=t
-            )
-            
-            # The API returns a list of floats. We convert this into a 'numpy array' 
-            # (np.array) because FAISS (your vector store) requires numpy format for fast math.
-            vector = np.array(resp.data[0].embedding)
-            embeddings.append(vector)
-            
-        except Exception as e:
-            # If the internet fails or the API crashes, we print a snippet of the 
-            # text that failed so you can troubleshoot without crashing the whole bot.
-            print(f"Error embedding text: {t[:50]}... | {e}")
-
-    # Return the list of numerical vectors to be stored in the FAISS index.
-    return embeddings
+        tuple: (vectors, chunks, metadatas)
+    """
+    try:
+        return embed_texts(chunks), list(chunks), list(metadatas)
+    except EmbeddingError as e:
+        logger.warning(f"Skipping {len(e.failed)} of {len(chunks)} chunks that could not be embedded.")
+        keep = [i for i, v in enumerate(e.vectors) if v is not None]
+        return [e.vectors[i] for i in keep], [chunks[i] for i in keep], [metadatas[i] for i in keep]
+
+def _embed_query_batch(texts):
+    """
+    Batch function for the query batcher: a query that fails to embed gets its
+    own EmbeddingError, while the others in the same call still get their vectors.
+    """
+    try:
+        return embed_texts(texts, hedge=True)
+    except EmbeddingError as e:
+        failed = set(e.failed)
+        return [EmbeddingError("Query could not be embedded", [0], [None]) if i in failed else v
+                for i, v in enumerate(e.vectors)]
+
+# Concurrent sessions: single queries arriving together share one embeddings call
+_query_batcher = MicroBatcher(_embed_query_batch, name="embed")
+
+def embed_query(text, deadline=None):
+    """
+    Embeds one user query, coalesced with any other queries arriving at the same time.
+
+    Args:
+        deadline (Deadline): Give up (TimeoutError) when the turn's budget runs out.
+
+    Returns:
+        np.ndarray: The query vector.
+
+    Raises:
+        EmbeddingError: This query could not be embedded.
+    """
+    return _query_batcher(text, timeout=deadline.remaining() if deadline else None)
+
+def embedding_info():
+    """
+    Describes the active backend as {"backend", "model", "dim"}.
+    Stored with every index so mismatched query vectors are caught early.
+    """
+    return get_backend().info()
+
+def bundle_dim(bundle):
+    """Vector size a bundle was built with (before any Matryoshka truncation)."""
+    if "rescore" in bundle:
+        return int(bundle["rescore"].full.shape[1])
+    return int(bundle["faiss"].d)
+
+def embedding_matches(bundle):
+    """
+    True if queries embedded with the active backend can search 'bundle'.
+    Indexes built before backends were recorded are checked by size only.
+    """
+    current = embedding_info()
+    recorded = bundle.get("embedding")
+    if recorded:
+        return (recorded.get("backend"), recorded.get("model"), int(recorded.get("dim", 0))) == \
+            (current["backend"], current["model"], current["dim"])
+    return bundle_dim(bundle) == current["dim"]
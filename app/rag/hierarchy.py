@@ -0,0 +1,110 @@
+# app/rag/hierarchy.py
+"""
+Two-level (document -> chunk) search.
+
+At build time every source document is split into sections of up to
+SECTION_CHUNKS consecutive chunks, and each section is summarized by the
+normalized centroid of its chunk vectors. A query first ranks these section
+vectors, then scores only the chunks inside the best TOP_SECTIONS sections,
+exactly, against their stored vectors. Long PDFs get several sections, so one
+broad document can't hide a specific passage.
+
+Flat search stays in use below ROUTING_MIN_CHUNKS, where scanning everything
+is already fast and routing can only cost recall.
+
+Environment:
+    RAG_DOC_ROUTING_MIN_CHUNKS  Index size where routing starts (default 5000, 0 = always)
+    RAG_TOP_SECTIONS            Sections searched per query (default 32)
+"""
+import os
+from typing import Any, Dict, Optional
+
+import faiss
+import numpy as np
+
+SECTION_CHUNKS = 32
+ROUTING_MIN_CHUNKS = int(os.getenv("RAG_DOC_ROUTING_MIN_CHUNKS", "5000"))
+TOP_SECTIONS = int(os.getenv("RAG_TOP_SECTIONS", "32"))
+
+
+class DocumentIndex:
+    """
+    Section centroids plus a CSR map from each section to its chunk ids
+    (chunk ids of section s are ids[offsets[s]:offsets[s + 1]]).
+    """
+
+    def __init__(self, centroids: np.ndarray, offsets: np.ndarray, ids: np.ndarray):
+        self.centroids = np.ascontiguousarray(centroids, dtype="float32")
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.index = faiss.IndexFlatL2(self.centroids.shape[1])
+        self.index.add(self.centroids)
+
+    @classmethod
+    def build(cls, matrix: np.ndarray, source_ids: np.ndarray,
+              section_chunks: int = SECTION_CHUNKS) -> "DocumentIndex":
+        """
+        Args:
+            matrix (np.ndarray): Full-precision chunk vectors, (n, dim), in FAISS id order.
+            source_ids (np.ndarray): The ChunkStore's source_id column (n,).
+        """
+        source_ids = np.asarray(source_ids)
+        # Stable sort keeps each document's chunks in their original (reading) order
+        order = np.argsort(source_ids, kind="stable")
+        boundaries = np.flatnonzero(np.diff(source_ids[order])) + 1
+        starts = []
+        for lo, hi in zip(np.concatenate([[0], boundaries]), np.concatenate([boundaries, [len(order)]])):
+            starts.extend(range(int(lo), int(hi), section_chunks))
+        offsets = np.array(starts + [len(order)], dtype=np.int64)
+
+        # Segment sums over the sorted vectors -> one centroid per section
+        sums = np.add.reduceat(np.asarray(matrix, dtype="float32")[order], offsets[:-1], axis=0)
+        sums /= np.linalg.norm(sums, axis=1, keepdims=True) + 1e-12
+        return cls(sums, offsets, order)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def candidates(self, q_vec: np.ndarray, top_sections: int = TOP_SECTIONS) -> np.ndarray:
+        """Chunk ids inside the 'top_sections' sections closest to the query."""
+        n = min(top_sections, len(self))
+        _, S = self.index.search(np.asarray(q_vec, dtype="float32").reshape(1, -1), n)
+        return np.concatenate([self.ids[self.offsets[s]:self.offsets[s + 1]] for s in S[0] if s >= 0])
+
+    def save(self, directory: str) -> None:
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, "centroids.npy"), self.centroids)
+        np.save(os.path.join(directory, "offsets.npy"), self.offsets)
+        np.save(os.path.join(directory, "ids.npy"), self.ids)
+
+    @classmethod
+    def load(cls, directory: str) -> Optional["DocumentIndex"]:
+        if not os.path.exists(os.path.join(directory, "centroids.npy")):
+            return None
+        return cls(*(np.load(os.path.join(directory, f"{name}.npy")) for name in ("centroids", "offsets", "ids")))
+
+
+def should_route(bundle: Dict[str, Any], min_chunks: int = ROUTING_MIN_CHUNKS) -> bool:
+    return "docs" in bundle and bundle["faiss"].ntotal >= min_chunks
+
+
+def routed_search(docs: DocumentIndex, vectors_for, q_vec: np.ndarray, k: int,
+                  top_sections: int = TOP_SECTIONS):
+    """
+    Picks the closest sections, then ranks their chunks by exact squared L2.
+
+    Args:
+        vectors_for (function): ids -> (len(ids), dim) stored full-precision vectors.
+
+    Returns:
+        tuple: (ids, distances) as 1-D arrays, nearest first, or None if the
+            chosen sections hold fewer than k chunks (caller falls back to flat search).
+    """
+    q_vec = np.asarray(q_vec, dtype="float32").ravel()
+    ids = docs.candidates(q_vec, top_sections)
+    if k <= 0 or len(ids) < k:
+        return None
+    dists = ((vectors_for(ids) - q_vec) ** 2).sum(axis=1)
+    top = np.argpartition(dists, k - 1)[:k] if len(ids) > k else np.arange(len(ids))
+    top = top[np.argsort(dists[top])]
+    return ids[top], dists[top].astype("float32")
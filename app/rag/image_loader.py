@@ -1,18 +1,166 @@
 # app/rag/image_loader.py
+import io
+import math
 import base64
+import struct
+import logging
+import mimetypes
 
-def encode_image(path):
+from . import metrics
+
+# Pillow is a requirement; the fallback only keeps a broken install working:
+# images are then sent as-is, so only formats the vision model accepts can be used
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # pragma: no cover
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+# The vision model fits "high" detail images into 2048x2048, then scales the
+# shortest side down to 768 and reads them in 512px tiles. Anything larger is
+# uploaded for nothing.
+MAX_LONG_SIDE = 2048
+MAX_SHORT_SIDE = 768
+TILE = 512
+LOW_DETAIL_SIDE = 512      # Fits in one tile: "low" detail reads it just as well
+JPEG_QUALITY = 85
+TILE_SNAP = 0.1            # Shrink up to 10% more if that saves a row/column of tiles
+
+_MAGIC = (
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+)
+# Formats the vision API accepts as-is
+SUPPORTED_MIME = {"image/png", "image/jpeg", "image/gif", "image/webp"}
+
+
+class UnsupportedImageError(ValueError):
+    """The file is not an image format we can send to the vision model."""
+
+
+def detect_mime(data: bytes, path: str = None) -> str:
     """
-    Computers and APIs cannot 'see' a file on your hard drive directly. 
-    We must convert the binary image file into a Base64 string (a long string of text)
-    so it can be sent inside a standard JSON API request.
+    Detects the real image format from its first bytes (the extension can lie).
+    Unknown signatures fall back to a guess from the file name.
+    """
+    for magic, mime in _MAGIC:
+        if data.startswith(magic):
+            return mime
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    guessed = mimetypes.guess_type(path)[0] if path else None
+    return guessed or "application/octet-stream"
+
+def _header_size(data: bytes, mime: str):
+    """
+    Reads (width, height) from a PNG/GIF/JPEG header without decoding the image.
+    Returns None if the header isn't understood.
+    """
+    try:
+        if mime == "image/png":
+            return struct.unpack(">II", data[16:24])
+        if mime == "image/gif":
+            return struct.unpack("<HH", data[6:10])
+        if mime == "image/jpeg":
+            i = 2
+            while i + 9 < len(data):
+                if data[i] != 0xFF:
+                    i += 1
+                    continue
+                marker = data[i + 1]
+                length = struct.unpack(">H", data[i + 2:i + 4])[0]
+                # SOF0..SOF15 carry the frame size (C4/C8/CC are not frame headers)
+                if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+                    h, w = struct.unpack(">HH", data[i + 5:i + 9])
+                    return w, h
+                i += 2 + length
+    except struct.error:
+        pass
+    return None
+
+def target_size(width: int, height: int):
+    """
+    Computes the useful resolution for the vision model.
+
+    Returns:
+        tuple: (width, height, detail) where detail is "low" or "high".
     """
-    # 'rb' stands for 'read binary' - necessary for non-text files like images
-    with open(path, "rb") as image_file:
-        # 1. Read the raw bytes
-        # 2. Encode those bytes into base64 format
-        # 3. Decode into a UTF-8 string so it can be handled as text
-        return base64.b64encode(image_file.read()).decode('utf-8')
+    if max(width, height) <= LOW_DETAIL_SIDE:
+        return width, height, "low"
+
+    # 1. Same limits the API applies on its side
+    scale = min(1.0, MAX_LONG_SIDE / max(width, height), MAX_SHORT_SIDE / min(width, height))
+    w, h = width * scale, height * scale
+
+    # 2. Tiling: if a slightly smaller image needs fewer 512px tiles, use it
+    tiles = math.ceil(w / TILE) * math.ceil(h / TILE)
+    for cols, rows in ((math.ceil(w / TILE) - 1, math.ceil(h / TILE)), (math.ceil(w / TILE), math.ceil(h / TILE) - 1)):
+        if cols < 1 or rows < 1:
+            continue
+        snap = min(cols * TILE / w, rows * TILE / h)
+        if snap >= 1 - TILE_SNAP and cols * rows < tiles:
+            w, h, tiles = w * snap, h * snap, cols * rows
+    w, h = max(1, int(w)), max(1, int(h))
+    # Snapping can shrink an image into a single tile, which "low" reads just as well
+    return w, h, "low" if max(w, h) <= LOW_DETAIL_SIDE else "high"
+
+def prepare_image(path: str):
+    """
+    Loads an image for the vision API: real MIME type, downscaled to the
+    model's useful resolution and recompressed (when Pillow is available).
+
+    Returns:
+        tuple: (base64 string, mime type, detail level)
+
+    Raises:
+        UnsupportedImageError: The format can't be sent (or decoded, with Pillow).
+    """
+    with open(path, "rb") as f:
+        raw = f.read()
+    mime = detect_mime(raw, path)
+
+    if Image is None:
+        # No Pillow: send the original bytes, but pick detail from the header size
+        if mime not in SUPPORTED_MIME:
+            raise UnsupportedImageError(f"{mime} can't be sent without Pillow ('pip install Pillow')")
+        size = _header_size(raw, mime)
+        detail = target_size(*size)[2] if size else "auto"
+        return base64.b64encode(raw).decode("utf-8"), mime, detail
+
+    try:
+        img = Image.open(io.BytesIO(raw))
+    except Exception as e:
+        raise UnsupportedImageError(f"{mime} is not a readable image: {e}") from e
+    with img:
+        img = ImageOps.exif_transpose(img)
+        w, h, detail = target_size(*img.size)
+        resized = (w, h) != img.size
+        if resized:
+            img = img.resize((w, h), Image.LANCZOS)
+
+        # Flatten transparency onto white; slides and screenshots compress well as JPEG
+        if img.mode in ("RGBA", "LA", "P"):
+            img = img.convert("RGBA")
+            background = Image.new("RGB", img.size, (255, 255, 255))
+            background.paste(img, mask=img.split()[-1])
+            img = background
+        elif img.mode != "RGB":
+            img = img.convert("RGB")
+
+        buf = io.BytesIO()
+        img.save(buf, format="JPEG", quality=JPEG_QUALITY, optimize=True)
+        data = buf.getvalue()
+
+    # Keep the original if recompressing didn't help and no resize was needed
+    if not resized and len(raw) <= len(data) and mime in SUPPORTED_MIME:
+        data = raw
+    else:
+        mime = "image/jpeg"
+    logger.info(f"Image {path}: {len(raw)} -> {len(data)} bytes, {w}x{h}, detail={detail}")
+    return base64.b64encode(data).decode("utf-8"), mime, detail
 
 def image_to_text(image_path, client):
     """
@@ -23,10 +171,19 @@ def image_to_text(image_path, client):
     Args:
         image_path (str): The local path to your image (e.g., 'data/images/chart.png')
         client: Your initialized OpenAI client
+
+    Returns:
+        str: The description, or "" if the file isn't a supported image.
     """
     
     # First, convert the image file into a sendable string format
-    image_base64 = encode_image(image_path)
+    # (downscaled and recompressed, with its real MIME type)
+    try:
+        image_base64, mime, detail = prepare_image(image_path)
+    except UnsupportedImageError as e:
+        # Skip it rather than pay for an API call that can only fail
+        print(f" Skipping image {image_path}: {e}")
+        return ""
 
     # Call the GPT-4o-mini Vision model
     response = client.chat.completions.create(
@@ -47,7 +204,9 @@ def image_to_text(image_path, client):
                         "image_url": {
                             # We create a 'Data URL' which tells the API the format 
                             # and includes the encoded image string.
-                            "url": f"data:image/png;base64,{image_base64}"
+                            "url": f"data:{mime};base64,{image_base64}",
+                            # "low" for images that fit one tile, "high" otherwise
+                            "detail": detail
                         }
                     }
                 ]
@@ -57,5 +216,7 @@ def image_to_text(image_path, client):
         temperature=0
     )
 
+    metrics.record_usage("chat.completions", response.usage)
+
     # Extract the AI's description of the image and clean up whitespace
     return response.choices[0].message.content.strip()
\ No newline at end of file
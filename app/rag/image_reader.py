@@ -33,6 +33,8 @@ def load_all_images_text(image_dir, client):
 
             # 4. Use the image_loader to get a text description from GPT-4o-mini
             text = image_to_text(path, client)
+            if not text:
+                continue
 
             # 5. Store the result as a dictionary
             # Keeping the 'source' allows the bot to cite its sources later
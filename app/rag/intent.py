@@ -0,0 +1,192 @@
+# app/rag/intent.py
+"""
+Cheap local intent router, run before retrieval.
+
+Rules catch the obvious cases ("yes", an email address, "thanks"); a tiny
+Naive Bayes model over word unigrams handles the rest. Anything uncertain is
+treated as a knowledge question, so the only cost of a miss is a normal RAG turn.
+"""
+import re
+import math
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+KNOWLEDGE = "knowledge"
+CONFIRMATION = "confirmation"
+SLOT_FILL = "slot_fill"
+SMALL_TALK = "small_talk"
+
+# Below this probability the NB model's guess is ignored and we fall back to RAG
+MIN_CONFIDENCE = 0.7
+
+_EMAIL = re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+")
+_PHONE = re.compile(r"\+?\d[\d\s().-]{6,}\d")
+_WORD = re.compile(r"[a-z']+")
+_QUESTION_WORDS = {"what", "who", "where", "when", "why", "how", "which", "does", "do",
+                   "is", "are", "can", "could", "tell", "explain", "describe", "list"}
+
+_CONFIRM_PHRASES = {
+    "yes", "yea", "yeah", "yep", "yup", "sure", "ok", "okay", "correct", "right",
+    "that's right", "thats right", "that is correct", "yes please", "sounds good",
+    "let's do it", "lets do it", "i'd love to", "id love to", "absolutely", "of course",
+    "no", "nope", "not now", "no thanks", "no thank you", "maybe later", "go ahead",
+    "confirm", "confirmed", "perfect", "great", "please do",
+}
+# Words that may follow a confirmation token without changing its meaning
+_CONFIRM_FILLER = {
+    "yes", "yeah", "yep", "sure", "ok", "okay", "alright", "no", "not", "now", "please",
+    "thanks", "thank", "you", "go", "ahead", "do", "it", "that", "that's", "thats", "is",
+    "all", "right", "correct", "fine", "good", "great", "sounds", "perfect", "then",
+    "absolutely", "book", "confirmed", "later", "maybe", "interested",
+}
+_SMALL_TALK_PHRASES = {
+    "hi", "hello", "hey", "good morning", "good afternoon", "good evening",
+    "thanks", "thank you", "thank you so much", "thanks a lot", "bye", "goodbye",
+    "see you", "how are you", "nice", "cool", "awesome", "who are you",
+}
+
+# Seed examples for the lexical model (short on purpose; rules do most of the work)
+_SEED = {
+    CONFIRMATION: [
+        "yes that is correct", "yes please go ahead", "sure why not", "yeah sounds good",
+        "no not right now", "that's all correct", "yes book it", "ok do it", "no thanks",
+        "yes the details are right", "i would love to", "i'm interested", "not interested",
+        "sure go ahead", "ok great", "alright then", "yes all good",
+    ],
+    SLOT_FILL: [
+        "my name is john smith", "my email is john at example dot com", "my phone number is",
+        "you can reach me at", "call me on", "it's sarah", "name john email phone",
+        "my number is", "email me at", "i am urmi karmakar", "i want to book a meeting",
+        "schedule a meeting please", "set up a call", "book a meeting",
+    ],
+    SMALL_TALK: [
+        "hello there", "hi how are you", "thank you very much", "thanks for the help",
+        "good morning", "bye see you", "have a nice day", "you are great", "nice to meet you",
+        "hi there", "ok thanks", "great thanks", "hey there",
+    ],
+    KNOWLEDGE: [
+        "what services does betopia offer", "tell me about bdcalling", "who is the ceo",
+        "where is the office located", "how many employees work there", "what is the company history",
+        "do you provide software development", "explain your pricing", "what projects have you done",
+        "when was betopia founded", "which countries do you operate in", "describe the team",
+    ],
+}
+
+_MEETING_WORDS = ("meeting", "schedule", "book", "name", "email", "phone", "details", "correct")
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r"[!.,?\s]+$", "", text.strip().lower())
+
+
+def _tokens(text: str) -> List[str]:
+    return _WORD.findall(text.lower())
+
+
+class NaiveBayesIntent:
+    """Multinomial Naive Bayes with add-one smoothing over word unigrams."""
+
+    def __init__(self, examples: Dict[str, List[str]]):
+        self.labels = list(examples)
+        self.word_counts = {label: Counter() for label in self.labels}
+        self.totals = {}
+        n_docs = sum(len(v) for v in examples.values())
+        self.priors = {}
+        vocab = set()
+        for label, texts in examples.items():
+            for t in texts:
+                toks = _tokens(t)
+                self.word_counts[label].update(toks)
+                vocab.update(toks)
+            self.totals[label] = sum(self.word_counts[label].values())
+            self.priors[label] = math.log(len(texts) / n_docs)
+        self.vocab_size = len(vocab)
+
+    def predict(self, text: str) -> Tuple[str, float]:
+        toks = _tokens(text)
+        scores = {}
+        for label in self.labels:
+            denom = self.totals[label] + self.vocab_size
+            counts = self.word_counts[label]
+            scores[label] = self.priors[label] + sum(math.log((counts[t] + 1) / denom) for t in toks)
+        # Softmax over log-scores
+        top = max(scores.values())
+        exp = {k: math.exp(v - top) for k, v in scores.items()}
+        total = sum(exp.values())
+        label = max(exp, key=exp.get)
+        return label, exp[label] / total
+
+
+_MODEL = NaiveBayesIntent(_SEED)
+
+
+class Route:
+    """Routing decision for one turn."""
+
+    def __init__(self, intent: str, confidence: float, reason: str):
+        self.intent = intent
+        self.confidence = confidence
+        self.reason = reason
+
+    @property
+    def needs_retrieval(self) -> bool:
+        return self.intent == KNOWLEDGE
+
+    def __repr__(self):
+        return f"Route({self.intent}, {self.confidence:.2f}, {self.reason})"
+
+
+def classify_intent(text: str, last_assistant: Optional[str] = None) -> Route:
+    """
+    Decides whether a turn needs the knowledge base.
+
+    Args:
+        text (str): The user's message.
+        last_assistant (str): The previous bot reply (helps tell "yes" to a
+            meeting offer apart from "yes" to "want to know more?").
+    """
+    norm = _normalize(text)
+    words = _tokens(norm)
+
+    if not words:
+        if _EMAIL.search(text) or _PHONE.search(text):
+            return Route(SLOT_FILL, 1.0, "contact")
+        return Route(SMALL_TALK, 1.0, "empty")
+
+    # 1. Rules
+    if norm in _CONFIRM_PHRASES:
+        return Route(CONFIRMATION, 1.0, "phrase")
+    if norm in _SMALL_TALK_PHRASES:
+        return Route(SMALL_TALK, 1.0, "phrase")
+    # "sure, go ahead", "yes that's right": a confirmation word plus filler only.
+    # "ok what about pricing" carries a new request and goes on to the classifier.
+    if words[0] in _CONFIRM_PHRASES and len(words) <= 4 and "?" not in text \
+            and all(w in _CONFIRM_FILLER for w in words[1:]):
+        return Route(CONFIRMATION, 0.9, "prefix")
+
+    has_contact = bool(_EMAIL.search(text) or _PHONE.search(text))
+    # Contact details with little else around them are slot-filling replies
+    if has_contact and len(words) <= 12 and "?" not in text:
+        return Route(SLOT_FILL, 1.0, "contact")
+
+    # Questions always go to RAG
+    if "?" in text or (words and words[0] in _QUESTION_WORDS):
+        return Route(KNOWLEDGE, 1.0, "question")
+
+    # Long messages are almost always about content
+    if len(words) > 12:
+        return Route(KNOWLEDGE, 0.9, "length")
+
+    # 2. Lexical model for short, ambiguous turns
+    label, prob = _MODEL.predict(norm)
+    if label == SLOT_FILL and last_assistant and not any(w in last_assistant.lower() for w in _MEETING_WORDS):
+        # Looks like slot-filling but we never asked for details
+        return Route(KNOWLEDGE, prob, "model-unsupported")
+    if label != KNOWLEDGE and prob >= MIN_CONFIDENCE:
+        return Route(label, prob, "model")
+    return Route(KNOWLEDGE, prob, "default")
+
+
+def is_meeting_followup(last_assistant: Optional[str]) -> bool:
+    """True if the previous bot turn was part of the scheduling flow."""
+    return bool(last_assistant) and any(w in last_assistant.lower() for w in _MEETING_WORDS)
@@ -0,0 +1,183 @@
+# app/rag/meeting_store.py
+import json
+import os
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any
+
+from .utils import ThreadLocalSQLite, data_dir
+
+logger = logging.getLogger(__name__)
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+DUPLICATE_WINDOW = timedelta(minutes=5)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meetings (
+    id         INTEGER PRIMARY KEY AUTOINCREMENT,
+    name       TEXT NOT NULL,
+    email      TEXT NOT NULL,
+    phone      TEXT NOT NULL,
+    timestamp  TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_meetings_email ON meetings (email, created_at);
+CREATE INDEX IF NOT EXISTS idx_meetings_phone ON meetings (phone, created_at);
+CREATE TABLE IF NOT EXISTS store_meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+class MeetingStore:
+    """
+    SQLite-backed meeting storage (WAL mode).
+
+    - Duplicate checks are indexed lookups on (email, created_at) and
+      (phone, created_at), so cost no longer grows with booking history.
+    - Check + insert run inside one 'BEGIN IMMEDIATE' transaction, which makes
+      them atomic across threads, sessions and processes.
+    - A legacy meetings.json file is imported once on first open.
+    """
+
+    def __init__(self, db_path: str, legacy_json_path: Optional[str] = None):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._db = ThreadLocalSQLite(db_path)
+
+        conn = self._db.get()
+        conn.executescript(_SCHEMA)
+        if legacy_json_path:
+            self._import_legacy_json(legacy_json_path)
+
+    def _import_legacy_json(self, json_path: str) -> int:
+        """
+        Copies records from the old meetings.json into the database exactly once.
+        The JSON file is left untouched.
+
+        If the file exists but cannot be read or parsed, nothing is imported and
+        no marker is written, so the import is retried on the next open.
+        """
+        conn = self._db.get()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            done = conn.execute(
+                "SELECT value FROM store_meta WHERE key = 'legacy_json_imported'"
+            ).fetchone()
+            if done:
+                conn.execute("COMMIT")
+                return 0
+
+            # A missing file means there is nothing to import; that is final too
+            records = []
+            if os.path.exists(json_path):
+                try:
+                    with open(json_path, "r", encoding="utf-8") as f:
+                        records = json.load(f)
+                except (json.JSONDecodeError, OSError) as e:
+                    conn.execute("ROLLBACK")
+                    logger.error(f"Could not read legacy meetings file {json_path}, will retry on next open: {e}")
+                    return 0
+                if not isinstance(records, list):
+                    records = []
+
+            rows = []
+            for rec in records:
+                if not isinstance(rec, dict) or "timestamp" not in rec:
+                    continue
+                try:
+                    created = datetime.strptime(rec["timestamp"], TIMESTAMP_FORMAT)
+                except ValueError:
+                    continue
+                rows.append((
+                    str(rec.get("name", "")),
+                    str(rec.get("email", "")),
+                    str(rec.get("phone", "")),
+                    rec["timestamp"],
+                    created.timestamp(),
+                ))
+
+            conn.executemany(
+                "INSERT INTO meetings (name, email, phone, timestamp, created_at) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            conn.execute(
+                "INSERT INTO store_meta (key, value) VALUES ('legacy_json_imported', ?)",
+                (datetime.now().strftime(TIMESTAMP_FORMAT),),
+            )
+            conn.execute("COMMIT")
+            if rows:
+                logger.info(f"Imported {len(rows)} meetings from {json_path}")
+            return len(rows)
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def add_if_not_recent(self, name: str, email: str, phone: str,
+                          window: timedelta = DUPLICATE_WINDOW) -> Optional[Dict[str, Any]]:
+        """
+        Inserts a meeting unless the same email OR phone was booked within 'window'.
+
+        Returns:
+            dict: The saved record, or None if it was rejected as a duplicate.
+        """
+        now = datetime.now()
+        since = (now - window).timestamp()
+        phone = str(phone)
+
+        conn = self._db.get()
+        # IMMEDIATE takes the write lock up front so two bookers cannot both
+        # pass the duplicate check before either one inserts.
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            dup = conn.execute(
+                "SELECT 1 FROM meetings WHERE email = ? AND created_at >= ? "
+                "UNION ALL "
+                "SELECT 1 FROM meetings WHERE phone = ? AND created_at >= ? "
+                "LIMIT 1",
+                (email, since, phone, since),
+            ).fetchone()
+            if dup:
+                conn.execute("COMMIT")
+                return None
+
+            record = {
+                "name": name,
+                "email": email,
+                "phone": phone,
+                "timestamp": now.strftime(TIMESTAMP_FORMAT),
+            }
+            conn.execute(
+                "INSERT INTO meetings (name, email, phone, timestamp, created_at) VALUES (?, ?, ?, ?, ?)",
+                (name, email, phone, record["timestamp"], now.timestamp()),
+            )
+            conn.execute("COMMIT")
+            return record
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def count(self) -> int:
+        return self._db.get().execute("SELECT COUNT(*) FROM meetings").fetchone()[0]
+
+
+_store: Optional[MeetingStore] = None
+_store_lock = threading.Lock()
+
+
+def get_meeting_store() -> MeetingStore:
+    """
+    Returns the process-wide store for data/meetings.db, creating it on first use.
+    """
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                root = data_dir()
+                _store = MeetingStore(
+                    os.path.join(root, "meetings.db"),
+                    legacy_json_path=os.path.join(root, "meetings.json"),
+                )
+    return _store
@@ -0,0 +1,235 @@
+# app/rag/metrics.py
+"""
+Lightweight in-process tracing and metrics.
+
+- span("embed"): times a pipeline stage into a rolling latency histogram and
+  adds it to the current turn's trace.
+- record_api(op, ...): counts calls, tokens and bytes per API operation.
+- cache(name, hit): hit/miss counters for the various caches.
+- count(name): plain counters (e.g. routed intents).
+
+Read it back with stats_table() (the /stats command), prometheus_text()
+(Prometheus text exposition format) or per-turn JSONL traces written to
+RAG_TRACE_FILE.
+"""
+import os
+import json
+import time
+import threading
+import contextlib
+from collections import deque, defaultdict
+from typing import Any, Dict, Optional
+
+WINDOW = 1024   # Latency samples kept per stage (rolling)
+TRACE_FILE = os.getenv("RAG_TRACE_FILE") or None
+METRICS_FILE = os.getenv("RAG_METRICS_FILE") or None   # e.g. for node_exporter's textfile collector
+
+
+class Histogram:
+    """Rolling window of latency samples (ms) plus lifetime count and sum."""
+
+    def __init__(self, window: int = WINDOW):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, ms: float) -> None:
+        self.samples.append(ms)
+        self.count += 1
+        self.total += ms
+
+    def percentile(self, q: float) -> float:
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(round(q / 100.0 * (len(ordered) - 1))))]
+
+
+class Metrics:
+    def __init__(self, trace_file: Optional[str] = TRACE_FILE):
+        self.trace_file = trace_file
+        self.histograms: Dict[str, Histogram] = defaultdict(Histogram)
+        self.counters: Dict[str, float] = defaultdict(float)
+        self.api: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+        self.caches: Dict[str, Dict[str, int]] = defaultdict(lambda: {"hit": 0, "miss": 0})
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    # --- Recording ---------------------------------------------------------
+
+    @contextlib.contextmanager
+    def span(self, name: str):
+        """Times the enclosed block as stage 'name'."""
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            ms = (time.perf_counter() - t0) * 1000
+            with self._lock:
+                self.histograms[name].add(ms)
+            trace = getattr(self._local, "trace", None)
+            if trace is not None:
+                trace["spans"].append({"name": name, "start_ms": round((t0 - trace["_t0"]) * 1000, 3),
+                                       "ms": round(ms, 3)})
+
+    def observe(self, name: str, ms: float) -> None:
+        """Adds one latency sample without a span (e.g. from worker threads)."""
+        with self._lock:
+            self.histograms[name].add(ms)
+
+    def record_api(self, op: str, tokens_in: int = 0, tokens_out: int = 0,
+                   bytes_sent: int = 0, bytes_received: int = 0) -> None:
+        with self._lock:
+            stats = self.api[op]
+            stats["calls"] += 1
+            stats["tokens_in"] += tokens_in or 0
+            stats["tokens_out"] += tokens_out or 0
+            stats["bytes_sent"] += bytes_sent or 0
+            stats["bytes_received"] += bytes_received or 0
+
+    def record_usage(self, op: str, usage: Any) -> None:
+        """Adds token counts from an OpenAI 'usage' object (may be None)."""
+        if usage is None:
+            return
+        with self._lock:
+            stats = self.api[op]
+            stats["tokens_in"] += getattr(usage, "prompt_tokens", 0) or 0
+            stats["tokens_out"] += getattr(usage, "completion_tokens", 0) or 0
+
+    def cache(self, name: str, hit: bool, n: int = 1) -> None:
+        with self._lock:
+            self.caches[name]["hit" if hit else "miss"] += n
+
+    def count(self, name: str, n: float = 1) -> None:
+        with self._lock:
+            self.counters[name] += n
+
+    # --- Per-turn traces ---------------------------------------------------
+
+    def start_turn(self, **attrs) -> None:
+        """Starts collecting spans for one turn on this thread."""
+        self._local.trace = {"ts": time.time(), "_t0": time.perf_counter(), "spans": [], **attrs}
+
+    def annotate(self, **attrs) -> None:
+        trace = getattr(self._local, "trace", None)
+        if trace is not None:
+            trace.update(attrs)
+
+    def end_turn(self) -> Optional[Dict[str, Any]]:
+        """Closes the turn, records its total latency and appends it to the trace file."""
+        trace = getattr(self._local, "trace", None)
+        self._local.trace = None
+        if trace is None:
+            return None
+        trace["total_ms"] = round((time.perf_counter() - trace.pop("_t0")) * 1000, 3)
+        with self._lock:
+            self.histograms["turn"].add(trace["total_ms"])
+        if self.trace_file:
+            try:
+                with open(self.trace_file, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(trace, default=str) + "\n")
+            except OSError:
+                pass
+        if METRICS_FILE:
+            self.write_prometheus(METRICS_FILE)
+        return trace
+
+    # --- Export ------------------------------------------------------------
+
+    def percentile(self, name: str, q: float, min_samples: int = 1) -> Optional[float]:
+        """Rolling percentile of stage 'name' in ms, or None with too few samples."""
+        with self._lock:
+            h = self.histograms.get(name)
+            if h is None or len(h.samples) < min_samples:
+                return None
+            return h.percentile(q)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "latency": {
+                    name: {"count": h.count, "p50": h.percentile(50), "p95": h.percentile(95),
+                           "p99": h.percentile(99), "sum": h.total}
+                    for name, h in self.histograms.items()
+                },
+                "api": {op: dict(stats) for op, stats in self.api.items()},
+                "caches": {name: dict(c) for name, c in self.caches.items()},
+                "counters": dict(self.counters),
+            }
+
+    def stats_table(self) -> str:
+        """Human-readable summary for the /stats command."""
+        snap = self.snapshot()
+        lines = [f"{'STAGE':<16} {'COUNT':>7} {'P50 ms':>9} {'P95 ms':>9} {'P99 ms':>9}"]
+        for name, h in sorted(snap["latency"].items()):
+            lines.append(f"{name:<16} {h['count']:>7} {h['p50']:>9.1f} {h['p95']:>9.1f} {h['p99']:>9.1f}")
+        if snap["api"]:
+            lines.append("")
+            lines.append(f"{'API':<16} {'CALLS':>7} {'TOK IN':>9} {'TOK OUT':>9} {'KB SENT':>9} {'KB RECV':>9}")
+            for op, s in sorted(snap["api"].items()):
+                lines.append(f"{op:<16} {int(s.get('calls', 0)):>7} {int(s.get('tokens_in', 0)):>9} "
+                             f"{int(s.get('tokens_out', 0)):>9} {s.get('bytes_sent', 0) / 1024:>9.1f} "
+                             f"{s.get('bytes_received', 0) / 1024:>9.1f}")
+        if snap["caches"]:
+            lines.append("")
+            for name, c in sorted(snap["caches"].items()):
+                total = c["hit"] + c["miss"]
+                rate = 100.0 * c["hit"] / total if total else 0.0
+                lines.append(f"cache {name:<12} {c['hit']}/{total} hits ({rate:.0f}%)")
+        if snap["counters"]:
+            lines.append("")
+            for name, value in sorted(snap["counters"].items()):
+                lines.append(f"{name:<28} {value:g}")
+        return "\n".join(lines)
+
+    def prometheus_text(self) -> str:
+        """Prometheus text exposition format (summaries, counters)."""
+        snap = self.snapshot()
+        out = [
+            "# HELP rag_stage_latency_ms Stage latency over the last samples.",
+            "# TYPE rag_stage_latency_ms summary",
+        ]
+        for name, h in sorted(snap["latency"].items()):
+            for q in ("p50", "p95", "p99"):
+                out.append(f'rag_stage_latency_ms{{stage="{name}",quantile="0.{q[1:]}"}} {h[q]:.3f}')
+            out.append(f'rag_stage_latency_ms_sum{{stage="{name}"}} {h["sum"]:.3f}')
+            out.append(f'rag_stage_latency_ms_count{{stage="{name}"}} {h["count"]}')
+        for field in ("calls", "tokens_in", "tokens_out", "bytes_sent", "bytes_received"):
+            out.append(f"# TYPE rag_api_{field}_total counter")
+            for op, s in sorted(snap["api"].items()):
+                out.append(f'rag_api_{field}_total{{op="{op}"}} {s.get(field, 0):g}')
+        out.append("# TYPE rag_cache_requests_total counter")
+        for name, c in sorted(snap["caches"].items()):
+            for result in ("hit", "miss"):
+                out.append(f'rag_cache_requests_total{{cache="{name}",result="{result}"}} {c[result]}')
+        out.append("# TYPE rag_events_total counter")
+        for name, value in sorted(snap["counters"].items()):
+            out.append(f'rag_events_total{{event="{name}"}} {value:g}')
+        return "\n".join(out) + "\n"
+
+    def write_prometheus(self, path: str) -> None:
+        """Atomically writes prometheus_text() to 'path'."""
+        tmp = path + ".tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(self.prometheus_text())
+            os.replace(tmp, path)
+        except OSError:
+            pass
+
+
+# Process-wide registry; module-level helpers below delegate to it
+METRICS = Metrics()
+
+span = METRICS.span
+observe = METRICS.observe
+percentile = METRICS.percentile
+record_api = METRICS.record_api
+record_usage = METRICS.record_usage
+cache = METRICS.cache
+count = METRICS.count
+start_turn = METRICS.start_turn
+annotate = METRICS.annotate
+end_turn = METRICS.end_turn
+stats_table = METRICS.stats_table
+prometheus_text = METRICS.prometheus_text
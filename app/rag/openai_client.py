@@ -0,0 +1,163 @@
+# app/rag/openai_client.py
+"""
+One shared OpenAI client for the whole app (chat, embeddings, vision, STT, TTS).
+
+All callers share a single HTTP connection pool, so TLS handshakes happen once
+and later calls reuse warm keep-alive connections (HTTP/2 when the 'h2' package
+is installed). Each operation gets its own timeout via a cheap with_options()
+view over the same pool.
+
+Environment:
+    OPENAI_API_KEY          API key (any value works against a local stand-in server)
+    OPENAI_BASE_URL         e.g. http://127.0.0.1:8080/v1 to point at a local stand-in
+    OPENAI_MAX_CONNECTIONS  Pool size (default 20)
+    OPENAI_HTTP2            "0" to force HTTP/1.1
+"""
+import os
+import logging
+import threading
+import importlib.util
+from typing import Optional
+
+from dotenv import load_dotenv
+from openai import OpenAI, DefaultHttpxClient, Timeout, DEFAULT_CONNECTION_LIMITS
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "20"))
+MAX_KEEPALIVE = max(1, MAX_CONNECTIONS // 2)
+KEEPALIVE_EXPIRY = 120.0   # Seconds an idle connection stays open between turns
+CONNECT_TIMEOUT = 5.0
+MAX_RETRIES = 2
+
+# Read timeouts per operation (seconds)
+OPERATION_TIMEOUTS = {
+    "chat": 60.0,
+    "embeddings": 15.0,
+    "vision": 90.0,
+    "stt": 60.0,
+    "tts": 60.0,
+}
+DEFAULT_TIMEOUT = 60.0
+
+_lock = threading.Lock()
+_client: Optional[OpenAI] = None
+_views = {}
+
+# The SDK's own HTTP types (httpx or httpx2, whichever it ships with), so this
+# module never imports an HTTP library directly
+Limits = type(DEFAULT_CONNECTION_LIMITS)
+
+
+def _http2_enabled() -> bool:
+    if os.getenv("OPENAI_HTTP2", "1") == "0":
+        return False
+    # httpx only speaks HTTP/2 with the optional 'h2' package
+    return importlib.util.find_spec("h2") is not None
+
+
+def _timeout(read: float) -> Timeout:
+    return Timeout(read, connect=CONNECT_TIMEOUT)
+
+
+def _operation_name(path: str) -> str:
+    """'/v1/chat/completions' -> 'chat.completions'."""
+    parts = [p for p in path.split("/") if p and p != "v1"]
+    return ".".join(parts) or "unknown"
+
+
+def _body_size(headers, read_body) -> int:
+    """content-length if present; chunked and HTTP/2 replies often omit it."""
+    length = headers.get("content-length")
+    if length is not None:
+        return int(length or 0)
+    # Streamed replies (server-sent events) must not be buffered here
+    if headers.get("content-type", "").startswith("text/event-stream"):
+        return 0
+    return len(read_body())
+
+
+def _record_response(response) -> None:
+    """Response hook: one API call plus its request/response sizes."""
+    request = response.request
+
+    def read_response():
+        # read() caches the body, so the SDK parses the same bytes afterwards
+        response.read()
+        return response.content
+
+    metrics.record_api(
+        _operation_name(request.url.path),
+        bytes_sent=_body_size(request.headers, lambda: request.content),
+        bytes_received=_body_size(response.headers, read_response),
+    )
+
+
+def _build_client() -> OpenAI:
+    base_url = os.getenv("OPENAI_BASE_URL") or None
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        if not base_url:
+            raise ValueError("OPENAI_API_KEY not found in environment. Please set it in .env file.")
+        api_key = "local"   # Stand-in servers usually ignore the key
+
+    http2 = _http2_enabled()
+    http_client = DefaultHttpxClient(
+        http2=http2,
+        limits=Limits(
+            max_connections=MAX_CONNECTIONS,
+            max_keepalive_connections=MAX_KEEPALIVE,
+            keepalive_expiry=KEEPALIVE_EXPIRY,
+        ),
+        timeout=_timeout(DEFAULT_TIMEOUT),
+        # Calls and bytes per operation (tokens are added by the callers from 'usage')
+        event_hooks={"response": [_record_response]},
+    )
+    logger.info(f"OpenAI client: base_url={base_url or 'default'}, http2={http2}, pool={MAX_CONNECTIONS}")
+    return OpenAI(
+        api_key=api_key,
+        base_url=base_url,
+        http_client=http_client,
+        timeout=_timeout(DEFAULT_TIMEOUT),
+        max_retries=MAX_RETRIES,
+    )
+
+
+def get_client(operation: Optional[str] = None) -> OpenAI:
+    """
+    Returns the shared client, optionally configured for one operation.
+
+    Args:
+        operation (str): "chat", "embeddings", "vision", "stt" or "tts". The
+            returned client uses that operation's timeout but the same pool.
+
+    Returns:
+        OpenAI: A client backed by the process-wide connection pool.
+    """
+    global _client
+    with _lock:
+        if _client is None:
+            _client = _build_client()
+        if operation is None:
+            return _client
+        view = _views.get(operation)
+        if view is None:
+            read = OPERATION_TIMEOUTS.get(operation, DEFAULT_TIMEOUT)
+            # with_options() reuses the underlying httpx client, so no new connections
+            view = _client.with_options(timeout=_timeout(read))
+            _views[operation] = view
+        return view
+
+
+def close_client() -> None:
+    """Closes the pooled connections (call once at shutdown)."""
+    global _client
+    with _lock:
+        if _client is not None:
+            _client.close()
+        _client = None
+        _views.clear()
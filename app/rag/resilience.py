@@ -0,0 +1,185 @@
+# app/rag/resilience.py
+"""
+Latency budgets, hedged requests and bounded retries for API calls.
+
+- Deadline: the time left in one chat turn (RAG_TURN_BUDGET_S, default 20s).
+- hedged_call(fn, op, deadline): runs fn(); if it hasn't answered after the
+  op's observed p95 latency, a duplicate request is sent and whichever answers
+  first wins. Failures are retried (at most RAG_MAX_ATTEMPTS attempts in total,
+  hedges included) until the deadline runs out.
+- fallback_answer(context): what the bot says when the model can't be reached.
+
+Requests that lose the race can't be cancelled (the HTTP client is blocking);
+they finish in the background and their result is dropped.
+
+Environment:
+    RAG_TURN_BUDGET_S   Latency budget per turn in seconds (default 20)
+    RAG_MAX_ATTEMPTS    Attempts per call, hedges and retries included (default 3)
+    RAG_HEDGING         "0" to disable hedged duplicates (retries still apply)
+"""
+import os
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Callable, Optional
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+TURN_BUDGET_S = float(os.getenv("RAG_TURN_BUDGET_S", "20"))
+MAX_ATTEMPTS = int(os.getenv("RAG_MAX_ATTEMPTS", "3"))
+HEDGING = os.getenv("RAG_HEDGING", "1") != "0"
+
+# Hedge delay before enough samples exist, and its floor (seconds)
+DEFAULT_HEDGE_AFTER = {"chat": 8.0, "embeddings": 1.0}
+MIN_HEDGE_AFTER = 0.05
+HEDGE_MIN_SAMPLES = 20
+RETRY_BACKOFF = 0.25       # First retry delay, doubled each time
+
+_pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix="hedge")
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+class Deadline:
+    """Wall-clock budget; pass remaining() as the timeout of blocking calls."""
+
+    def __init__(self, budget_s: float = TURN_BUDGET_S):
+        self.budget_s = budget_s
+        self.expires_at = time.monotonic() + budget_s
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+
+def _retryable(error: Exception) -> bool:
+    """Client errors (bad request, auth, not found) fail the same way every time."""
+    status = getattr(error, "status_code", None)
+    return status is None or status in (408, 409, 429) or status >= 500
+
+
+def hedge_delay(op: str) -> float:
+    """The op's p95 latency once enough calls have been seen, else a default."""
+    p95 = metrics.percentile(f"api.{op}", 95, min_samples=HEDGE_MIN_SAMPLES)
+    if p95 is None:
+        return DEFAULT_HEDGE_AFTER.get(op, 5.0)
+    return max(MIN_HEDGE_AFTER, p95 / 1000.0)
+
+
+def hedged_call(fn: Callable[[], Any], op: str, deadline: Optional[Deadline] = None,
+                max_attempts: int = MAX_ATTEMPTS, hedging: bool = HEDGING) -> Any:
+    """
+    Runs fn() with hedging and bounded retries.
+
+    Args:
+        fn (function): Makes one request. Close over 'deadline.remaining()' to
+            give the request itself a matching timeout.
+        op (str): "chat" or "embeddings"; picks the latency history used for hedging.
+        deadline (Deadline): Give up when it expires (None = no overall limit).
+
+    Returns:
+        The first successful result.
+
+    Raises:
+        DeadlineExceeded: The budget ran out first.
+        Exception: The last error, once every attempt has failed.
+    """
+    def attempt():
+        t0 = time.perf_counter()
+        result = fn()
+        # Only successes count towards the latency history
+        metrics.observe(f"api.{op}", (time.perf_counter() - t0) * 1000)
+        return result
+
+    def next_hedge():
+        return time.monotonic() + hedge_delay(op) if hedging else float("inf")
+
+    pending = {_pool.submit(attempt)}
+    hedges = set()
+    launched, failures = 1, 0
+    last_error: Optional[Exception] = None
+    next_launch = next_hedge()
+
+    while True:
+        remaining = deadline.remaining() if deadline else None
+        if remaining is not None and remaining <= 0:
+            metrics.count(f"deadline.{op}")
+            raise DeadlineExceeded(f"{op} call exceeded the turn budget")
+        can_launch = launched < max_attempts
+        if not pending and not can_launch:
+            raise last_error
+
+        # Sleep until a result arrives, the next launch is due or the budget ends
+        waits = [remaining] if remaining is not None else []
+        if can_launch:
+            waits.append(next_launch - time.monotonic())
+        timeout = max(0.0, min(waits)) if waits and min(waits) != float("inf") else None
+        if pending:
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+        else:
+            time.sleep(timeout or 0.0)
+            done = set()
+
+        for future in done:
+            error = future.exception()
+            if error is None:
+                if future in hedges:
+                    metrics.count(f"hedge.{op}.won")
+                return future.result()
+            failures += 1
+            last_error = error
+            logger.warning(f"{op} attempt {failures} failed: {error}")
+            if not _retryable(error):
+                raise error
+            if not pending:
+                # Nothing left in flight: retry after a short, growing backoff
+                next_launch = min(next_launch, time.monotonic() + RETRY_BACKOFF * 2 ** (failures - 1))
+
+        if can_launch and time.monotonic() >= next_launch:
+            # Either a retry, or a duplicate racing a call that is slower than usual (p95)
+            future = _pool.submit(attempt)
+            if pending:
+                metrics.count(f"hedge.{op}.sent")
+                hedges.add(future)
+            else:
+                metrics.count(f"retry.{op}")
+            pending.add(future)
+            launched += 1
+            next_launch = next_hedge()
+
+
+def chat_completion(client, deadline: Optional[Deadline] = None, **kwargs):
+    """
+    client.chat.completions.create(**kwargs), hedged and retried within 'deadline'.
+    Each request's own timeout is capped at the time left in the budget.
+    """
+    # hedged_call is the only retry layer: one attempt = one HTTP request
+    client = client.with_options(max_retries=0)
+
+    def request():
+        extra = {"timeout": max(0.1, deadline.remaining())} if deadline else {}
+        return client.chat.completions.create(**kwargs, **extra)
+
+    response = hedged_call(request, "chat", deadline)
+    metrics.record_usage("chat.completions", response.usage)
+    return response
+
+
+def fallback_answer(context: str, max_chars: int = 700) -> str:
+    """
+    Answer used when the model is unreachable: the retrieved passages, verbatim.
+    """
+    if not context.strip():
+        return ("Sorry, I'm having trouble reaching my language service right now. "
+                "Please try again in a moment.")
+    excerpt = context.strip()
+    if len(excerpt) > max_chars:
+        excerpt = excerpt[:max_chars].rsplit(" ", 1)[0] + " ..."
+    return ("I'm having trouble generating a full answer right now, but here is what "
+            "I found in the Betopia knowledge base:\n\n" + excerpt)
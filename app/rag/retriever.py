@@ -1,42 +1,191 @@
 # app/rag/retriever.py
+import logging
+
 import numpy as np
 
-def retrieve_chunks(query, index, embed_func, top_k=3):
+from . import metrics
+from .batching import MicroBatcher
+from .vector_store import search_many, bundle_vectors
+
+logger = logging.getLogger(__name__)
+
+# Re-ranking defaults (used when retrieve_chunks is called with mmr=True)
+FETCH_MULTIPLIER = 4      # Candidates pulled per requested chunk before re-ranking
+MMR_LAMBDA = 0.7          # 1.0 = pure relevance, 0.0 = pure diversity
+MAX_DISTANCE = 1.2        # Squared L2 cut-off (unit vectors: 1.2 ~= cosine 0.4)
+MAX_GAP = 0.15            # Stop when the next hit is this much further than the previous one
+
+def mmr_select(query_vec, cand_vecs, k, lambda_mult=MMR_LAMBDA):
+    """
+    Maximal Marginal Relevance: picks 'k' candidates that are relevant to the
+    query but not redundant with each other.
+
+    Args:
+        query_vec (np.ndarray): Query vector, shape (dim,).
+        cand_vecs (np.ndarray): Candidate vectors, shape (n, dim).
+        k (int): How many to select.
+        lambda_mult (float): Trade-off between relevance and diversity.
+
+    Returns:
+        list[int]: Positions into 'cand_vecs', in selection order.
+    """
+    n = len(cand_vecs)
+    if n == 0 or k <= 0:
+        return []
+
+    # 1. Cosine similarities, computed once as matrix products
+    cand = cand_vecs / (np.linalg.norm(cand_vecs, axis=1, keepdims=True) + 1e-12)
+    q = query_vec / (np.linalg.norm(query_vec) + 1e-12)
+    relevance = cand @ q               # (n,)
+    pairwise = cand @ cand.T           # (n, n)
+
+    # 2. Greedy selection; 'redundancy' tracks each candidate's max similarity
+    #    to anything already picked, updated with one vector op per step.
+    selected = [int(np.argmax(relevance))]
+    redundancy = pairwise[selected[0]].copy()
+    available = np.ones(n, dtype=bool)
+    available[selected[0]] = False
+
+    while len(selected) < min(k, n):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        redundancy = np.maximum(redundancy, pairwise[best])
+
+    return selected
+
+def adaptive_cutoff(distances, max_distance=MAX_DISTANCE, max_gap=MAX_GAP):
+    """
+    Decides how many of the (ascending) distances are worth keeping.
+    Always keeps the best hit so the model has something to ground on.
+
+    Returns:
+        int: Number of leading hits to keep.
+    """
+    keep = 1
+    for i in range(1, len(distances)):
+        if max_distance is not None and distances[i] > max_distance:
+            break
+        if max_gap is not None and distances[i] - distances[i - 1] > max_gap:
+            break
+        keep += 1
+    return keep
+
+def _search_batch(requests):
+    """
+    Runs coalesced searches: requests on the same index (and vector mode) become
+    one multi-row search with the largest k, trimmed back per request.
+
+    Args:
+        requests (list): (index, q_vec, k, with_vectors) tuples.
+
+    Returns:
+        list: Per request, (ids, dists) for bundles or a hit list for shards.
+            A group whose search fails gets the exception at its positions, so
+            only the requests on that index see the error.
+    """
+    groups = {}
+    for i, (index, _, _, with_vectors) in enumerate(requests):
+        groups.setdefault((id(index), with_vectors), []).append(i)
+
+    out = [None] * len(requests)
+    for (_, with_vectors), members in groups.items():
+        index = requests[members[0]][0]
+        try:
+            q_mat = np.vstack([requests[i][1] for i in members])
+            k = max(requests[i][2] for i in members)
+            if "shards" in index:
+                results = index["shards"].search(q_mat, k, with_vectors=with_vectors)
+                for i, hits in zip(members, results):
+                    out[i] = hits[:requests[i][2]]
+            else:
+                for i, (ids, dists) in zip(members, search_many(index, q_mat, k)):
+                    out[i] = (ids[:requests[i][2]], dists[:requests[i][2]])
+        except Exception as e:
+            logger.error(f"Search failed for {len(members)} coalesced request(s): {e}")
+            for i in members:
+                out[i] = e
+    return out
+
+# Concurrent sessions: searches arriving together share one multi-row search
+_search_batcher = MicroBatcher(_search_batch, name="search")
+
+def _retrieve_sharded(q_vec, shards_index, k, top_k, mmr, lambda_mult, max_distance, max_gap):
+    """
+    Same pipeline as retrieve_chunks, but the search is scattered to every shard
+    process and the per-shard top-k lists come back already merged by distance.
+    """
+    hits = _search_batcher((shards_index, q_vec, k, mmr))
+    if mmr and hits:
+        dists = np.array([h["distance"] for h in hits])
+        hits = hits[:adaptive_cutoff(dists, max_distance, max_gap)]
+        order = mmr_select(q_vec, np.vstack([h["vector"] for h in hits]), top_k, lambda_mult)
+        hits = [hits[i] for i in order]
+    return [{"text": h["text"], "metadata": h["metadata"], "distance": h["distance"]} for h in hits]
+
+def retrieve_chunks(query, index, embed_func, top_k=3, mmr=False, fetch_k=None,
+                    lambda_mult=MMR_LAMBDA, max_distance=MAX_DISTANCE, max_gap=MAX_GAP):
     """
     Finds the most relevant pieces of text from the FAISS index.
-    
+
     Args:
         query (str): The user's natural language question.
-        index (dict): A dictionary containing the 'faiss' object, 'texts', and 'metadatas'.
+        index (dict): A dictionary containing the 'faiss' object, 'texts', and 'metadatas',
+            or {"shards": ShardedIndex} for the sharded mode.
         embed_func (function): The function that converts text into math vectors.
         top_k (int): How many relevant chunks to return (default is 3).
-        
+            With mmr=True this is an upper bound.
+        mmr (bool): Pull 'fetch_k' candidates, cut them at a distance threshold / score gap,
+            then re-rank with Maximal Marginal Relevance over the stored vectors.
+
     Returns:
-        list: A list of dictionaries containing text and source metadata.
+        list: A list of dictionaries containing text, source metadata and distance.
     """
-    
+
     # 1. Vectorize the User Question
     # We convert the user's text into the same "math language" (vectors) as our PDF chunks.
     # .astype("float32") is required by the FAISS library.
-    q_vec = embed_func(query)[0].astype("float32")
+    q_vec = np.asarray(embed_func(query)[0], dtype="float32")
+
+    k = top_k
+    if mmr:
+        k = fetch_k or top_k * FETCH_MULTIPLIER
+
+    # Sharded mode: the shard servers return text/metadata (and vectors for MMR)
+    if "shards" in index:
+        with metrics.span("shard_search"):
+            return _retrieve_sharded(q_vec, index, k, top_k, mmr,
+                                     lambda_mult, max_distance, max_gap)
 
     # 2. Mathematical Search
-    # index["faiss"].search looks for the k-nearest vectors in the database.
-    # D: Distances (how similar the results are).
-    # I: Indices (the position IDs of the matching text).
-    D, I = index["faiss"].search(
-        np.array([q_vec]), 
-        top_k
-    )
-
-    # 3. Reconstruct the Results
+    # search_bundle looks for the k-nearest vectors in the database
+    # (compact first pass + exact rescoring for compressed bundles).
+    # Queries from concurrent sessions are coalesced into one multi-row search.
+    # ids: the position IDs of the matching text. dists: how similar the results are.
+    with metrics.span("faiss_search"):
+        ids, dists = _search_batcher((index, q_vec, k, False))
+
+    # 3. Optional Re-ranking
+    if mmr and len(ids):
+        # Drop the long tail first so MMR doesn't promote irrelevant-but-different chunks
+        with metrics.span("rerank"):
+            keep = adaptive_cutoff(dists, max_distance, max_gap)
+            ids, dists = ids[:keep], dists[:keep]
+            # Pull the stored vectors back out of the index (no re-embedding needed)
+            cand_vecs = bundle_vectors(index, ids)
+            order = mmr_select(q_vec, cand_vecs, top_k, lambda_mult)
+            ids, dists = ids[order], dists[order]
+
+    # 4. Reconstruct the Results
     results = []
-    # I[0] contains the IDs of the top matching chunks
-    for idx in I[0]:
+    for idx, dist in zip(ids, dists):
         # If FAISS finds a match, we grab the actual text and its source metadata
         results.append({
             "text": index["texts"][idx],
-            "metadata": index["metadatas"][idx]
+            "metadata": index["metadatas"][idx],
+            "distance": float(dist)
         })
 
     return results
@@ -0,0 +1,249 @@
+# app/rag/session_store.py
+import os
+import json
+import time
+import shutil
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from . import metrics
+from .utils import ThreadLocalSQLite, data_dir
+from .vector_store import save_index_bundle, load_index_bundle
+
+logger = logging.getLogger(__name__)
+
+MAX_SESSIONS = int(os.getenv("RAG_MAX_SESSIONS", "100"))
+MAX_SESSION_BYTES = int(os.getenv("RAG_SESSION_MEMORY_MB", "256")) * 1024 * 1024
+MAX_HISTORY_TURNS = 10
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id         TEXT PRIMARY KEY,
+    state      TEXT NOT NULL,
+    has_index  INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_updated ON sessions (updated_at);
+"""
+
+_UNLOADED = object()   # Sentinel: temp index spilled to disk, not read back yet
+
+
+def _index_signature(index: Optional[Dict[str, Any]]):
+    """Cheap change detector for a temp index (object, size and indexed files)."""
+    if index is None:
+        return None
+    return id(index), index["faiss"].ntotal, tuple(sorted(map(str, index.get("files", {}).items())))
+
+
+class Session:
+    """
+    Per-user chat state: history, flags and the temporary upload index.
+
+    The temp index is loaded from disk on first access after a reload.
+    """
+
+    def __init__(self, session_id: str, state: Optional[Dict[str, Any]] = None, loader=None):
+        state = state or {}
+        self.id = session_id
+        self.history: List[Dict[str, str]] = state.get("history", [])
+        self.meeting_scheduled: bool = state.get("meeting_scheduled", False)
+        self.voice_output: bool = state.get("voice_output", False)
+        self.last_context: str = state.get("last_context", "")
+        self._loader = loader
+        self._temp_index = _UNLOADED if loader else None
+        self._spilled_signature = None
+        self.last_used = time.time()
+
+    @property
+    def temp_index(self) -> Optional[Dict[str, Any]]:
+        if self._temp_index is _UNLOADED:
+            self._temp_index = self._loader()
+            self._spilled_signature = _index_signature(self._temp_index)
+        return self._temp_index
+
+    @temp_index.setter
+    def temp_index(self, index: Optional[Dict[str, Any]]) -> None:
+        self._temp_index = index
+
+    def add_turn(self, user: str, assistant: str, max_turns: int = MAX_HISTORY_TURNS) -> None:
+        self.history.append({"user": user, "assistant": assistant})
+        del self.history[:-max_turns]
+
+    def index_loaded(self) -> bool:
+        return self._temp_index is not _UNLOADED
+
+    def index_dirty(self) -> bool:
+        return self.index_loaded() and _index_signature(self._temp_index) != self._spilled_signature
+
+    def state(self) -> Dict[str, Any]:
+        """JSON-serializable state (everything except the temp index)."""
+        return {
+            "history": self.history,
+            "meeting_scheduled": self.meeting_scheduled,
+            "voice_output": self.voice_output,
+            "last_context": self.last_context,
+        }
+
+    def nbytes(self) -> int:
+        """Approximate resident size: history text plus the loaded temp index."""
+        size = sum(len(t["user"]) + len(t["assistant"]) for t in self.history) + len(self.last_context)
+        index = self._temp_index if self.index_loaded() else None
+        if index is not None:
+            size += index["faiss"].ntotal * index["faiss"].d * 4 + index["store"].nbytes()
+        return size
+
+
+class SessionStore:
+    """
+    Bounded session cache with SQLite + disk spill.
+
+    - Hot sessions live in an LRU (OrderedDict) capped by count and by bytes.
+    - The small state (history, flags) is written through to SQLite on every
+      save(), so it survives restarts and crashes.
+    - Temp indexes are written to <spill_dir>/<id>/ only when a dirty session is
+      evicted or flushed, and are read back lazily on first use.
+    """
+
+    def __init__(self, db_path: str, spill_dir: str, max_sessions: int = MAX_SESSIONS,
+                 max_bytes: int = MAX_SESSION_BYTES):
+        self.db_path = db_path
+        self.spill_dir = spill_dir
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._lock = threading.RLock()
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        os.makedirs(spill_dir, exist_ok=True)
+        self._db = ThreadLocalSQLite(db_path)
+        self._db.get().executescript(_SCHEMA)
+
+    def _index_dir(self, session_id: str) -> str:
+        # Session ids come from callers; keep the directory name filesystem-safe
+        safe = "".join(c if c.isalnum() or c in "-_" else "_" for c in session_id)
+        return os.path.join(self.spill_dir, safe)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(self._sizes.values())
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    # --- Public API ------------------------------------------------------------
+
+    def get(self, session_id: str) -> Session:
+        """Returns the session, from memory, from SQLite, or brand new."""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            metrics.cache("session", hit=session is not None)
+            if session is None:
+                session = self._load(session_id) or Session(session_id)
+                self._sessions[session_id] = session
+            # Sizes are refreshed here and in save(); a lazily loaded index counts from then on
+            self._sizes[session_id] = session.nbytes()
+            self._sessions.move_to_end(session_id)
+            session.last_used = time.time()
+            self._evict()
+            return session
+
+    def save(self, session: Session) -> None:
+        """Writes the session's state through to SQLite and re-applies the memory caps."""
+        with self._lock:
+            self._write_state(session)
+            if session.id in self._sessions:
+                self._sessions.move_to_end(session.id)
+                self._sizes[session.id] = session.nbytes()
+            self._evict()
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._sessions.pop(session_id, None)
+            self._sizes.pop(session_id, None)
+            self._db.get().execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+            shutil.rmtree(self._index_dir(session_id), ignore_errors=True)
+
+    def flush(self) -> None:
+        """Persists every hot session (call on shutdown)."""
+        with self._lock:
+            for session in self._sessions.values():
+                self._spill(session)
+
+    # --- Internals -------------------------------------------------------------
+
+    def _load(self, session_id: str) -> Optional[Session]:
+        row = self._db.get().execute(
+            "SELECT state, has_index FROM sessions WHERE id = ?", (session_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        index_dir = self._index_dir(session_id)
+
+        def load_index():
+            try:
+                # Not memory-mapped: the temp index keeps growing with uploads
+                index = load_index_bundle(index_dir, mmap=False)
+                with open(os.path.join(index_dir, "files.json"), "r", encoding="utf-8") as f:
+                    index["files"] = json.load(f)
+                return index
+            except Exception as e:
+                logger.error(f"Could not reload temp index for session {session_id}: {e}")
+                return None
+
+        return Session(session_id, json.loads(row[0]), loader=load_index if row[1] else None)
+
+    def _write_state(self, session: Session) -> None:
+        # Only an index that is actually on disk can be reloaded after a restart
+        has_index = not session.index_loaded() or session._spilled_signature is not None
+        self._db.get().execute(
+            "INSERT INTO sessions (id, state, has_index, updated_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET state = excluded.state, has_index = excluded.has_index, "
+            "updated_at = excluded.updated_at",
+            (session.id, json.dumps(session.state()), int(has_index), time.time()),
+        )
+
+    def _spill(self, session: Session) -> None:
+        """Writes state and (if changed) the temp index to disk."""
+        if session.index_dirty():
+            index_dir = self._index_dir(session.id)
+            shutil.rmtree(index_dir, ignore_errors=True)
+            if session.temp_index is not None:
+                save_index_bundle(session.temp_index, index_dir)
+                with open(os.path.join(index_dir, "files.json"), "w", encoding="utf-8") as f:
+                    json.dump(session.temp_index.get("files", {}), f)
+            session._spilled_signature = _index_signature(session.temp_index)
+        self._write_state(session)
+
+    def _evict(self) -> None:
+        """
+        Spills least-recently-used sessions until both caps hold. The most recent
+        session is always kept, even if it alone exceeds the byte cap.
+        """
+        while len(self._sessions) > 1 and (
+            len(self._sessions) > self.max_sessions or self.nbytes > self.max_bytes
+        ):
+            victim_id, victim = self._sessions.popitem(last=False)
+            self._sizes.pop(victim_id, None)
+            self._spill(victim)
+            metrics.count("session.evicted")
+            logger.info(f"Session {victim_id} spilled to disk")
+
+
+_store: Optional[SessionStore] = None
+_store_lock = threading.Lock()
+
+
+def get_session_store() -> SessionStore:
+    """
+    Returns the process-wide store (data/sessions.db, temp indexes under data/sessions/).
+    """
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                root = data_dir()
+                _store = SessionStore(os.path.join(root, "sessions.db"), os.path.join(root, "sessions"))
+    return _store
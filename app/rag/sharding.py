@@ -0,0 +1,339 @@
+# app/rag/sharding.py
+"""
+Optional sharded mode for the knowledge-base index.
+
+Chunks are partitioned by source across N shards. Each shard is a normal index
+bundle on disk, served by its own process over a small socket protocol
+(multiprocessing.connection, authenticated). A query is scattered to every shard
+at once and the per-shard top-k lists are merged by distance.
+
+Run a shard on another node with:
+    RAG_SHARD_AUTHKEY=<hex> python -m rag.sharding <shard_dir> <host> <port>
+"""
+import os
+import sys
+import time
+import shutil
+import hashlib
+import logging
+import secrets
+import threading
+import subprocess
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Listener, Client
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+
+from .vector_store import (
+    create_faiss_index, save_index_bundle, load_index_bundle, search_many, bundle_vectors,
+)
+
+logger = logging.getLogger(__name__)
+
+AUTHKEY_ENV = "RAG_SHARD_AUTHKEY"
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPLY_TIMEOUT = float(os.getenv("RAG_SHARD_TIMEOUT", "30"))   # Seconds to wait for a shard's reply
+ACCEPT_BACKOFF_MAX = 1.0
+
+
+class ShardError(RuntimeError):
+    """A shard server failed to handle a request (its error message is passed on)."""
+
+
+# --- Partitioning & building ----------------------------------------------
+
+def shard_for_source(source: str, n_shards: int) -> int:
+    """Stable source -> shard mapping (same answer in every process and run)."""
+    digest = hashlib.blake2b(str(source).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little") % n_shards
+
+
+def partition_by_source(vectors, texts, metadatas, n_shards: int) -> List[Tuple[list, list, list]]:
+    """Splits chunks into 'n_shards' groups; all chunks of one source land together."""
+    parts = [([], [], []) for _ in range(n_shards)]
+    for vec, text, meta in zip(vectors, texts, metadatas):
+        part = parts[shard_for_source(meta.get("source"), n_shards)]
+        part[0].append(vec)
+        part[1].append(text)
+        part[2].append(meta)
+    return parts
+
+
+def shard_dir(out_dir: str, shard_id: int) -> str:
+    return os.path.join(out_dir, f"shard_{shard_id:03d}")
+
+
+def shard_id_of(directory: str) -> int:
+    """Inverse of shard_dir: 'out/shard_007' -> 7."""
+    return int(os.path.basename(os.path.normpath(directory)).rsplit("_", 1)[1])
+
+
+def write_shard(out_dir: str, shard_id: int, vectors, texts, metadatas, compression=None,
+                embedding=None) -> Optional[str]:
+    """
+    (Re)builds one shard on disk. The new files are written next to the old
+    ones and swapped in with renames, so a serving process never sees half a shard.
+    Returns the shard directory, or None if the shard has no chunks.
+    """
+    if not len(vectors):
+        return None
+    final = shard_dir(out_dir, shard_id)
+    staging = final + ".new"
+    retired = final + ".old"
+    shutil.rmtree(staging, ignore_errors=True)
+    save_index_bundle(create_faiss_index(vectors, texts, metadatas, compression=compression, embedding=embedding,
+                                         documents=True),
+                      staging)
+
+    shutil.rmtree(retired, ignore_errors=True)
+    if os.path.isdir(final):
+        os.replace(final, retired)
+    os.replace(staging, final)
+    shutil.rmtree(retired, ignore_errors=True)
+    return final
+
+
+def build_shards(vectors, texts, metadatas, n_shards: int, out_dir: str, compression=None,
+                 embedding=None) -> List[str]:
+    """
+    Partitions by source and writes every non-empty shard. Returns their
+    directories; empty shards are skipped, so use shard_id_of() for the ids.
+    """
+    dirs = []
+    for shard_id, (v, t, m) in enumerate(partition_by_source(vectors, texts, metadatas, n_shards)):
+        path = write_shard(out_dir, shard_id, v, t, m, compression=compression, embedding=embedding)
+        if path:
+            dirs.append(path)
+    return dirs
+
+
+# --- Shard server ---------------------------------------------------------
+
+def _search_bundle(bundle, q_mat: np.ndarray, k: int, with_vectors: bool):
+    """Runs a multi-row search and packs results as plain Python/NumPy objects."""
+    out = []
+    for ids, dists in search_many(bundle, q_mat, k):
+        vecs = bundle_vectors(bundle, ids) if with_vectors and len(ids) else None
+        hits = []
+        for j, (idx, dist) in enumerate(zip(ids, dists)):
+            hit = {
+                "distance": float(dist),
+                "text": bundle["texts"][idx],
+                "metadata": bundle["metadatas"][idx],
+            }
+            if vecs is not None:
+                hit["vector"] = vecs[j]
+            hits.append(hit)
+        out.append(hits)
+    return out
+
+
+def serve_shard(directory: str, address: Tuple[str, int], authkey: bytes) -> None:
+    """
+    Serves one shard until a 'close' message arrives.
+
+    Messages (tuples): ("search", q_mat, k, with_vectors) -> list of hit lists,
+    ("reload",) -> ntotal, ("ntotal",) -> ntotal, ("close",) -> None.
+    Every reply is ("ok", result) or ("error", message).
+    """
+    state = {"bundle": load_index_bundle(directory)}
+    lock = threading.Lock()
+    listener = Listener(address, authkey=authkey)
+    # The parent reads the bound address from our first line of stdout
+    print(f"{listener.address[0]} {listener.address[1]}", flush=True)
+    stop = threading.Event()
+
+    def handle(conn):
+        with conn:
+            while not stop.is_set():
+                try:
+                    msg = conn.recv()
+                except (EOFError, OSError):
+                    return
+                op = msg[0]
+                try:
+                    if op == "search":
+                        _, q_mat, k, with_vectors = msg
+                        reply = _search_bundle(state["bundle"], q_mat, k, with_vectors)
+                    elif op == "reload":
+                        with lock:
+                            state["bundle"] = load_index_bundle(directory)
+                        reply = state["bundle"]["faiss"].ntotal
+                    elif op == "ntotal":
+                        reply = state["bundle"]["faiss"].ntotal
+                    elif op == "close":
+                        reply = None
+                    else:
+                        raise ValueError(f"unknown op {op!r}")
+                except Exception as e:
+                    # Keep serving: a bad request or a failed reload must not kill the shard
+                    logger.error(f"Shard {directory}: {op} failed: {e}")
+                    reply, status = f"{type(e).__name__}: {e}", "error"
+                else:
+                    status = "ok"
+                try:
+                    conn.send((status, reply))
+                except OSError:
+                    return     # Client went away (e.g. it timed out and reconnected)
+                if op == "close":
+                    stop.set()
+                    # Unblock accept() so the main loop can exit
+                    try:
+                        Client(listener.address, authkey=authkey).close()
+                    except OSError:
+                        pass
+                    return
+
+    backoff = 0.01
+    while not stop.is_set():
+        try:
+            conn = listener.accept()
+        except AuthenticationError:
+            continue      # A client with the wrong key; the listener itself is fine
+        except OSError as e:
+            if stop.is_set():
+                break
+            # Back off instead of spinning if the listener keeps failing
+            logger.warning(f"Shard {directory}: accept failed: {e}")
+            stop.wait(backoff)
+            backoff = min(backoff * 2, ACCEPT_BACKOFF_MAX)
+            continue
+        backoff = 0.01
+        threading.Thread(target=handle, args=(conn,), daemon=True).start()
+    listener.close()
+
+
+# --- Client ---------------------------------------------------------------
+
+class ShardedIndex:
+    """
+    Scatter-gather client over a set of shard servers.
+
+    Every query is sent to all shards before any reply is read, so shards search
+    in parallel; the per-shard top-k lists are then merged by distance.
+
+    Args:
+        addresses (dict): shard id -> (host, port). A list is numbered from 0.
+        timeout (float): Seconds to wait for each reply (TimeoutError after that).
+    """
+
+    def __init__(self, addresses, authkey: bytes, processes=None, timeout: float = REPLY_TIMEOUT):
+        if not isinstance(addresses, dict):
+            addresses = dict(enumerate(addresses))
+        self.addresses = {sid: tuple(a) for sid, a in addresses.items()}
+        self.authkey = authkey
+        self.timeout = timeout
+        self._conns = {sid: Client(a, authkey=authkey) for sid, a in self.addresses.items()}
+        self._processes = processes or []
+        self._lock = threading.Lock()
+
+    @classmethod
+    def spawn_local(cls, shard_dirs: List[str], host: str = "127.0.0.1") -> "ShardedIndex":
+        """Starts one worker process per shard directory on this machine."""
+        authkey = secrets.token_bytes(16)
+        env = dict(os.environ)
+        env[AUTHKEY_ENV] = authkey.hex()
+        env["PYTHONPATH"] = APP_DIR + os.pathsep + env.get("PYTHONPATH", "")
+
+        processes, addresses = [], {}
+        for d in shard_dirs:
+            proc = subprocess.Popen(
+                [sys.executable, "-m", "rag.sharding", d, host, "0"],
+                env=env, stdout=subprocess.PIPE, text=True,
+            )
+            line = proc.stdout.readline().split()
+            if len(line) != 2:
+                proc.kill()
+                raise RuntimeError(f"Shard worker for {d} failed to start.")
+            addresses[shard_id_of(d)] = (line[0], int(line[1]))
+            processes.append(proc)
+        logger.info(f"Started {len(processes)} shard workers.")
+        return cls(addresses, authkey, processes)
+
+    def _reconnect(self, shard_id: int) -> None:
+        """
+        Replaces a connection that may still have a late reply in flight, so the
+        reply can't be read as the answer to a later request.
+        """
+        self._conns[shard_id].close()
+        try:
+            self._conns[shard_id] = Client(self.addresses[shard_id], authkey=self.authkey)
+        except OSError as e:
+            logger.error(f"Shard {shard_id}: reconnect failed: {e}")
+
+    def _broadcast(self, msg, targets=None) -> List[Any]:
+        """
+        Sends 'msg' to the target shards (default: all), then collects every reply.
+
+        Raises:
+            TimeoutError: A shard didn't answer within self.timeout.
+            ShardError: A shard answered with an error.
+        """
+        targets = list(self._conns) if targets is None else list(targets)
+        with self._lock:
+            for sid in targets:           # scatter
+                self._conns[sid].send(msg)
+            results, failures = [], []
+            expires = time.monotonic() + self.timeout
+            for sid in targets:           # gather (every reply is read, even after a failure)
+                conn = self._conns[sid]
+                if not conn.poll(max(0.0, expires - time.monotonic())):
+                    self._reconnect(sid)
+                    failures.append(TimeoutError(f"Shard {sid} did not answer within {self.timeout}s"))
+                    continue
+                status, result = conn.recv()
+                if status != "ok":
+                    failures.append(ShardError(f"Shard {sid}: {result}"))
+                results.append(result)
+        if failures:
+            raise failures[0]
+        return results
+
+    @property
+    def ntotal(self) -> int:
+        return sum(self._broadcast(("ntotal",)))
+
+    def search(self, q_mat: np.ndarray, k: int, with_vectors: bool = False) -> List[List[Dict[str, Any]]]:
+        """
+        Args:
+            q_mat (np.ndarray): Query vectors, shape (m, dim), float32.
+            k (int): Results wanted per query.
+
+        Returns:
+            list: For each query, up to k hits {"distance", "text", "metadata"[, "vector"]},
+            nearest first.
+        """
+        q_mat = np.ascontiguousarray(q_mat, dtype="float32")
+        per_shard = self._broadcast(("search", q_mat, k, with_vectors))
+        merged = []
+        for qi in range(len(q_mat)):
+            hits = [h for shard_hits in per_shard for h in shard_hits[qi]]
+            hits.sort(key=lambda h: h["distance"])
+            merged.append(hits[:k])
+        return merged
+
+    def reload(self, shard_id: int) -> int:
+        """Makes one shard re-read its directory after write_shard rebuilt it."""
+        return self._broadcast(("reload",), targets=[shard_id])[0]
+
+    def close(self) -> None:
+        try:
+            self._broadcast(("close",))
+        except (OSError, EOFError, ShardError):
+            pass
+        for conn in self._conns.values():
+            conn.close()
+        for proc in self._processes:
+            try:
+                proc.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+
+if __name__ == "__main__":
+    # Usage: python -m rag.sharding <shard_dir> <host> <port>
+    key = os.environ.get(AUTHKEY_ENV)
+    if not key or len(sys.argv) != 4:
+        sys.exit(f"usage: {AUTHKEY_ENV}=<hex> python -m rag.sharding <shard_dir> <host> <port>")
+    serve_shard(sys.argv[1], (sys.argv[2], int(sys.argv[3])), bytes.fromhex(key))
@@ -0,0 +1,127 @@
+# app/rag/snapshots.py
+import os
+import time
+import shutil
+import logging
+import threading
+from typing import Optional, Dict, Any
+
+from .vector_store import save_index_bundle, load_index_bundle
+from .embeddings import embedding_matches
+
+logger = logging.getLogger(__name__)
+
+CURRENT_FILE = "CURRENT"
+SNAPSHOTS_DIR = "snapshots"
+KEEP_SNAPSHOTS = 3
+
+def current_version(root: str) -> Optional[str]:
+    """
+    Reads the name of the live snapshot from <root>/CURRENT (None if nothing is published).
+    """
+    try:
+        with open(os.path.join(root, CURRENT_FILE), "r", encoding="utf-8") as f:
+            version = f.read().strip()
+    except OSError:
+        return None
+    if version and os.path.isdir(os.path.join(root, SNAPSHOTS_DIR, version)):
+        return version
+    return None
+
+def publish_snapshot(bundle: Dict[str, Any], root: str) -> str:
+    """
+    Writes 'bundle' as a new versioned snapshot and makes it current.
+
+    The snapshot directory is complete before CURRENT is switched with an atomic
+    os.replace, so readers see either the old version or the new one, never a mix.
+
+    Returns:
+        str: The new version name.
+    """
+    now = time.time()
+    version = time.strftime("v%Y%m%d-%H%M%S", time.localtime(now)) + f"{int(now * 1000) % 1000:03d}-{os.getpid()}"
+    snap_dir = os.path.join(root, SNAPSHOTS_DIR, version)
+    save_index_bundle(bundle, snap_dir)
+
+    pointer_tmp = os.path.join(root, CURRENT_FILE + ".tmp")
+    with open(pointer_tmp, "w", encoding="utf-8") as f:
+        f.write(version)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(pointer_tmp, os.path.join(root, CURRENT_FILE))
+    logger.info(f"Published index snapshot {version}")
+
+    _prune_snapshots(root, keep=KEEP_SNAPSHOTS, current=version)
+    return version
+
+def _prune_snapshots(root: str, keep: int, current: str) -> None:
+    """
+    Deletes old snapshots. A few are kept so a bot that is still reading one
+    (memory-mapped) isn't pulled out from under.
+    """
+    snap_root = os.path.join(root, SNAPSHOTS_DIR)
+    versions = sorted(v for v in os.listdir(snap_root) if os.path.isdir(os.path.join(snap_root, v)))
+    for old in versions[:-keep]:
+        if old != current:
+            shutil.rmtree(os.path.join(snap_root, old), ignore_errors=True)
+
+def load_snapshot(root: str, version: str) -> Dict[str, Any]:
+    return load_index_bundle(os.path.join(root, SNAPSHOTS_DIR, version))
+
+class SnapshotWatcher:
+    """
+    Watches <root>/CURRENT from a background thread and pre-loads new snapshots.
+
+    The chat loop calls swap_if_ready() between turns: it hands over the
+    already-loaded bundle (a plain reference swap), so queries never wait on I/O.
+    Snapshots built with a different embedding backend are never offered; the
+    current index keeps serving until a compatible one is published.
+    """
+
+    def __init__(self, root: str, version: Optional[str] = None, poll_interval: float = 2.0):
+        self.root = root
+        self.version = version
+        self.poll_interval = poll_interval
+        self._pending = None       # (version, bundle) ready to be swapped in
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="snapshot-watcher", daemon=True)
+
+    def start(self) -> "SnapshotWatcher":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self) -> None:
+        seen = self.version
+        while not self._stop.wait(self.poll_interval):
+            version = current_version(self.root)
+            if version is None or version == seen:
+                continue
+            try:
+                bundle = load_snapshot(self.root, version)
+            except Exception as e:
+                logger.error(f"Failed to load index snapshot {version}: {e}")
+                continue
+            seen = version
+            if not embedding_matches(bundle):
+                # Query vectors from the active backend can't search it
+                logger.error(f"Refusing index snapshot {version}: built with embeddings "
+                             f"{bundle.get('embedding')}, not the active backend's. Keeping the current index.")
+                print(f"⚠️ Snapshot {version} uses a different embedding backend; keeping the current index.")
+                continue
+            with self._lock:
+                self._pending = (version, bundle)
+
+    def swap_if_ready(self) -> Optional[Dict[str, Any]]:
+        """
+        Returns the newly loaded bundle once (or None if nothing changed).
+        """
+        with self._lock:
+            pending, self._pending = self._pending, None
+        if pending is None:
+            return None
+        self.version = pending[0]
+        return pending[1]
@@ -1,12 +1,28 @@
 # app/rag/sync.py
+"""
+Offline index builder.
+
+Builds a versioned index snapshot in its own process so heavy ingestion never
+competes with chat latency; a running bot picks the new snapshot up between turns.
+
+    python -m app.rag.sync [--pdf-dir DIR] [--img-dir DIR] [--out DIR] [--force]
+"""
 import os
-from typing import List
-from .utils import file_hash, load_manifest, save_manifest
+import time
+import argparse
+from typing import List, Optional
+from .utils import fingerprint_files, manifest_hash, load_manifest, save_manifest
 from .pdf_loader import load_all_pdfs_text
 from .image_reader import load_all_images_text
-from .chunker import chunk_text
-from .embeddings import embed_texts
-from .vector_store import create_faiss_index
+from .chunker import chunk_text_with_offsets
+from .embeddings import embed_texts, embedding_info, EmbeddingError
+from .dedup import dedupe_chunks
+from .vector_store import create_faiss_index, read_embedding_info
+from .snapshots import current_version, publish_snapshot, SNAPSHOTS_DIR
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DEFAULT_DATA_DIR = os.path.join(PROJECT_ROOT, "data")
+DEFAULT_SNAPSHOT_ROOT = os.path.join(DEFAULT_DATA_DIR, "index")
 
 def gather_files(pdf_dir: str, img_dir: str) -> List[str]:
     """
@@ -35,64 +51,114 @@ def build_documents_list(pdf_dir: str, img_dir: str, client=None) -> list:
     image_docs = load_all_images_text(img_dir, client)
     return pdf_docs + image_docs
 
-def sync_and_rebuild(pdf_dir: str, img_dir: str, client) -> bool:
+def sync_and_rebuild(pdf_dir: str, img_dir: str, client, snapshot_root: str = DEFAULT_SNAPSHOT_ROOT,
+                     compression: Optional[str] = None, force: bool = False) -> bool:
     """
     The main logic: Detects changes and rebuilds the index only if necessary.
+    A rebuild is published as a new snapshot under 'snapshot_root'.
     """
-    # 1. Load the 'Last Known State' (manifest.json)
-    manifest = load_manifest()
+    # 1. Load the 'Last Known State' (manifest.json, kept next to the snapshots)
+    manifest_path = os.path.join(snapshot_root, "manifest.json")
+    manifest = load_manifest(manifest_path)
     
     # 2. Get the 'Current State' of the folders
     files = gather_files(pdf_dir, img_dir)
-    current_map = {}
-    for f in files:
-        try:
-            # Generate a unique fingerprint (hash) based on file content
-            current_map[f] = file_hash(f)
-        except Exception:
-            current_map[f] = None
+    # Fingerprint = size + mtime + content hash. Files whose size and mtime
+    # match the manifest reuse the stored hash and are never read.
+    current_map = fingerprint_files(files, manifest)
 
     # 3. Compare: Has anything changed?
     # Check for new or deleted files
     files_added_or_removed = set(manifest.keys()) != set(current_map.keys())
     
     # Check if existing files were edited
-    content_changed = any(manifest.get(k) != current_map.get(k) for k in current_map)
+    content_changed = any(
+        manifest_hash(manifest.get(k)) != manifest_hash(current_map.get(k)) for k in current_map
+    )
+
+    # Nothing published yet (or it was deleted): must build
+    version = current_version(snapshot_root)
+    no_snapshot = version is None
 
-    if not (files_added_or_removed or content_changed):
+    # Switching embedding backend/model makes every stored vector useless
+    embedding = embedding_info()
+    recorded = None if no_snapshot else read_embedding_info(os.path.join(snapshot_root, SNAPSHOTS_DIR, version))
+    embedding_changed = recorded is not None and recorded != embedding
+    if embedding_changed:
+        print(f" Embedding backend changed ({recorded['backend']}/{recorded['model']} -> "
+              f"{embedding['backend']}/{embedding['model']}).")
+
+    if not (files_added_or_removed or content_changed or no_snapshot or embedding_changed or force):
+        # Content is the same, but refresh size/mtime (e.g. after a 'touch')
+        # so those files are not re-hashed on the next run.
+        if current_map != manifest:
+            save_manifest(current_map, manifest_path)
         print(" Data is in sync. No rebuild needed.")
         return False
 
     print(" Changes detected! Rebuilding FAISS index...")
 
-    # 4. Save the new state so we don't rebuild again next time
-    save_manifest(current_map)
-
     # 5. Extract all text from files
     docs = build_documents_list(pdf_dir, img_dir, client)
     
     all_chunks = []
     metadatas = []
+    ts = int(time.time())
 
     # 6. Process each document into chunks
     for doc in docs:
         body = doc["text"]
         source = doc["source"]
 
-        chunks = chunk_text(body)
-        for c in chunks:
+        for start, c in chunk_text_with_offsets(body):
             all_chunks.append(c)
             # Metadata allows the bot to say "I found this in file X"
+            # 'start' lets the context assembler merge neighbouring chunks
             metadatas.append({
                 "source": source,
+                "start": start,
+                "updated_at": ts,
                 "text_preview": c[:100] # Useful for debugging
             })
 
-    # 7. Create New Mathematical Vectors
-    embeddings = embed_texts(all_chunks)
-    
-    # 8. Update the FAISS index file
-    create_faiss_index(embeddings, all_chunks, metadatas)
+    # 7. Drop exact/near-duplicate chunks, then create New Mathematical Vectors
+    all_chunks, metadatas = dedupe_chunks(all_chunks, metadatas)
+    if not all_chunks:
+        print(" No documents found; nothing to index.")
+        return False
+    try:
+        embeddings = embed_texts(all_chunks)
+    except EmbeddingError as e:
+        # Never publish a partial index: keep serving the current snapshot and
+        # leave the manifest untouched so the next run retries everything
+        print(f" Rebuild aborted: {e}.")
+        return False
     
-    print(f" Index rebuilt successfully with {len(all_chunks)} chunks.")
-    return True
\ No newline at end of file
+    # 8. Write a new snapshot and flip the CURRENT pointer to it
+    bundle = create_faiss_index(embeddings, all_chunks, metadatas, compression=compression, embedding=embedding,
+                                documents=True)
+    version = publish_snapshot(bundle, snapshot_root)
+
+    # 9. Only now record the new state, so a failed build is retried next time
+    save_manifest(current_map, manifest_path)
+
+    print(f" Index rebuilt successfully with {len(all_chunks)} chunks (snapshot {version}).")
+    return True
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Build a versioned FAISS index snapshot for the Betopia bot.")
+    parser.add_argument("--pdf-dir", default=os.path.join(DEFAULT_DATA_DIR, "pdf"))
+    parser.add_argument("--img-dir", default=os.path.join(DEFAULT_DATA_DIR, "images"))
+    parser.add_argument("--out", default=DEFAULT_SNAPSHOT_ROOT, help="Snapshot root watched by the bot.")
+    parser.add_argument("--compression", default=os.getenv("RAG_COMPRESSION"),
+                        help='Compact vectors, e.g. "int8" or "dim512+int8".')
+    parser.add_argument("--force", action="store_true", help="Rebuild even if nothing changed.")
+    args = parser.parse_args(argv)
+
+    from .openai_client import get_client
+    sync_and_rebuild(args.pdf_dir, args.img_dir, get_client("vision"), snapshot_root=args.out,
+                     compression=args.compression, force=args.force)
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
\ No newline at end of file
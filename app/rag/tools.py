@@ -0,0 +1,161 @@
+# app/rag/tools.py
+import json
+import logging
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from . import metrics
+from .actions import schedule_meeting
+from .resilience import chat_completion
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on model <-> tool round trips for tools that need the general loop.
+MAX_TOOL_STEPS = 3
+
+# 1. Tool Schemas (sent to the model with every chat request)
+TOOLS = [{
+    "type": "function",
+    "function": {
+        "name": "schedule_meeting",
+        "description": "ONLY call this if the user EXPLICITLY asks to book a meeting.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "name": {"type": "string", "description": "User's full name"},
+                "email": {"type": "string", "description": "User's email"},
+                "phone": {"type": "string", "description": "User's phone number"}
+            },
+            "required": ["name", "email", "phone"]
+        }
+    }
+}]
+
+# 2. Response Templates
+# Tools with deterministic outcomes map their status prefix (e.g. "SUCCESS: ...")
+# to a ready-made reply. The arguments the model sent are available as fields.
+SCHEDULE_MEETING_TEMPLATES = {
+    "SUCCESS": (
+        "Your meeting has been successfully scheduled, {name}! "
+        "Our team will reach out to you at {email} or {phone} shortly."
+    ),
+    "ALREADY_EXISTS": (
+        "Good news, {name} - your meeting request is already recorded, "
+        "so there's nothing more you need to do. Is there anything else I can help with?"
+    ),
+    "ERROR": (
+        "I'm sorry, something went wrong while saving your meeting. "
+        "Please try again in a moment."
+    ),
+}
+
+# 3. Tool Registry
+# 'templates' is optional: tools without it fall back to a follow-up LLM call
+# so the model can phrase (or chain) the result itself.
+TOOL_REGISTRY: Dict[str, Dict[str, Any]] = {
+    "schedule_meeting": {
+        "fn": schedule_meeting,
+        "templates": SCHEDULE_MEETING_TEMPLATES,
+    },
+}
+
+
+class _SafeArgs(dict):
+    """Leaves unknown placeholders empty instead of raising KeyError."""
+    def __missing__(self, key):
+        return ""
+
+
+def render_tool_response(result: str, templates: Optional[Dict[str, str]], args: dict) -> Optional[str]:
+    """
+    Turns a tool's status string into a user-facing reply using its templates.
+
+    Returns None when the tool has no templates or the status is not covered,
+    which tells the caller to ask the model instead.
+    """
+    if not templates:
+        return None
+    status = result.split(":", 1)[0].strip()
+    template = templates.get(status)
+    if template is None:
+        return None
+    return template.format_map(_SafeArgs({k: str(v) for k, v in args.items()}))
+
+
+def execute_tool_call(tool_call) -> Tuple[str, dict, Optional[str]]:
+    """
+    Runs a single tool call requested by the model.
+
+    Returns:
+        tuple: (raw result string, parsed arguments, templated reply or None)
+    """
+    name = tool_call.function.name
+    spec = TOOL_REGISTRY.get(name)
+    if spec is None:
+        logger.warning(f"Model requested unknown tool: {name}")
+        return f"ERROR: Unknown tool '{name}'.", {}, None
+
+    try:
+        args = json.loads(tool_call.function.arguments or "{}")
+    except json.JSONDecodeError:
+        logger.error(f"Invalid arguments for tool {name}: {tool_call.function.arguments}")
+        return "ERROR: Invalid tool arguments.", {}, None
+
+    result = spec["fn"](**args)
+    return result, args, render_tool_response(result, spec.get("templates"), args)
+
+
+def run_tool_loop(
+    client,
+    messages: List[Any],
+    resp_msg,
+    model: str = "gpt-4o-mini",
+    on_result: Optional[Callable[[str, str], None]] = None,
+    max_steps: int = MAX_TOOL_STEPS,
+    deadline=None,
+) -> str:
+    """
+    Resolves the model's tool calls into a final answer.
+
+    Fast path: if every call in a step has a templated reply, those replies are
+    returned directly and no second completion is requested.
+    General path: results are sent back to the model, which may answer or call
+    more tools, for up to 'max_steps' rounds.
+
+    Args:
+        client: The OpenAI client.
+        messages (list): The chat messages sent so far (mutated in place).
+        resp_msg: The assistant message that contains 'tool_calls'.
+        on_result (callable): Optional hook called as on_result(tool_name, result).
+        deadline (Deadline): The turn's latency budget for follow-up completions.
+    """
+    for step in range(max_steps):
+        messages.append(resp_msg)
+        replies = []
+        for tool_call in resp_msg.tool_calls:
+            result, _, reply = execute_tool_call(tool_call)
+            if on_result:
+                on_result(tool_call.function.name, result)
+            replies.append(reply)
+            messages.append({
+                "tool_call_id": tool_call.id,
+                "role": "tool",
+                "name": tool_call.function.name,
+                "content": result
+            })
+
+        # Fast path: every result is deterministic, no need to ask the model again
+        if all(r is not None for r in replies):
+            metrics.count("tools.templated_reply")
+            return "\n\n".join(replies)
+
+        # General path: let the model read the results (tools stay available
+        # until the final step so it can chain another call if needed)
+        last_step = step == max_steps - 1
+        kwargs = {} if last_step else {"tools": TOOLS, "tool_choice": "auto"}
+        metrics.count("tools.llm_followup")
+        response = chat_completion(client, deadline, model=model, messages=messages, **kwargs)
+        resp_msg = response.choices[0].message
+        if not resp_msg.tool_calls:
+            return resp_msg.content
+
+    return resp_msg.content or ""
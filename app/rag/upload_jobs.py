@@ -0,0 +1,236 @@
+# app/rag/upload_jobs.py
+import os
+import time
+import logging
+import threading
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Dict, Any
+
+from .embeddings import embed_chunks, embedding_info
+from .vector_store import add_to_faiss_index, remove_from_faiss_index, empty_bundle
+from .upload_manager import (
+    save_uploaded_files,
+    load_text_from_file,
+    remove_uploaded_file,
+    clear_tmp_dir,
+    _chunk_document,
+    _file_fingerprint,
+    _positions_for_source,
+)
+
+logger = logging.getLogger(__name__)
+
+# Chunks per embeddings call; cancellation is checked between calls
+EMBED_BATCH = 256
+
+# Job lifecycle states
+PENDING, RUNNING, DONE, CANCELLED, FAILED = "pending", "running", "done", "cancelled", "failed"
+
+
+class JobCancelled(Exception):
+    """Raised inside a worker when the user cancels its job."""
+
+
+class UploadJob:
+    """
+    Progress and control handle for one '/upload' request running in the background.
+    """
+
+    def __init__(self, job_id: int, paths: List[str], generation: int = 0):
+        self.id = job_id
+        self.paths = paths
+        self.generation = generation   # Manager's clear() count when the job was submitted
+        self.status = PENDING
+        self.error = None
+        self.files_total = len(paths)
+        self.files_done = 0
+        self.chunks = 0
+        self.vectors_added = 0
+        self.started_at = None
+        self.finished_at = None
+        self._cancel = threading.Event()
+        self._done = threading.Event()
+
+    def cancel(self) -> None:
+        """Asks the worker to stop at the next embedding batch."""
+        self._cancel.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def check_cancelled(self) -> None:
+        if self._cancel.is_set():
+            raise JobCancelled()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        Blocks until the job has finished, cleanup included. Returns False on timeout.
+        """
+        return self._done.wait(timeout)
+
+    def summary(self) -> str:
+        """One-line progress string for the REPL."""
+        line = (f"#{self.id} [{self.status}] files {self.files_done}/{self.files_total}, "
+                f"chunks {self.chunks}, vectors added {self.vectors_added}")
+        if self.error:
+            line += f" | error: {self.error}"
+        return line
+
+
+class UploadJobManager:
+    """
+    Runs upload ingestion (copy -> extract -> chunk -> embed) on a worker pool
+    and owns the session's temporary index.
+
+    Workers only touch the shared index when a job finishes, under 'lock';
+    readers (retrieval) should hold the same lock while searching it.
+
+    index["files"] records the fingerprint of every processed file, including
+    files that yielded no text, so unchanged re-uploads are skipped. The index
+    is None only when no file is recorded; it may hold no vectors.
+    """
+
+    def __init__(self, tmp_dir: str, client: Any, max_workers: int = 2):
+        self.tmp_dir = tmp_dir
+        self.client = client
+        self.index: Optional[Dict[str, Any]] = None
+        self.lock = threading.RLock()
+        self.jobs: Dict[int, UploadJob] = {}
+        self._finished: List[UploadJob] = []
+        self._generation = 0           # Bumped by clear(); older jobs must not publish
+        self._ids = itertools.count(1)
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="upload")
+
+    def submit(self, paths: List[str]) -> UploadJob:
+        """Queues an upload and returns immediately with its job handle."""
+        with self.lock:
+            job = UploadJob(next(self._ids), paths, self._generation)
+            self.jobs[job.id] = job
+        self._pool.submit(self._run, job)
+        return job
+
+    def cancel(self, job_id: int) -> bool:
+        job = self.jobs.get(job_id)
+        if job is None or job.status in (DONE, CANCELLED, FAILED):
+            return False
+        job.cancel()
+        return True
+
+    def active_jobs(self) -> List[UploadJob]:
+        return [j for j in self.jobs.values() if j.status in (PENDING, RUNNING)]
+
+    def pop_finished(self) -> List[UploadJob]:
+        """Returns jobs that finished since the last call (for REPL notifications)."""
+        with self.lock:
+            finished, self._finished = self._finished, []
+        return finished
+
+    def remove_file(self, filename: str) -> None:
+        with self.lock:
+            self.index = remove_uploaded_file(self.tmp_dir, filename, self.index)
+
+    def clear(self) -> None:
+        """Cancels running jobs, wipes the tmp directory and drops the session index."""
+        for job in self.active_jobs():
+            job.cancel()
+        with self.lock:
+            self._generation += 1
+            clear_tmp_dir(self.tmp_dir)
+            self.index = None
+
+    def shutdown(self) -> None:
+        for job in self.active_jobs():
+            job.cancel()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, job: UploadJob) -> None:
+        job.status = RUNNING
+        job.started_at = time.time()
+        saved = []
+        status = FAILED
+        try:
+            job.check_cancelled()
+
+            # Step 1: Copy into the sandbox (invalid paths are skipped)
+            saved = save_uploaded_files(self.tmp_dir, job.paths)
+            job.files_total = len(saved)
+
+            # Step 2: Extract, chunk and embed file by file, in batches, so
+            # cancellation takes effect between embeddings calls
+            timestamp = int(time.time())
+            per_file = []
+            with self.lock:
+                published = dict(self.index.get("files", {})) if self.index else {}
+            for path in saved:
+                job.check_cancelled()
+                fingerprint = _file_fingerprint(path)
+                if published.get(os.path.basename(path)) == fingerprint:
+                    # Re-upload of an unchanged file (copy2 keeps its mtime): nothing to redo
+                    logger.info(f"Upload job #{job.id}: {os.path.basename(path)} is unchanged, skipping.")
+                    job.files_done += 1
+                    continue
+                doc = load_text_from_file(path, self.client)
+                chunks, metadatas = _chunk_document(doc, timestamp)
+                job.chunks += len(chunks)
+                vectors, kept_chunks, kept_metadatas = [], [], []
+                for start in range(0, len(chunks), EMBED_BATCH):
+                    job.check_cancelled()
+                    # Chunks that can't be embedded are dropped with their metadata (lists stay aligned)
+                    v, c, m = embed_chunks(chunks[start:start + EMBED_BATCH], metadatas[start:start + EMBED_BATCH])
+                    vectors += v
+                    kept_chunks += c
+                    kept_metadatas += m
+                chunks, metadatas = kept_chunks, kept_metadatas
+                per_file.append((os.path.basename(path), fingerprint, vectors, chunks, metadatas))
+                job.files_done += 1
+
+            job.check_cancelled()
+
+            # Step 3: Publish into the session index in one short critical section
+            with self.lock:
+                # Re-checked under the lock: a cancel or /clear that happened while
+                # we were embedding must win, or cleared files would come back
+                job.check_cancelled()
+                if job.generation != self._generation:
+                    raise JobCancelled()
+                files = dict(self.index.get("files", {})) if self.index else {}
+                for fn, fingerprint, vectors, chunks, metadatas in per_file:
+                    # Re-uploading a file replaces its previous vectors
+                    if self.index is not None and fn in files:
+                        remove_from_faiss_index(self.index, _positions_for_source(self.index, fn))
+                    self.index = add_to_faiss_index(self.index, vectors, chunks, metadatas,
+                                                    embedding=embedding_info())
+                    files[fn] = fingerprint
+                    job.vectors_added += len(vectors)
+                if not files:
+                    self.index = None
+                else:
+                    if self.index is None:
+                        # Only text-less files so far: keep their fingerprints anyway
+                        info = embedding_info()
+                        self.index = empty_bundle(info["dim"], info)
+                    self.index["files"] = files
+
+            status = DONE
+        except JobCancelled:
+            status = CANCELLED
+            # Don't leave copies behind that the index knows nothing about
+            with self.lock:
+                known = self.index.get("files", {}) if self.index else {}
+                for path in saved:
+                    if os.path.basename(path) not in known and os.path.isfile(path):
+                        os.remove(path)
+        except Exception as e:
+            logger.error(f"Upload job #{job.id} failed: {e}")
+            status = FAILED
+            job.error = str(e)
+        finally:
+            job.finished_at = time.time()
+            # Terminal status only after cleanup, and together with the
+            # notification, so pollers never see a job that is still tidying up
+            with self.lock:
+                job.status = status
+                self._finished.append(job)
+            job._done.set()
@@ -1,16 +1,15 @@
 # app/rag/upload_manager.py
 import os
 import shutil
-import time
 import logging
 from typing import List, Optional, Dict, Any
 from PyPDF2 import PdfReader
 
 # Core RAG logic imports
 from .image_loader import image_to_text
-from .chunker import chunk_text
-from .embeddings import embed_texts
-from .vector_store import create_faiss_index
+from .chunker import chunk_text_with_offsets
+from .dedup import dedupe_chunks
+from .vector_store import remove_from_faiss_index
 
 # Configuration for supported formats
 SUPPORTED_IMAGE_EXT = (".png", ".jpg", ".jpeg", ".webp")
@@ -106,58 +105,63 @@ def load_text_from_file(path: str, client: Any) -> Dict[str, Any]:
     else:
         raise ValueError(f"Incompatible file format encountered: {filename}")
 
-def build_temp_index(tmp_dir: str, client: Any) -> Optional[Dict[str, Any]]:
+def _file_fingerprint(path: str) -> Dict[str, Any]:
     """
-    Orchestrates the creation of a FAISS index from all files in the tmp directory.
-    This index lives in memory for the duration of the session.
+    Cheap change detector for session uploads (no file read needed).
     """
-    if not os.path.isdir(tmp_dir):
-        logger.error(f"Temporary directory {tmp_dir} does not exist.")
-        return None
+    st = os.stat(path)
+    return {"size": st.st_size, "mtime": st.st_mtime_ns}
+
+def _positions_for_source(index: Dict[str, Any], source: str) -> List[int]:
+    """
+    Finds the index positions of every chunk that came from 'source'.
+    """
+    return index["store"].positions_for_source(source)
+
+def _chunk_document(doc: Dict[str, Any], timestamp: int):
+    """
+    Splits one extracted document into deduplicated chunks plus per-chunk metadata.
+    """
+    if not doc["text"]:
+        return [], []
+    pieces = chunk_text_with_offsets(doc["text"])
+    doc_chunks = [chunk for _, chunk in pieces]
+    # Link each chunk back to its source file, position and timestamp
+    metadatas = [{
+        "source": doc["source"],
+        "type": doc["type"],
+        "start": start,
+        "updated_at": timestamp,
+        "text_preview": chunk[:100] # Useful for tracing sources in logs
+    } for start, chunk in pieces]
+    # Dedup stays within one file so removing a file never strips another file's chunks
+    return dedupe_chunks(doc_chunks, metadatas)
 
-    # Step 1: Load all valid documents from the sandbox
-    docs = []
-    for fn in os.listdir(tmp_dir):
-        path = os.path.join(tmp_dir, fn)
-        if os.path.isfile(path) and fn.lower().endswith(SUPPORTED_DOC_EXT):
-            docs.append(load_text_from_file(path, client))
+def remove_uploaded_file(tmp_dir: str, filename: str, index: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    Deletes a single uploaded file and its vectors from the session index,
+    without re-embedding anything else.
 
-    if not docs:
-        logger.info("No valid documents found to index in temporary storage.")
+    Returns:
+        The updated index, or None once it records no files at all. Files that
+        produced no vectors stay recorded, so the index may hold none.
+    """
+    filename = os.path.basename(filename)
+    path = os.path.join(tmp_dir, filename)
+    if os.path.isfile(path):
+        os.remove(path)
+    else:
+        logger.warning(f"Uploaded file not found: {filename}")
+
+    if index is None:
         return None
 
-    # Step 2: Chunking and Metadata tagging
-    timestamp = int(time.time())
-    all_chunks = []
-    all_metadatas = []
-    
-    for doc in docs:
-        if not doc["text"]: continue # Skip empty extractions
-        
-        doc_chunks = chunk_text(doc["text"])
-        all_chunks.extend(doc_chunks)
-        
-        # Link each chunk back to its source file and timestamp
-        for chunk in doc_chunks:
-            all_metadatas.append({
-                "source": doc["source"],
-                "type": doc["type"],
-                "updated_at": timestamp,
-                "text_preview": chunk[:100] # Useful for tracing sources in logs
-            })
-
-    # Step 3: Embedding and Vector Store creation
-    logger.info(f"Generating embeddings for {len(all_chunks)} temporary chunks...")
-    vectors = embed_texts(all_chunks)
-    
-    # Build the FAISS structure
-    index = create_faiss_index(
-        vectors=vectors, 
-        texts=all_chunks, 
-        metadatas=all_metadatas
-    )
-    
-    logger.info("Successfully built session-specific temporary index.")
+    removed = remove_from_faiss_index(index, _positions_for_source(index, filename))
+    index.get("files", {}).pop(filename, None)
+    logger.info(f"Removed {removed} chunks for {filename} from the temporary index.")
+
+    if index["faiss"].ntotal == 0 and not index.get("files"):
+        return None
     return index
 
 def clear_tmp_dir(tmp_dir: str) -> None:
@@ -1,8 +1,45 @@
 # app/rag/vector_store.py
+import os
+import json
 import faiss
 import numpy as np
 
-def create_faiss_index(vectors, texts, metadatas):
+from .chunk_store import ChunkStore
+from .compression import (
+    parse_compression, truncate_vectors, build_first_pass, write_full_vectors,
+    two_stage_search, two_stage_search_many, Rescorer,
+)
+from .hierarchy import DocumentIndex, should_route, routed_search
+
+def _bundle(index, store, rescorer=None, embedding=None):
+    """
+    Packs a FAISS index and its ChunkStore into the dictionary the retriever expects.
+    'texts' and 'metadatas' are lazy views: index["texts"][i] decodes just chunk i.
+    Compressed bundles also carry a 'rescore' entry with the full-precision vectors.
+    'embedding' records which backend/model produced the vectors.
+    Bundles built with documents=True also carry a 'docs' DocumentIndex (see hierarchy.py).
+    """
+    bundle = {
+        "faiss": index,
+        "store": store,
+        "texts": store.texts,
+        "metadatas": store.metadatas
+    }
+    if rescorer is not None:
+        bundle["rescore"] = rescorer
+    if embedding:
+        bundle["embedding"] = dict(embedding)
+    return bundle
+
+def empty_bundle(dim, embedding=None):
+    """
+    A bundle with no vectors yet. Lets callers keep bookkeeping (e.g. which
+    files were already processed) before anything has been embedded.
+    """
+    return _bundle(faiss.IndexFlatL2(dim), ChunkStore(), embedding=embedding)
+
+def create_faiss_index(vectors, texts, metadatas, compression=None, full_vectors_path=None, embedding=None,
+                       documents=False):
     """
     Creates a high-speed search index.
     
@@ -10,6 +47,14 @@ def create_faiss_index(vectors, texts, metadatas):
         vectors (list): The list of numerical embeddings (math versions of your text).
         texts (list): The actual human-readable text chunks.
         metadatas (list): Info about the source (e.g., filename, page number).
+        compression (str): Optional compact first-pass index, e.g. "int8", "fp16",
+            "pq", "dim512+int8" (see compression.py). Results are rescored exactly.
+        full_vectors_path (str): Where to keep the full-precision vectors for rescoring
+            (memory-mapped). Without it they stay in RAM.
+        embedding (dict): The embedding backend's info() ({"backend", "model", "dim"}),
+            saved with the index so it is never queried with different vectors.
+        documents (bool): Also build the document-level index used for two-level
+            search on large corpora (see hierarchy.py).
         
     Returns:
         dict: A bundle containing the FAISS search object and the corresponding data.
@@ -17,13 +62,25 @@ def create_faiss_index(vectors, texts, metadatas):
 
     # 1. Safety Check
     # If there is no data to index, we stop early to prevent errors.
-    if not vectors:
+    if not len(vectors):
         raise ValueError("No vectors provided. Please check your PDF/Image folders.")
 
     # 2. Define the Dimensions
     # 'dim' is the length of the vector (e.g., 1536 for OpenAI embeddings).
     # All vectors in the index must have the exact same length.
     dim = len(vectors[0])
+    matrix = np.vstack(vectors).astype("float32")
+    store = ChunkStore.from_lists(texts, metadatas)
+
+    # Compressed mode: compact first-pass index + full vectors for rescoring
+    config = parse_compression(compression)
+    if config["dim"] or config["quant"] != "none":
+        full = write_full_vectors(matrix, full_vectors_path) if full_vectors_path else matrix
+        first_pass = build_first_pass(truncate_vectors(matrix, config["dim"]), config)
+        bundle = _bundle(first_pass, store, Rescorer(full, config), embedding)
+        if documents:
+            bundle["docs"] = DocumentIndex.build(matrix, store.source_id)
+        return bundle
 
     # 3. Choose the Index Type
     # IndexFlatL2 calculates the straight-line distance (Euclidean) between vectors.
@@ -33,13 +90,163 @@ def create_faiss_index(vectors, texts, metadatas):
     # 4. Add Data to the Index
     # We stack the vectors into a matrix and convert them to 'float32', 
     # which is the specific format FAISS requires for high-speed math.
-    index.add(np.vstack(vectors).astype("float32"))
+    index.add(matrix)
 
     # 5. Return the Knowledge Bundle
-    # We return a dictionary so the 'Retriever' knows which text 
-    # belongs to which mathematical vector.
-    return {
-        "faiss": index,
-        "texts": texts,
-        "metadatas": metadatas
-    }
+    # Text and metadata go into a columnar ChunkStore (one UTF-8 blob + typed
+    # NumPy columns) instead of millions of Python strings and dicts.
+    bundle = _bundle(index, store, embedding=embedding)
+
+    # 6. Optional document level: one centroid per document section
+    if documents:
+        bundle["docs"] = DocumentIndex.build(matrix, store.source_id)
+    return bundle
+
+def add_to_faiss_index(bundle, vectors, texts, metadatas, embedding=None):
+    """
+    Appends new vectors to an existing bundle without touching what's already indexed.
+    If there is no bundle yet, a new one is created.
+
+    Returns:
+        dict: The updated (or newly created) bundle.
+    """
+    if not len(vectors):
+        return bundle
+    if bundle is None:
+        return create_faiss_index(vectors, texts, metadatas, embedding=embedding)
+
+    # FAISS assigns the next sequential ids, so the store stays aligned by appending.
+    # The document index would miss the new chunks, so search falls back to flat.
+    bundle.pop("docs", None)
+    matrix = np.vstack(vectors).astype("float32")
+    rescorer = bundle.get("rescore")
+    if rescorer is not None:
+        bundle["faiss"].add(rescorer.transform(matrix))
+        rescorer.append(matrix)
+    else:
+        bundle["faiss"].add(matrix)
+    bundle["store"].extend(texts, metadatas)
+    return bundle
+
+def remove_from_faiss_index(bundle, positions):
+    """
+    Deletes the vectors at the given positions from a bundle in place.
+
+    IndexFlat compacts the remaining vectors while keeping their order,
+    and ChunkStore.delete compacts the same way, so ids stay aligned.
+
+    Returns:
+        int: Number of vectors removed.
+    """
+    if bundle is None or not len(positions):
+        return 0
+    drop = sorted(set(int(p) for p in positions))
+    removed = bundle["faiss"].remove_ids(np.array(drop, dtype="int64"))
+    bundle.pop("docs", None)   # Its chunk ids are stale after compaction
+    bundle["store"].delete(drop)
+    if "rescore" in bundle:
+        bundle["rescore"].delete(drop)
+    return int(removed)
+
+def search_bundle(bundle, q_vec, k):
+    """
+    k-nearest search for one query vector, using two-stage rescoring for
+    compressed bundles.
+
+    Large bundles with a document index search only the chunks of the
+    closest document sections (exact distances on the stored vectors).
+
+    Returns:
+        tuple: (ids, distances) as 1-D arrays, nearest first, padding removed.
+    """
+    q_vec = np.asarray(q_vec, dtype="float32")
+    if should_route(bundle):
+        routed = routed_search(bundle["docs"], lambda ids: bundle_vectors(bundle, ids), q_vec, k)
+        if routed is not None:
+            return routed
+    if "rescore" in bundle:
+        return two_stage_search(bundle["faiss"], bundle["rescore"], q_vec, k)
+    k = min(k, bundle["faiss"].ntotal)
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype="float32")
+    D, I = bundle["faiss"].search(q_vec.reshape(1, -1), k)
+    # FAISS pads with -1 when fewer than k vectors exist
+    valid = I[0] >= 0
+    return I[0][valid], D[0][valid]
+
+def search_many(bundle, q_mat, k):
+    """
+    search_bundle for several query vectors at once. Flat and compressed
+    bundles run a single multi-row FAISS search (one pass over the index for
+    all queries); compressed ones then rescore each row's candidates.
+
+    Returns:
+        list[tuple]: One (ids, distances) pair per query row.
+    """
+    q_mat = np.ascontiguousarray(q_mat, dtype="float32").reshape(len(q_mat), -1)
+    if should_route(bundle):
+        return [search_bundle(bundle, q_vec, k) for q_vec in q_mat]
+    if "rescore" in bundle:
+        return two_stage_search_many(bundle["faiss"], bundle["rescore"], q_mat, k)
+    k = min(k, bundle["faiss"].ntotal)
+    if k <= 0 or not len(q_mat):
+        return [(np.zeros(0, dtype=np.int64), np.zeros(0, dtype="float32")) for _ in q_mat]
+    D, I = bundle["faiss"].search(q_mat, k)
+    valid = I >= 0
+    return [(I[i][valid[i]], D[i][valid[i]]) for i in range(len(q_mat))]
+
+def bundle_vectors(bundle, ids):
+    """
+    Returns the stored full-precision vectors for 'ids' (no re-embedding needed).
+    """
+    if "rescore" in bundle:
+        return bundle["rescore"].vectors(ids)
+    return bundle["faiss"].reconstruct_batch(np.asarray(ids, dtype=np.int64))
+
+def save_index_bundle(bundle, directory):
+    """
+    Writes a bundle to disk: the FAISS index plus the ChunkStore's flat files.
+    """
+    os.makedirs(directory, exist_ok=True)
+    faiss.write_index(bundle["faiss"], os.path.join(directory, "index.faiss"))
+    bundle["store"].save(os.path.join(directory, "chunks"))
+    if "rescore" in bundle:
+        np.save(os.path.join(directory, "full_vectors.npy"), np.asarray(bundle["rescore"].full, dtype="float32"))
+        with open(os.path.join(directory, "compression.json"), "w") as f:
+            json.dump(bundle["rescore"].config, f)
+    if "docs" in bundle:
+        bundle["docs"].save(os.path.join(directory, "docs"))
+    if bundle.get("embedding"):
+        with open(os.path.join(directory, "embedding.json"), "w") as f:
+            json.dump(bundle["embedding"], f)
+
+def load_index_bundle(directory, mmap=True):
+    """
+    Loads a bundle written by save_index_bundle. Chunk text and metadata are
+    memory-mapped, so only the chunks that get retrieved are ever decoded.
+    """
+    index = faiss.read_index(os.path.join(directory, "index.faiss"))
+    store = ChunkStore.load(os.path.join(directory, "chunks"), mmap=mmap)
+    rescorer = None
+    config_path = os.path.join(directory, "compression.json")
+    if os.path.exists(config_path):
+        with open(config_path) as f:
+            config = json.load(f)
+        full = np.load(os.path.join(directory, "full_vectors.npy"), mmap_mode="r" if mmap else None)
+        rescorer = Rescorer(full, config)
+    bundle = _bundle(index, store, rescorer, read_embedding_info(directory))
+    docs = DocumentIndex.load(os.path.join(directory, "docs"))
+    if docs is not None:
+        bundle["docs"] = docs
+    return bundle
+
+def read_embedding_info(directory):
+    """
+    Returns the embedding info saved with an index directory, or None for
+    indexes built before it was recorded.
+    """
+    path = os.path.join(directory, "embedding.json")
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
@@ -0,0 +1,16 @@
+# app/tests/conftest.py
+"""
+Shared test setup. The app is run from app/ and imports 'rag.*', so that
+directory goes on sys.path. Tests use the dependency-free hashing embedding
+backend: no API key or network access is needed.
+
+Run from the repository root with:
+    python -m pytest -q app/tests
+"""
+import os
+import sys
+
+os.environ.setdefault("RAG_EMBEDDING_BACKEND", "hash")
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
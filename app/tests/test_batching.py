@@ -0,0 +1,90 @@
+# app/tests/test_batching.py
+import threading
+
+import numpy as np
+import pytest
+
+from rag.batching import MicroBatcher
+from rag.retriever import _search_batch
+from rag.vector_store import create_faiss_index
+
+
+def _unit_rows(n, dim=16, seed=0):
+    rng = np.random.default_rng(seed)
+    mat = rng.standard_normal((n, dim)).astype("float32")
+    return mat / np.linalg.norm(mat, axis=1, keepdims=True)
+
+
+def _bundle(n=50, seed=0):
+    vectors = _unit_rows(n, seed=seed)
+    return create_faiss_index(list(vectors), [f"chunk {i}" for i in range(n)],
+                              [{"source": f"doc{i % 3}.pdf"} for i in range(n)]), vectors
+
+
+def test_results_reach_their_own_callers():
+    batcher = MicroBatcher(lambda items: [x * 10 for x in items], name="test-order", max_wait_ms=20)
+    futures = [batcher.submit(i) for i in range(20)]
+    assert [f.result(timeout=5) for f in futures] == [i * 10 for i in range(20)]
+
+
+def test_concurrent_calls_are_coalesced():
+    sizes = []
+    gate = threading.Event()
+
+    def fn(items):
+        gate.wait(5)          # Hold the first batch so the rest queue up behind it
+        sizes.append(len(items))
+        return items
+
+    batcher = MicroBatcher(fn, name="test-coalesce", max_wait_ms=20)
+    futures = [batcher.submit(i) for i in range(8)]
+    gate.set()
+    assert [f.result(timeout=5) for f in futures] == list(range(8))
+    assert sum(sizes) == 8
+    assert len(sizes) < 8
+
+
+def test_exception_result_fails_only_its_caller():
+    batcher = MicroBatcher(lambda items: [ValueError(x) if x < 0 else x for x in items],
+                           name="test-partial", max_wait_ms=20)
+    good, bad = batcher.submit(1), batcher.submit(-1)
+    assert good.result(timeout=5) == 1
+    with pytest.raises(ValueError):
+        bad.result(timeout=5)
+
+
+def test_batch_function_error_fails_every_caller():
+    def fn(items):
+        raise RuntimeError("backend down")
+
+    batcher = MicroBatcher(fn, name="test-fail", max_wait_ms=20)
+    futures = [batcher.submit(i) for i in range(3)]
+    for f in futures:
+        with pytest.raises(RuntimeError):
+            f.result(timeout=5)
+
+
+def test_disabled_batcher_runs_inline():
+    batcher = MicroBatcher(lambda items: [KeyError("x") if x == "bad" else x.upper() for x in items],
+                           name="test-inline", enabled=False)
+    assert batcher("ok") == "OK"
+    assert batcher._thread is None
+    with pytest.raises(KeyError):
+        batcher("bad")
+
+
+def test_search_batch_trims_each_request_to_its_k():
+    bundle, vectors = _bundle()
+    out = _search_batch([(bundle, vectors[0], 5, False), (bundle, vectors[1], 2, False)])
+    assert len(out[0][0]) == 5 and len(out[1][0]) == 2
+    # Each query's nearest neighbour is itself
+    assert out[0][0][0] == 0 and out[1][0][0] == 1
+
+
+def test_search_batch_isolates_failing_groups():
+    bundle, vectors = _bundle()
+    broken = {"shards": None}     # .search() raises AttributeError
+    out = _search_batch([(bundle, vectors[3], 3, False), (broken, vectors[4], 3, True),
+                         (bundle, vectors[5], 3, False)])
+    assert isinstance(out[1], AttributeError)
+    assert out[0][0][0] == 3 and out[2][0][0] == 5
@@ -0,0 +1,32 @@
+# app/tests/test_embedding_backends.py
+import inspect
+
+import numpy as np
+import pytest
+
+from rag.embedding_backends import (
+    EmbeddingBackend, OpenAIBackend, OnnxBackend, HashingBackend, create_backend,
+)
+
+
+@pytest.mark.parametrize("cls", [OpenAIBackend, OnnxBackend, HashingBackend])
+def test_backends_share_one_embed_signature(cls):
+    assert inspect.signature(cls.embed) == inspect.signature(EmbeddingBackend.embed)
+    assert cls.info is EmbeddingBackend.info
+
+
+def test_hashing_backend_is_deterministic_and_normalized():
+    backend = HashingBackend(64)
+    a = backend.embed(["Betopia builds software", ""], hedge=True)
+    b = backend.embed(["Betopia builds software", ""])
+    assert a.shape == (2, 64) and a.dtype == np.float32
+    assert np.array_equal(a, b)
+    assert np.allclose(np.linalg.norm(a, axis=1), 1.0)
+    assert backend.info() == {"backend": "hash", "model": "words+bigrams", "dim": 64}
+
+
+def test_openai_dimensions_are_set_at_construction():
+    assert create_backend("openai", dimensions=256).info()["dim"] == 256
+    assert create_backend("hash:32").dim == 32
+    with pytest.raises(ValueError):
+        create_backend("word2vec")
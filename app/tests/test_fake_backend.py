@@ -0,0 +1,26 @@
+# app/tests/test_fake_backend.py
+import json
+
+from bench.fake_backend import fake_tool_call, user_turn
+from rag.prompt import build_prompt
+
+
+def test_user_turn_ignores_the_prompt_around_it():
+    # The rules text talks about meetings; only the user's words count
+    prompt = build_prompt("Betopia builds apps.", "What services do you offer?", [])
+    assert user_turn(prompt) == "What services do you offer?"
+    assert fake_tool_call(user_turn(prompt)) is None
+
+
+def test_contact_details_produce_a_deterministic_tool_call():
+    call = fake_tool_call("my name is Jane Doe, email jane.doe@example.com, phone +1 555-010-2030")
+    assert call == fake_tool_call("my name is Jane Doe, email jane.doe@example.com, phone +1 555-010-2030")
+    assert call["function"]["name"] == "schedule_meeting"
+    assert json.loads(call["function"]["arguments"]) == {
+        "name": "Jane Doe", "email": "jane.doe@example.com", "phone": "+15550102030",
+    }
+
+
+def test_booking_intent_fills_missing_fields():
+    args = json.loads(fake_tool_call("Can I book a meeting?")["function"]["arguments"])
+    assert args["name"] and args["email"] and args["phone"]
@@ -0,0 +1,58 @@
+# app/tests/test_image_loader.py
+import io
+import base64
+
+import pytest
+
+from rag.image_loader import detect_mime, target_size, prepare_image, LOW_DETAIL_SIDE, TILE
+
+
+@pytest.mark.parametrize("head, mime", [
+    (b"\x89PNG\r\n\x1a\n....", "image/png"),
+    (b"\xff\xd8\xff\xe0....", "image/jpeg"),
+    (b"GIF89a....", "image/gif"),
+    (b"RIFF\x00\x00\x00\x00WEBPVP8 ", "image/webp"),
+])
+def test_detect_mime_from_signature(head, mime):
+    # The signature wins over a misleading extension
+    assert detect_mime(head, "photo.bmp") == mime
+
+
+def test_detect_mime_falls_back_to_the_file_name():
+    assert detect_mime(b"BM....", "scan.bmp") == "image/bmp"
+    assert detect_mime(b"????") == "application/octet-stream"
+
+
+def test_small_images_use_low_detail_unchanged():
+    assert target_size(300, 200) == (300, 200, "low")
+
+
+def test_large_images_fit_the_model_limits():
+    w, h, detail = target_size(4000, 3000)
+    assert detail == "high"
+    assert max(w, h) <= 2048 and min(w, h) <= 768
+
+
+def test_snapping_into_one_tile_gives_low_detail():
+    w, h, detail = target_size(560, 540)
+    assert max(w, h) <= LOW_DETAIL_SIDE
+    assert detail == "low"
+
+
+def test_snapping_saves_a_row_of_tiles():
+    w, h, detail = target_size(1664, 603)
+    assert detail == "high"
+    assert h <= TILE and w < 1664
+
+
+def test_prepare_image_downscales_and_recompresses(tmp_path):
+    Image = pytest.importorskip("PIL.Image")
+    path = tmp_path / "slide.png"
+    noise = Image.effect_noise((1600, 1200), 40).convert("RGB")
+    noise.save(path)
+
+    data, mime, detail = prepare_image(str(path))
+    raw = base64.b64decode(data)
+    assert mime == "image/jpeg" and detail == "high"
+    assert len(raw) * 3 < path.stat().st_size
+    assert Image.open(io.BytesIO(raw)).size == target_size(1600, 1200)[:2]
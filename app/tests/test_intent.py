@@ -0,0 +1,21 @@
+# app/tests/test_intent.py
+import pytest
+
+from rag.intent import classify_intent, CONFIRMATION, KNOWLEDGE, SMALL_TALK
+
+
+@pytest.mark.parametrize("text", ["yes", "ok thanks", "sure, go ahead", "no that's fine", "yes book it"])
+def test_confirmations(text):
+    assert classify_intent(text).intent == CONFIRMATION
+
+
+@pytest.mark.parametrize("text", ["ok what about pricing", "ok what about pricing?",
+                                  "yes tell me about bdcalling", "sure what services do you offer"])
+def test_confirmation_word_followed_by_a_request_needs_retrieval(text):
+    route = classify_intent(text)
+    assert route.intent == KNOWLEDGE
+    assert route.needs_retrieval
+
+
+def test_greeting_is_small_talk():
+    assert classify_intent("Hello!").intent == SMALL_TALK
@@ -0,0 +1,43 @@
+# app/tests/test_meeting_store.py
+import json
+
+from rag.meeting_store import MeetingStore
+
+
+def _marker(store):
+    return store._db.get().execute(
+        "SELECT value FROM store_meta WHERE key = 'legacy_json_imported'"
+    ).fetchone()
+
+
+def test_legacy_json_is_imported_once(tmp_path):
+    legacy = tmp_path / "meetings.json"
+    legacy.write_text(json.dumps([
+        {"name": "Jane", "email": "jane@example.com", "phone": "123", "timestamp": "2025-01-02 10:00:00"},
+    ]), encoding="utf-8")
+
+    store = MeetingStore(str(tmp_path / "meetings.db"), legacy_json_path=str(legacy))
+    assert store.count() == 1 and _marker(store)
+    again = MeetingStore(str(tmp_path / "meetings.db"), legacy_json_path=str(legacy))
+    assert again.count() == 1
+
+
+def test_unreadable_legacy_json_is_retried_on_next_open(tmp_path):
+    legacy = tmp_path / "meetings.json"
+    legacy.write_text('[{"name": "Jane", ', encoding="utf-8")
+
+    store = MeetingStore(str(tmp_path / "meetings.db"), legacy_json_path=str(legacy))
+    assert store.count() == 0
+    assert _marker(store) is None
+
+    legacy.write_text(json.dumps([
+        {"name": "Jane", "email": "jane@example.com", "phone": "123", "timestamp": "2025-01-02 10:00:00"},
+    ]), encoding="utf-8")
+    store = MeetingStore(str(tmp_path / "meetings.db"), legacy_json_path=str(legacy))
+    assert store.count() == 1 and _marker(store)
+
+
+def test_missing_legacy_json_is_marked_as_imported(tmp_path):
+    store = MeetingStore(str(tmp_path / "meetings.db"), legacy_json_path=str(tmp_path / "meetings.json"))
+    assert store.count() == 0
+    assert _marker(store)
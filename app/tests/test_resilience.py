@@ -0,0 +1,162 @@
+# app/tests/test_resilience.py
+import time
+import threading
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from rag import resilience, embeddings, openai_client
+from rag.resilience import Deadline, DeadlineExceeded, hedged_call, chat_completion
+from rag.embedding_backends import OpenAIBackend, EmbeddingError
+
+
+class APIError(Exception):
+    def __init__(self, status_code=None):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(resilience, "RETRY_BACKOFF", 0.01)
+
+
+def _flaky(failures, error=None):
+    """fn() that raises 'error' for its first 'failures' calls, then returns the call number."""
+    calls = []
+    lock = threading.Lock()
+
+    def fn():
+        with lock:
+            calls.append(1)
+            n = len(calls)
+        if n <= failures:
+            raise error or APIError(503)
+        return n
+
+    return fn, calls
+
+
+def test_retries_until_success():
+    fn, calls = _flaky(2)
+    assert hedged_call(fn, "test", max_attempts=3, hedging=False) == 3
+    assert len(calls) == 3
+
+
+def test_gives_up_after_max_attempts():
+    fn, calls = _flaky(10)
+    with pytest.raises(APIError):
+        hedged_call(fn, "test", max_attempts=3, hedging=False)
+    assert len(calls) == 3
+
+
+def test_client_errors_are_not_retried():
+    fn, calls = _flaky(10, APIError(400))
+    with pytest.raises(APIError):
+        hedged_call(fn, "test", max_attempts=3, hedging=False)
+    assert len(calls) == 1
+
+
+def test_deadline_stops_a_slow_call():
+    t0 = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        hedged_call(lambda: time.sleep(1.0), "test", Deadline(0.1), hedging=False)
+    assert time.monotonic() - t0 < 0.5
+
+
+def test_hedge_wins_over_a_slow_first_attempt(monkeypatch):
+    monkeypatch.setattr(resilience, "hedge_delay", lambda op: 0.05)
+    calls = []
+
+    def fn():
+        calls.append(1)
+        if len(calls) == 1:
+            time.sleep(1.0)
+            return "slow"
+        return "fast"
+
+    t0 = time.monotonic()
+    assert hedged_call(fn, "test", max_attempts=2, hedging=True) == "fast"
+    assert time.monotonic() - t0 < 0.5
+
+
+class _FakeChatClient:
+    def __init__(self):
+        self.options = {}
+        self.requests = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def with_options(self, **options):
+        view = _FakeChatClient()
+        view.options = options
+        view.requests = self.requests
+        return view
+
+    def _create(self, **kwargs):
+        self.requests.append((self.options, kwargs))
+        return SimpleNamespace(usage=None, choices=[])
+
+
+def test_chat_completion_disables_sdk_retries():
+    client = _FakeChatClient()
+    chat_completion(client, Deadline(5), model="m", messages=[])
+    options, kwargs = client.requests[0]
+    assert options == {"max_retries": 0}
+    assert 0 < kwargs["timeout"] <= 5
+
+
+class _FakeEmbeddingsClient:
+    """Embeddings endpoint that rejects any request containing a 'BAD' input."""
+
+    def __init__(self):
+        self.embeddings = SimpleNamespace(create=self._create)
+        self.options = []
+
+    def with_options(self, **options):
+        self.options.append(options)
+        return self
+
+    def _create(self, model, input, **kwargs):
+        inputs = [input] if isinstance(input, str) else input
+        if any("BAD" in t for t in inputs):
+            raise APIError(400)
+        data = [SimpleNamespace(index=i, embedding=[float(len(t)), 1.0, 0.0, 0.0]) for i, t in enumerate(inputs)]
+        return SimpleNamespace(data=data, usage=None)
+
+
+@pytest.fixture
+def fake_openai(monkeypatch):
+    client = _FakeEmbeddingsClient()
+    monkeypatch.setattr(openai_client, "get_client", lambda operation=None: client)
+    backend = OpenAIBackend(dimensions=4)
+    monkeypatch.setattr(embeddings, "get_backend", lambda: backend)
+    return client
+
+
+def test_openai_embed_reports_failed_positions(fake_openai):
+    with pytest.raises(EmbeddingError) as info:
+        OpenAIBackend(dimensions=4).embed(["a", "BAD bb", "ccc"])
+    assert info.value.failed == [1]
+    assert [v is None for v in info.value.vectors] == [False, True, False]
+    assert info.value.vectors[2][0] == 3.0
+    assert fake_openai.options[0] == {"max_retries": 0}
+
+
+def test_embed_chunks_keeps_lists_aligned(fake_openai):
+    vectors, chunks, metas = embeddings.embed_chunks(["a", "BAD bb", "ccc"], [{"n": 0}, {"n": 1}, {"n": 2}])
+    assert chunks == ["a", "ccc"]
+    assert metas == [{"n": 0}, {"n": 2}]
+    assert [v[0] for v in vectors] == [1.0, 3.0]
+
+
+def test_query_batch_fails_only_unembeddable_queries(fake_openai):
+    out = embeddings._embed_query_batch(["hello", "BAD query", "hi"])
+    assert isinstance(out[1], EmbeddingError)
+    assert out[0][0] == 5.0 and out[2][0] == 2.0
+
+
+def test_embed_query_raises_for_a_failed_query(fake_openai):
+    assert np.asarray(embeddings.embed_query("hello"))[0] == 5.0
+    with pytest.raises(EmbeddingError):
+        embeddings.embed_query("BAD query")
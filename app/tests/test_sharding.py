@@ -0,0 +1,105 @@
+# app/tests/test_sharding.py
+import time
+import secrets
+import threading
+from multiprocessing.connection import Listener
+
+import faiss
+import numpy as np
+import pytest
+
+from rag.sharding import (
+    build_shards, write_shard, partition_by_source, shard_id_of, ShardedIndex, ShardError,
+)
+
+N_SHARDS = 8
+DIM = 16
+
+
+@pytest.fixture(scope="module")
+def corpus():
+    rng = np.random.default_rng(7)
+    vectors = rng.standard_normal((120, DIM)).astype("float32")
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    # Three sources over eight shards: most shards are empty and get skipped
+    metadatas = [{"source": f"doc{i % 3}.pdf"} for i in range(len(vectors))]
+    texts = [f"chunk {i}" for i in range(len(vectors))]
+    return vectors, texts, metadatas
+
+
+@pytest.fixture(scope="module")
+def sharded(corpus, tmp_path_factory):
+    vectors, texts, metadatas = corpus
+    out_dir = str(tmp_path_factory.mktemp("shards"))
+    dirs = build_shards(list(vectors), texts, metadatas, N_SHARDS, out_dir)
+    index = ShardedIndex.spawn_local(dirs)
+    yield index, dirs, out_dir
+    index.close()
+
+
+def test_scatter_gather_matches_flat_search(corpus, sharded):
+    vectors = corpus[0]
+    index = sharded[0]
+    flat = faiss.IndexFlatL2(DIM)
+    flat.add(vectors)
+    D, _ = flat.search(vectors[:4], 5)
+
+    results = index.search(vectors[:4], 5)
+    assert index.ntotal == len(vectors)
+    for qi, hits in enumerate(results):
+        assert hits[0]["text"] == f"chunk {qi}"
+        assert np.allclose([h["distance"] for h in hits], D[qi], atol=1e-5)
+
+
+def test_connections_are_keyed_by_shard_id(sharded):
+    index, dirs, _ = sharded
+    ids = {shard_id_of(d) for d in dirs}
+    assert len(dirs) < N_SHARDS
+    assert set(index._conns) == ids
+
+
+def test_reload_targets_the_right_shard(corpus, sharded):
+    vectors, texts, metadatas = corpus
+    index, dirs, out_dir = sharded
+    shard_id = max(shard_id_of(d) for d in dirs)
+    v, t, m = partition_by_source(list(vectors), texts, metadatas, N_SHARDS)[shard_id]
+
+    write_shard(out_dir, shard_id, v[:3], t[:3], m[:3])
+    assert index.reload(shard_id) == 3
+    write_shard(out_dir, shard_id, v, t, m)
+    assert index.reload(shard_id) == len(v)
+
+
+def test_shard_error_is_reported_and_connection_survives(corpus, sharded):
+    index = sharded[0]
+    with pytest.raises(ShardError):
+        index.search(np.zeros((1, DIM + 3), dtype="float32"), 3)
+    # Every shard's reply was consumed, so the next request is answered normally
+    assert index.search(corpus[0][:1], 1)[0][0]["text"] == "chunk 0"
+
+
+def test_silent_shard_times_out():
+    authkey = secrets.token_bytes(16)
+    listener = Listener(("127.0.0.1", 0), authkey=authkey)
+    held = []
+
+    def accept_forever():
+        # Accepts and reads requests but never answers
+        while True:
+            try:
+                conn = listener.accept()
+            except OSError:
+                return
+            held.append(conn)
+
+    threading.Thread(target=accept_forever, daemon=True).start()
+    index = ShardedIndex({5: listener.address}, authkey, timeout=0.2)
+    with pytest.raises(TimeoutError):
+        index.ntotal
+    # The timed-out connection was replaced, so a late reply can't be misread
+    for _ in range(100):
+        if len(held) == 2:
+            break
+        time.sleep(0.01)
+    assert len(held) == 2
+    listener.close()
@@ -0,0 +1,46 @@
+# app/tests/test_snapshots.py
+import time
+
+import numpy as np
+
+from rag.embeddings import embed_texts, embedding_info
+from rag.snapshots import publish_snapshot, SnapshotWatcher
+from rag.vector_store import create_faiss_index
+
+
+def _bundle(texts, embedding):
+    vectors = embed_texts(texts) if embedding == embedding_info() else \
+        list(np.eye(len(texts), embedding["dim"], dtype="float32"))
+    return create_faiss_index(vectors, texts, [{"source": "doc.pdf"}] * len(texts), embedding=embedding)
+
+
+def _wait_for_swap(watcher, timeout=3.0):
+    expires = time.monotonic() + timeout
+    while time.monotonic() < expires:
+        bundle = watcher.swap_if_ready()
+        if bundle is not None:
+            return bundle
+        time.sleep(0.02)
+    return None
+
+
+def test_watcher_swaps_in_compatible_snapshots(tmp_path):
+    watcher = SnapshotWatcher(str(tmp_path), poll_interval=0.02).start()
+    try:
+        version = publish_snapshot(_bundle(["alpha", "beta"], embedding_info()), str(tmp_path))
+        bundle = _wait_for_swap(watcher)
+        assert bundle is not None and bundle["faiss"].ntotal == 2
+        assert watcher.version == version
+    finally:
+        watcher.stop()
+
+
+def test_watcher_refuses_snapshots_from_another_backend(tmp_path):
+    watcher = SnapshotWatcher(str(tmp_path), poll_interval=0.02).start()
+    try:
+        other = {"backend": "openai", "model": "text-embedding-3-small", "dim": 8}
+        publish_snapshot(_bundle(["alpha", "beta"], other), str(tmp_path))
+        assert _wait_for_swap(watcher, timeout=0.5) is None
+        assert watcher.version is None
+    finally:
+        watcher.stop()
@@ -0,0 +1,152 @@
+# app/tests/test_upload_jobs.py
+import os
+
+import pytest
+
+from rag import upload_jobs
+from rag.upload_jobs import UploadJobManager, DONE, CANCELLED
+
+
+def _text(name, sentences=40):
+    return " ".join(f"{name} fact number {i} is about topic {i * 7 % 13}." for i in range(sentences))
+
+
+@pytest.fixture
+def files(tmp_path):
+    src = tmp_path / "src"
+    src.mkdir()
+    paths = []
+    for name in ("alpha", "beta"):
+        path = src / f"{name}.pdf"
+        path.write_text(_text(name), encoding="utf-8")
+        paths.append(str(path))
+    return paths
+
+
+@pytest.fixture
+def manager(tmp_path, monkeypatch):
+    # Plain-text "PDFs": extraction just reads the file
+    def load_text(path, client):
+        with open(path, encoding="utf-8") as f:
+            return {"text": f.read(), "source": os.path.basename(path), "type": "upload"}
+
+    monkeypatch.setattr(upload_jobs, "load_text_from_file", load_text)
+    mgr = UploadJobManager(str(tmp_path / "tmp"), client=None, max_workers=1)
+    yield mgr
+    mgr.shutdown()
+
+
+def _wait(job, timeout=10.0):
+    assert job.wait(timeout), "upload job did not finish"
+    return job
+
+
+def _embed_spy(monkeypatch, on_call):
+    """Wraps embed_chunks; on_call(n) runs before the n-th call (1-based)."""
+    real = upload_jobs.embed_chunks
+    calls = []
+
+    def spy(chunks, metadatas):
+        calls.append(len(chunks))
+        on_call(len(calls))
+        return real(chunks, metadatas)
+
+    monkeypatch.setattr(upload_jobs, "embed_chunks", spy)
+    return calls
+
+
+def test_job_publishes_every_file(manager, files):
+    job = _wait(manager.submit(files))
+    assert job.status == DONE
+    assert job.files_done == 2
+    assert set(manager.index["files"]) == {"alpha.pdf", "beta.pdf"}
+    assert manager.index["faiss"].ntotal == job.vectors_added == job.chunks
+
+
+def test_cancel_takes_effect_between_embedding_batches(manager, files, monkeypatch):
+    monkeypatch.setattr(upload_jobs, "EMBED_BATCH", 1)
+    calls = _embed_spy(monkeypatch, lambda n: manager.cancel(1) if n == 1 else None)
+
+    job = _wait(manager.submit(files[:1]))
+    assert job.chunks > 1
+    assert job.status == CANCELLED
+    # One single-chunk batch was embedded before the cancel was noticed
+    assert calls == [1]
+    assert manager.index is None
+    # The copy in the sandbox is removed, since nothing was indexed from it
+    assert not os.path.exists(os.path.join(manager.tmp_dir, "alpha.pdf"))
+
+
+def test_clear_while_embedding_discards_the_job(manager, files, monkeypatch):
+    _embed_spy(monkeypatch, lambda n: manager.clear() if n == 1 else None)
+
+    job = _wait(manager.submit(files))
+    assert job.status == CANCELLED
+    assert manager.index is None
+    assert not os.path.isdir(manager.tmp_dir)
+
+
+def test_job_from_before_a_clear_never_publishes(manager, files, monkeypatch):
+    # A clear() that missed the job (e.g. it raced submit) must still win at publish time
+    def bump_generation(n):
+        with manager.lock:
+            manager._generation += 1
+
+    _embed_spy(monkeypatch, bump_generation)
+    job = _wait(manager.submit(files[:1]))
+    assert job.status == CANCELLED
+    assert manager.index is None
+
+
+def test_later_job_still_publishes_after_clear(manager, files):
+    _wait(manager.submit(files[:1]))
+    manager.clear()
+    job = _wait(manager.submit(files[1:]))
+    assert job.status == DONE
+    assert set(manager.index["files"]) == {"beta.pdf"}
+
+
+def test_unchanged_file_is_not_processed_again(manager, files, monkeypatch):
+    first = _wait(manager.submit(files[:1]))
+    ntotal = manager.index["faiss"].ntotal
+    calls = _embed_spy(monkeypatch, lambda n: None)
+
+    again = _wait(manager.submit(files[:1]))
+    assert again.status == DONE
+    assert calls == [] and again.vectors_added == 0
+    assert manager.index["faiss"].ntotal == ntotal == first.vectors_added
+
+    # An edited file is re-embedded and replaces its old vectors
+    with open(files[0], "a", encoding="utf-8") as f:
+        f.write(" An extra closing sentence about alpha.")
+    edited = _wait(manager.submit(files[:1]))
+    assert calls
+    assert manager.index["faiss"].ntotal == edited.vectors_added
+
+
+def test_textless_files_are_recorded_and_skipped(manager, tmp_path, monkeypatch):
+    scan = tmp_path / "src" / "scan.pdf"
+    scan.parent.mkdir(exist_ok=True)
+    scan.write_text("", encoding="utf-8")
+    calls = []
+    real = upload_jobs.load_text_from_file
+
+    def spy(path, client):
+        calls.append(path)
+        return real(path, client)
+
+    monkeypatch.setattr(upload_jobs, "load_text_from_file", spy)
+    job = _wait(manager.submit([str(scan)]))
+    assert job.status == DONE
+    assert manager.index is not None and manager.index["faiss"].ntotal == 0
+    assert set(manager.index["files"]) == {"scan.pdf"}
+
+    _wait(manager.submit([str(scan)]))
+    assert len(calls) == 1
+
+    # Later documents land in the same (so far vector-less) index
+    doc = tmp_path / "src" / "notes.pdf"
+    doc.write_text(_text("notes"), encoding="utf-8")
+    _wait(manager.submit([str(doc)]))
+    assert manager.index["faiss"].ntotal > 0
+    assert set(manager.index["files"]) == {"scan.pdf", "notes.pdf"}
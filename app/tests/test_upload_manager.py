@@ -0,0 +1,19 @@
+# app/tests/test_upload_manager.py
+import numpy as np
+
+from rag.upload_manager import remove_uploaded_file
+from rag.vector_store import create_faiss_index
+
+
+def test_removing_a_file_keeps_records_of_textless_files(tmp_path):
+    (tmp_path / "notes.pdf").write_bytes(b"x")
+    (tmp_path / "scan.pdf").write_bytes(b"y")
+    index = create_faiss_index([np.ones(8, dtype="float32")], ["some notes"], [{"source": "notes.pdf"}])
+    index["files"] = {"notes.pdf": {"size": 1, "mtime": 1}, "scan.pdf": {"size": 1, "mtime": 2}}
+
+    index = remove_uploaded_file(str(tmp_path), "notes.pdf", index)
+    assert index is not None and index["faiss"].ntotal == 0
+    assert set(index["files"]) == {"scan.pdf"}
+    assert not (tmp_path / "notes.pdf").exists()
+
+    assert remove_uploaded_file(str(tmp_path), "scan.pdf", index) is None
@@ -0,0 +1,23 @@
+# app/tests/test_vector_store.py
+import numpy as np
+import pytest
+
+from rag.vector_store import create_faiss_index, search_bundle, search_many
+
+
+def _unit_rows(n, dim=32, seed=3):
+    rng = np.random.default_rng(seed)
+    mat = rng.standard_normal((n, dim)).astype("float32")
+    return mat / np.linalg.norm(mat, axis=1, keepdims=True)
+
+
+@pytest.mark.parametrize("compression", [None, "int8", "dim16+fp16", "pq8"])
+def test_search_many_matches_one_query_at_a_time(tmp_path, compression):
+    vectors = _unit_rows(300)
+    bundle = create_faiss_index(list(vectors), [str(i) for i in range(300)], [{"source": "a.pdf"}] * 300,
+                                compression=compression, full_vectors_path=str(tmp_path / "full.npy"))
+    batched = search_many(bundle, vectors[:6], 5)
+    for q_vec, (ids, dists) in zip(vectors[:6], batched):
+        one_ids, one_dists = search_bundle(bundle, q_vec, 5)
+        assert np.array_equal(ids, one_ids)
+        assert np.allclose(dists, one_dists)